@@ -0,0 +1,223 @@
+# app/blobstore.py
+# Content-addressed storage: every distinct file body is kept once under
+# <root>/blobs/<ab>/<cd>/<sha256>, fanned out by the leading hex digits of its
+# digest so no directory grows past a few hundred entries. Blobs written
+# before that sit directly in <root>/blobs/ until 'flask shard-blobs' moves
+# them; reads look in both places. Reference counting lives in the database
+# (Blob model).
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import uuid
+
+from app.compression import encoder, worth_compressing
+
+BLOCK_SIZE = 64 * 1024
+
+FANOUT_LEVELS = 2  # Directory levels above each blob
+FANOUT_WIDTH = 2  # Hex digits per level: 256 directories each
+
+_DIGEST = re.compile(r'[0-9a-f]{64}')
+
+
+def blob_dir(root):
+    return os.path.join(root, 'blobs')
+
+
+def blob_path(root, digest):
+    """Where blob `digest` belongs in the fan-out layout."""
+    levels = [digest[i * FANOUT_WIDTH:(i + 1) * FANOUT_WIDTH] for i in range(FANOUT_LEVELS)]
+    return os.path.join(blob_dir(root), *levels, digest)
+
+
+def flat_blob_path(root, digest):
+    """Where blob `digest` was kept before the fan-out layout."""
+    return os.path.join(blob_dir(root), digest)
+
+
+def blob_exists(root, digest):
+    return os.path.exists(blob_path(root, digest)) or os.path.exists(flat_blob_path(root, digest))
+
+
+def open_blob(root, digest):
+    """Open blob `digest`'s stored bytes, from whichever layout holds them."""
+    path = blob_path(root, digest)
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        pass
+    try:
+        return open(flat_blob_path(root, digest), 'rb')
+    except FileNotFoundError:
+        # Moved into the fan-out layout between the two attempts
+        return open(path, 'rb')
+
+
+def temp_dir(root):
+    path = os.path.join(blob_dir(root), 'tmp')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_temp_blob(root, stream, codec=None):
+    """Copy `stream` into a temporary file inside the blob directory while
+    hashing it, encoding it with `codec` (see app.compression) unless its
+    first block turns out not to compress.
+
+    Returns (sha256 hex digest, size, temp path, encoding). The digest and
+    size are of the unencoded bytes; encoding is None for a raw copy.
+    """
+    sha = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=temp_dir(root))
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            block = stream.read(BLOCK_SIZE)
+            if codec and not worth_compressing(block):
+                codec = None
+            sink = encoder(codec, out) if codec else out
+            while block:
+                sha.update(block)
+                sink.write(block)
+                size += len(block)
+                block = stream.read(BLOCK_SIZE)
+            if sink is not out:
+                sink.close()
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    return sha.hexdigest(), size, temp_path, codec
+
+
+def link_temp_blob(root, path):
+    """Give the file at `path` a temporary name inside the blob directory,
+    for place_blob() to move into the store while `path` itself stays put.
+    A hard link where the file system allows it, a copy otherwise.
+    Returns the temp path."""
+    temp_path = os.path.join(temp_dir(root), f"link-{uuid.uuid4().hex}")
+    try:
+        os.link(path, temp_path)
+    except OSError:
+        try:
+            shutil.copyfile(path, temp_path)
+        except BaseException:
+            _remove(temp_path)
+            raise
+    return temp_path
+
+
+def hash_file(path):
+    """Return (sha256 hex digest, size) of the file at `path`."""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            sha.update(block)
+            size += len(block)
+    return sha.hexdigest(), size
+
+
+def place_blob(root, digest, source_path, replace=False):
+    """Move `source_path` into the store as blob `digest`.
+
+    If the blob is already present the source is just removed: identical
+    digests mean identical bytes, so either copy is as good as the other.
+    With `replace` the source wins instead, for callers whose copy must
+    match what they recorded about the blob (its encoding, say).
+    Returns the blob's path.
+    """
+    path = blob_path(root, digest)
+    if not replace and blob_exists(root, digest):
+        os.remove(source_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+        if replace:
+            _remove(flat_blob_path(root, digest))  # An older copy must not outlive the new one
+    return path
+
+
+def remove_blob(root, digest):
+    _remove(blob_path(root, digest))
+    _remove(flat_blob_path(root, digest))
+
+
+def retire_blob(root, digest):
+    """Move blob `digest` out of the store under temporary names, to be
+    deleted once its removal commits, or put back by restore_blob() if it
+    does not. Returns (temp path, store path) for each layout that held it."""
+    moved = []
+    for path in (blob_path(root, digest), flat_blob_path(root, digest)):
+        temp_path = os.path.join(temp_dir(root), f"retired-{uuid.uuid4().hex}")
+        try:
+            os.rename(path, temp_path)
+        except FileNotFoundError:
+            continue
+        moved.append((temp_path, path))
+    return moved
+
+
+def restore_blob(moved):
+    """Undo retire_blob()."""
+    for temp_path, path in moved:
+        if os.path.exists(path):
+            _remove(temp_path)  # Stored again in the meantime; the copies are identical
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.rename(temp_path, path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def fetch_blob(root, digest, storage):
+    """Copy blob `digest` back from `storage` (see app.storage) into the
+    store, unless a concurrent fetch got it there first. Raises
+    FileNotFoundError if the backend does not have it either."""
+    fd, temp_path = tempfile.mkstemp(dir=temp_dir(root))
+    os.close(fd)
+    try:
+        storage.download(digest, temp_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return place_blob(root, digest, temp_path)
+
+
+def flat_blobs(root):
+    """Digests of the blobs still kept directly in <root>/blobs/."""
+    with os.scandir(blob_dir(root)) as entries:
+        for entry in entries:
+            if _DIGEST.fullmatch(entry.name) and entry.is_file():
+                yield entry.name
+
+
+def shard_blob(root, digest):
+    """Move blob `digest` from the flat layout into the fan-out one.
+
+    The blob is hard-linked into place before its old name goes, so a reader
+    finds it in one place or the other throughout. If a copy is in place
+    already it wins: it was stored since, possibly with another encoding.
+    Returns False if there was nothing to move.
+    """
+    flat_path = flat_blob_path(root, digest)
+    path = blob_path(root, digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.link(flat_path, path)
+    except FileExistsError:
+        pass
+    except FileNotFoundError:
+        return False
+    _remove(flat_path)
+    return True
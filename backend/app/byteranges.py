@@ -0,0 +1,149 @@
+# app/byteranges.py
+# Helpers for serving HTTP Range requests (RFC 7233) from files on disk.
+import io
+import os
+import uuid
+
+from werkzeug.http import parse_etags, parse_date
+
+BLOCK_SIZE = 64 * 1024
+
+
+def resolve_ranges(range_header, length):
+    """Turn a Range header into a sorted list of coalesced (start, stop) byte
+    ranges for a body of `length` bytes.
+
+    Returns None when the header is absent, malformed or not a byte range (the
+    request is then served in full), and [] when no range is satisfiable.
+    """
+    # Parsed by hand: werkzeug's parse_range_header rejects unordered or
+    # overlapping ranges, which multi-range clients are allowed to send
+    units, _, spec = (range_header or '').partition('=')
+    if units.strip().lower() != 'bytes' or not spec.strip():
+        return None
+
+    ranges = []
+    for item in spec.split(','):
+        first, dash, last = item.strip().partition('-')
+        if not dash or not (first.isdigit() or last.isdigit()):
+            return None
+        if not first:  # suffix range: the last N bytes
+            start, stop = max(length - int(last), 0), length
+        elif not last:
+            start, stop = int(first), length
+        elif last.isdigit() and first.isdigit() and int(first) <= int(last):
+            start, stop = int(first), min(int(last) + 1, length)
+        else:
+            return None
+        if start < stop:
+            ranges.append((start, stop))
+
+    # Overlapping or adjacent ranges are merged so each byte is sent once
+    ranges.sort()
+    merged = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def if_range_matches(if_range_header, etag, last_modified):
+    """Return True if the Range header should be honoured given If-Range.
+
+    If-Range holds either an entity tag (which must match strongly) or an
+    HTTP date (which must equal Last-Modified exactly). `etag` is unquoted and
+    `last_modified` is a timezone-aware datetime.
+    """
+    if not if_range_header:
+        return True
+
+    if if_range_header.startswith(('"', 'W/')):
+        etags = parse_etags(if_range_header)
+        return etag is not None and not if_range_header.startswith('W/') and etags.contains(etag)
+
+    date = parse_date(if_range_header)
+    return date is not None and last_modified is not None and date == last_modified.replace(microsecond=0)
+
+
+class FileSlice:
+    """A read-only view of bytes [start, stop) of the open binary file `file`.
+
+    It exposes fileno() and tell(), so WSGI servers whose wsgi.file_wrapper
+    uses sendfile (gunicorn, for example) send the slice straight from the
+    page cache, while servers that fall back to read() never see bytes past
+    the end of the range.
+    """
+
+    def __init__(self, file, start, stop):
+        self._file = file
+        self._file.seek(start)
+        self._remaining = stop - start
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def close(self):
+        self._file.close()
+
+
+def multipart_byteranges(file, ranges, length, content_type):
+    """Build a multipart/byteranges body for `ranges` of the open file `file`,
+    which is closed once the body has been sent.
+
+    Returns (content_type, content_length, iterator). Parts are read with
+    os.pread in BLOCK_SIZE pieces, so memory stays bounded for any range size.
+    Files without a descriptor (decoded blobs) are read with seek() and
+    read() instead; `ranges` is sorted, so that only ever moves forward.
+    """
+    boundary = uuid.uuid4().hex
+    headers = [
+        (f"--{boundary}\r\n"
+         f"Content-Type: {content_type}\r\n"
+         f"Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n").encode('latin-1')
+        for start, stop in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode('latin-1')
+
+    content_length = sum(len(h) for h in headers) + sum(stop - start for start, stop in ranges)
+    content_length += 2 * (len(ranges) - 1) + len(closing)
+
+    def generate():
+        try:
+            fd = file.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            fd = None
+        try:
+            for index, (start, stop) in enumerate(ranges):
+                if index:
+                    yield b"\r\n"
+                yield headers[index]
+                position = start
+                if fd is None:
+                    file.seek(start)
+                while position < stop:
+                    size = min(BLOCK_SIZE, stop - position)
+                    block = os.pread(fd, size, position) if fd is not None else file.read(size)
+                    if not block:
+                        return
+                    yield block
+                    position += len(block)
+            yield closing
+        finally:
+            file.close()
+
+    return f"multipart/byteranges; boundary={boundary}", content_length, generate()
@@ -0,0 +1,132 @@
+# app/chunking.py
+# Content-defined chunking for file versions. Cut points depend only on the
+# bytes around them, so an edit only moves the boundaries next to it: two
+# versions of a large file share every chunk outside the changed regions,
+# and each chunk is stored once as a blob.
+import bisect
+import hashlib
+import io
+
+from app.compression import DecodedFile
+
+CHUNKED_ENCODING = 'chunks'  # Blob.encoding of a blob stored as a list of chunks
+CHUNK_MIN_SIZE = 256 * 1024
+CHUNK_MAX_SIZE = 2 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+# The rolling fingerprint of a position is one pseudo-random bit for each of
+# the last 18 bytes; a chunk ends where it equals BOUNDARY_PATTERN, on
+# average every 2**18 bytes past the minimum (~512 KiB chunks). Mapping every
+# byte through a table and searching for the pattern both run in C (translate
+# and find), which a per-byte hash loop in Python cannot match. Half the byte
+# values map to 1 and the pattern is half ones, so skewed data such as text
+# still finds boundaries. Changing either would change every boundary.
+_ones = set(sorted(range(256), key=lambda value: hashlib.sha256(b'chunk-bit-%d' % value).digest())[:128])
+_BIT_TABLE = bytes(ord('1') if value in _ones else ord('0') for value in range(256))
+BOUNDARY_PATTERN = b'011010011001011010'
+
+
+def find_boundary(bits, start, end):
+    """Return the offset just past the first boundary that ends in
+    bits[start:end] (bits being the translated bytes), or None."""
+    found = bits.find(BOUNDARY_PATTERN, max(start - len(BOUNDARY_PATTERN), 0), end)
+    return found + len(BOUNDARY_PATTERN) if found >= 0 else None
+
+
+def iter_chunks(stream):
+    """Yield the content-defined chunks of a readable binary `stream`. Memory
+    is bounded by twice CHUNK_MAX_SIZE plus one read."""
+    buffer = bytearray()
+    bits = bytearray()
+    eof = False
+    while buffer or not eof:
+        while not eof and len(buffer) < CHUNK_MAX_SIZE:
+            block = stream.read(READ_SIZE)
+            if not block:
+                eof = True
+            buffer += block
+            bits += block.translate(_BIT_TABLE)
+
+        if len(buffer) <= CHUNK_MIN_SIZE and eof:
+            cut = len(buffer)
+        else:
+            end = min(len(buffer), CHUNK_MAX_SIZE)
+            cut = find_boundary(bits, CHUNK_MIN_SIZE, end) or end
+        yield bytes(buffer[:cut])
+        del buffer[:cut]
+        del bits[:cut]
+
+
+class ChunkedFile:
+    """Read-only, seekable view of a blob stored as chunks.
+
+    `chunks` lists (offset, size, chunk digest, chunk encoding) in order, and
+    open_blob(digest) opens a chunk's stored bytes. Chunk blobs are opened
+    one at a time as reading reaches them, and seeking goes straight to the
+    chunk holding the new position. Like DecodedFile it has no file
+    descriptor to hand out.
+    """
+
+    def __init__(self, open_blob, chunks):
+        self._open_blob = open_blob
+        self._chunks = chunks
+        self._offsets = [chunk[0] for chunk in chunks]
+        self._size = chunks[-1][0] + chunks[-1][1] if chunks else 0
+        self._position = 0
+        self._index = None
+        self._current = None
+
+    def _open_chunk(self, index):
+        if self._current is not None:
+            self._current.close()
+        offset, size, digest, encoding = self._chunks[index]
+        stored = self._open_blob(digest)
+        self._current = DecodedFile(stored, encoding) if encoding else stored
+        self._index = index
+        if self._position > offset:
+            self._current.seek(self._position - offset)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._size - self._position
+        parts = []
+        while size > 0 and self._position < self._size:
+            index = bisect.bisect_right(self._offsets, self._position) - 1
+            if index != self._index:
+                self._open_chunk(index)
+            data = self._current.read(min(size, self._offsets[index] + self._chunks[index][1] - self._position))
+            if not data:
+                raise IOError(f"Chunk {self._chunks[index][2]} is shorter than recorded")
+            parts.append(data)
+            self._position += len(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(0, min(offset, self._size))
+        # Reopen lazily on the next read, at the right place
+        if self._current is not None:
+            self._current.close()
+            self._current = self._index = None
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def fileno(self):
+        raise io.UnsupportedOperation("Chunked blobs have no file descriptor")
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,127 @@
+# app/compression.py
+# Optional compression of blobs at rest. A blob is stored either as-is or
+# encoded with one of CODECS; the Blob row records which. zstd is used only
+# when the `zstandard` package is installed.
+import gzip
+import io
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+CODECS = ('gzip', 'zstd')
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+BLOCK_SIZE = 64 * 1024
+
+# A first block that zlib at its fastest level cannot shrink below this
+# fraction is taken to be already-compressed data, and the blob is stored raw
+PROBE_MAX_RATIO = 0.9
+
+# Bodies shorter than this are stored raw: they fit in one filesystem block
+# either way, so encoding them saves no disk and costs a decode on every read
+MIN_COMPRESS_BYTES = 4096
+
+# Formats that are compressed already; encoding them again costs CPU for nothing
+INCOMPRESSIBLE_PREFIXES = ('image/', 'video/', 'audio/', 'font/woff', 'application/vnd.openxmlformats-',
+                           'application/vnd.oasis.opendocument.')
+INCOMPRESSIBLE_TYPES = {
+    'application/zip', 'application/gzip', 'application/x-gzip', 'application/x-bzip2', 'application/x-xz',
+    'application/zstd', 'application/x-7z-compressed', 'application/x-rar-compressed', 'application/vnd.rar',
+    'application/java-archive', 'application/epub+zip', 'application/x-compress',
+}
+COMPRESSIBLE_IMAGES = {'image/svg+xml', 'image/bmp', 'image/x-ms-bmp', 'image/tiff', 'image/x-icon'}
+
+
+def available(codec):
+    return codec == 'gzip' or (codec == 'zstd' and zstandard is not None)
+
+
+def is_compressible(mime_type):
+    mime_type = (mime_type or '').split(';')[0].strip().lower()
+    if mime_type in COMPRESSIBLE_IMAGES:
+        return True
+    return mime_type not in INCOMPRESSIBLE_TYPES and not mime_type.startswith(INCOMPRESSIBLE_PREFIXES)
+
+
+def worth_compressing(block):
+    """Cheap check on the first block of a body: is it big enough to gain
+    anything, and does it compress at all?"""
+    if len(block) < MIN_COMPRESS_BYTES:
+        return False
+    return len(zlib.compress(block, 1)) < len(block) * PROBE_MAX_RATIO
+
+
+def encoder(codec, out):
+    """Return a writable file that encodes into the open binary file `out`.
+    Closing it finishes the stream but leaves `out` open."""
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=out, mode='wb', compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(out, closefd=False)
+    raise ValueError(f"Unknown codec {codec!r}")
+
+
+class DecodedFile:
+    """Read-only view of the decoded bytes of the open encoded file `raw`.
+
+    Seeking forward decodes and discards; seeking backward starts again from
+    the beginning. fileno() raises, so servers that sendfile() file bodies
+    fall back to read() instead of sending the encoded bytes.
+    """
+
+    def __init__(self, raw, codec):
+        self._raw = raw
+        self._codec = codec
+        self._position = 0
+        self._stream = self._open()
+
+    def _open(self):
+        if self._codec == 'gzip':
+            return gzip.GzipFile(fileobj=self._raw, mode='rb')
+        if self._codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("Blob is zstd-encoded but the zstandard package is not installed")
+            return zstandard.ZstdDecompressor().stream_reader(self._raw, closefd=False)
+        raise ValueError(f"Unknown codec {self._codec!r}")
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = b''.join(iter(lambda: self._stream.read(BLOCK_SIZE), b''))
+        else:
+            data = self._stream.read(size)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("DecodedFile can only seek relative to the start or current position")
+        if offset < self._position:
+            self._stream.close()
+            self._raw.seek(0)
+            self._stream = self._open()
+            self._position = 0
+        while self._position < offset:
+            if not self.read(min(BLOCK_SIZE, offset - self._position)):
+                break
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def fileno(self):
+        raise io.UnsupportedOperation("Decoded blobs have no file descriptor")
+
+    def close(self):
+        self._stream.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,40 @@
+# app/export.py
+# Encoders for streamed exports. Rows come in batches (from yield_per
+# partitions) and each batch is encoded into one piece of the response, so
+# memory stays at about one batch whatever the size of the export, and the
+# client starts receiving data with the first batch.
+import csv
+import io
+import json
+from datetime import datetime
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def encode_rows(batches, fields, fmt):
+    """Yield `batches` (lists of mappings with at least `fields`) as text in
+    format `fmt`, one piece per batch. CSV starts with a header row right
+    away, so even an export whose first rows take a while shows progress."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        yield _drain(buffer)
+        for batch in batches:
+            writer.writerows([_plain(row[field]) for field in fields] for row in batch)
+            yield _drain(buffer)
+    else:
+        for batch in batches:
+            yield ''.join(json.dumps({field: _plain(row[field]) for field in fields}, separators=(',', ':')) + '\n'
+                          for row in batch)
@@ -0,0 +1,165 @@
+# app/logarchive.py
+# Log entries past the retention window, moved out of the logs table into one
+# gzip-compressed NDJSON file per month (<root>/YYYY-MM.ndjson.gz). Entries
+# are stored newest first, as the log API pages through them, so a read
+# starts at the top of the newest month in range, stops as soon as it passes
+# the start of the range, and never opens a month outside it. Next to each
+# month, YYYY-MM.index.json lists the users and actions it holds, so a
+# filtered read also skips the months that cannot match.
+import gzip
+import heapq
+import json
+import os
+import re
+import uuid
+from datetime import datetime
+
+FIELDS = ('id', 'action', 'timestamp', 'user_id', 'file_id', 'file_version', 'file_size')
+
+_MONTH_FILE = re.compile(r'(\d{4})-(\d{2})\.ndjson\.gz')
+
+
+def month_start(timestamp):
+    return datetime(timestamp.year, timestamp.month, 1)
+
+
+def next_month(start):
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def _sort_key(entry):
+    return entry['timestamp'], entry['id']
+
+
+class LogArchive:
+    def __init__(self, root):
+        self._root = root
+
+    def _path(self, start):
+        return os.path.join(self._root, f"{start:%Y-%m}.ndjson.gz")
+
+    def months(self):
+        """Start of each archived month, oldest first."""
+        if not os.path.isdir(self._root):
+            return []
+        found = (_MONTH_FILE.fullmatch(name) for name in os.listdir(self._root))
+        return sorted(datetime(int(match[1]), int(match[2]), 1) for match in found if match)
+
+    def _index_path(self, start):
+        return os.path.join(self._root, f"{start:%Y-%m}.index.json")
+
+    @staticmethod
+    def _signature(stat):
+        # A month file is only ever replaced whole, so this changes with every write
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+    def _read_month(self, start):
+        with gzip.open(self._path(start), 'rt', encoding='utf-8') as lines:
+            for line in lines:
+                entry = json.loads(line)
+                entry['timestamp'] = datetime.fromisoformat(entry['timestamp'])
+                yield entry
+
+    def _write_index(self, start, signature, user_ids, actions):
+        index = {'month': signature, 'user_ids': sorted(user_ids), 'actions': sorted(actions)}
+        temp_path = os.path.join(self._root, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as out:
+                json.dump(index, out)
+            os.replace(temp_path, self._index_path(start))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def month_index(self, start):
+        """(user IDs, actions) found in the month starting at `start`.
+
+        The index records which version of the month file it describes, and
+        is rebuilt from the month itself when that is not the current one:
+        months archived before indexes existed, or a write that stopped
+        between replacing the month and its index.
+        """
+        path = self._path(start)
+        try:
+            with open(self._index_path(start), encoding='utf-8') as f:
+                index = json.load(f)
+            if index['month'] == self._signature(os.stat(path)):
+                return set(index['user_ids']), set(index['actions'])
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+        user_ids, actions = set(), set()
+        with open(path, 'rb') as raw:
+            signature = self._signature(os.fstat(raw.fileno()))
+            with gzip.open(raw, 'rt', encoding='utf-8') as lines:
+                for line in lines:
+                    entry = json.loads(line)
+                    user_ids.add(entry['user_id'])
+                    actions.add(entry['action'])
+        self._write_index(start, signature, user_ids, actions)
+        return user_ids, actions
+
+    def write_month(self, start, entries):
+        """Add `entries` (dicts of FIELDS, newest first) to the month starting
+        at `start`, merged with whatever it already holds. The file is
+        replaced whole, so readers see either the old or the new one.
+        Returns the number of entries written."""
+        os.makedirs(self._root, exist_ok=True)
+        path = self._path(start)
+        merged = entries
+        if os.path.exists(path):
+            merged = heapq.merge(entries, self._read_month(start), key=_sort_key, reverse=True)
+
+        temp_path = os.path.join(self._root, f".{uuid.uuid4().hex}.tmp")
+        written = 0
+        last_id = None
+        user_ids, actions = set(), set()
+        try:
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as out:
+                for entry in merged:
+                    if entry['id'] == last_id:
+                        continue  # Archived before, by a run that stopped short of deleting it
+                    last_id = entry['id']
+                    record = {field: entry[field] for field in FIELDS}
+                    record['timestamp'] = entry['timestamp'].isoformat()
+                    out.write(json.dumps(record, separators=(',', ':')) + '\n')
+                    user_ids.add(entry['user_id'])
+                    actions.add(entry['action'])
+                    written += 1
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._write_index(start, self._signature(os.stat(path)), user_ids, actions)
+        return written
+
+    def read(self, since=None, until=None, before=None, user_id=None, actions=None):
+        """Yield archived entries newest first, within [since, until) and
+        before the (timestamp, id) cursor `before`, optionally only those of
+        `user_id` or with an action in `actions`."""
+        for start in reversed(self.months()):
+            end = next_month(start)
+            if since is not None and end <= since:
+                break  # This and every older month end before the range starts
+            if (until is not None and start >= until) or (before is not None and start > before[0]):
+                continue
+            if user_id is not None or actions:
+                month_users, month_actions = self.month_index(start)
+                if (user_id is not None and user_id not in month_users) or \
+                        (actions and month_actions.isdisjoint(actions)):
+                    continue
+            for entry in self._read_month(start):
+                timestamp = entry['timestamp']
+                if since is not None and timestamp < since:
+                    break
+                if until is not None and timestamp >= until:
+                    continue
+                if before is not None and (timestamp, entry['id']) >= before:
+                    continue
+                if user_id is not None and entry['user_id'] != user_id:
+                    continue
+                if actions and entry['action'] not in actions:
+                    continue
+                yield entry
@@ -0,0 +1,33 @@
+# app/logconfig.py
+# Structured (one JSON object per line) logging for the backend.
+import json
+import logging
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RESERVED})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level):
+    """Send the 'app' loggers to stderr as JSON lines at `level` (a name such as 'INFO')."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+
+    logger = logging.getLogger('app')
+    logger.handlers[:] = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
@@ -0,0 +1,113 @@
+# app/logwriter.py
+# In-process buffered sink for audit log rows. Requests enqueue plain dicts and
+# a background thread writes them in bulk, so logging adds no commit to the
+# request path.
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedLogWriter:
+    """Collects rows in a bounded queue and hands them to `write_rows` in
+    batches of up to `batch_size`, or whatever has accumulated after
+    `flush_interval` seconds.
+
+    `write_rows(rows)` must persist a list of dicts and raise on failure.
+    """
+
+    def __init__(self, write_rows, max_queue=10000, batch_size=500, flush_interval=1.0, retries=3):
+        self._write_rows = write_rows
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._retries = retries
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, row):
+        """Queue a row for writing. Returns False if the queue is full, in
+        which case the caller should write the row itself."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            return False
+
+    def flush(self):
+        """Write everything queued so far, helping from the calling thread,
+        and wait for batches the background thread is still writing."""
+        while True:
+            batch = self._drain(self._batch_size)
+            if not batch:
+                break
+            self._write(batch)
+        self._queue.join()
+
+    def close(self, timeout=10):
+        """Stop the background thread and flush what is left."""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def _ensure_started(self):
+        # Started lazily and per process: a thread started before a pre-fork
+        # server forks its workers would not exist in the children
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                batch = [self._queue.get(timeout=self._flush_interval)]
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            for attempt in range(1, self._retries + 1):
+                try:
+                    self._write_rows(batch)
+                    return
+                except Exception:
+                    logger.exception("Error writing log entries", extra={"entries": len(batch), "attempt": attempt})
+                    time.sleep(0.1 * attempt)
+            logger.error("Dropped log entries", extra={"entries": len(batch), "attempts": self._retries})
+        finally:
+            for _ in batch:
+                self._queue.task_done()
@@ -1,12 +1,48 @@
+import io
 import os
-from flask import Flask, request, jsonify, send_from_directory, send_file, make_response
+import uuid
+import time
+import logging
+import atexit
+import base64
+import hashlib
+import secrets
+import click
+from flask import (Flask, request, jsonify, send_from_directory, send_file, make_response, g, has_request_context,
+                   stream_with_context)
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import wrap_file
 from flask_cors import CORS
 from app.database import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.blobstore import (write_temp_blob, link_temp_blob, hash_file, place_blob, remove_blob, retire_blob,
+                           restore_blob, blob_path, blob_dir,
+                           blob_exists, open_blob, fetch_blob, flat_blob_path, flat_blobs, shard_blob)
+from app.storage import storage_from_url
+from app.logarchive import LogArchive, FIELDS as LOG_FIELDS, month_start, next_month
+from app.export import FORMATS as EXPORT_FORMATS, encode_rows
+from app.logwriter import BufferedLogWriter
+from app.tasks import TaskQueue
+from app.sessions import SessionTokens, UserCache, PasswordHasher
+from app.metrics import Registry
+from app.logconfig import configure_logging
+from app.zipstream import ZipEntry, stream_zip
+from app.byteranges import resolve_ranges, if_range_matches, FileSlice, multipart_byteranges
+from app.compression import available as codec_available, is_compressible, DecodedFile, CODECS
+from app.chunking import iter_chunks, ChunkedFile, CHUNKED_ENCODING, CHUNK_MAX_SIZE
+from app.thumbnails import ThumbnailCache, THUMBNAIL_SIZES, can_preview, render_thumbnails, placeholder_svg
+from app.search import NgramIndex, MATCH_MODES, FUZZY_THRESHOLD, normalize as normalize_query
 from flask_migrate import Migrate
+from sqlalchemy import tuple_, insert, update, delete, select, union, and_, or_, event, func, case, literal, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 import mimetypes
-from datetime import datetime
+from datetime import datetime, timezone, timedelta
+from collections import namedtuple, Counter, defaultdict
+from functools import partial
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from flask_cors import CORS
 from flask_cors import cross_origin
 
@@ -14,7 +50,7 @@ from flask_cors import cross_origin
 
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://postgres:password@db:5432/mydatabase'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://postgres:password@db:5432/mydatabase')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Enable CORS for all domains (or restrict to specific domains later)
@@ -23,10 +59,106 @@ CORS(app, origins=["http://localhost:3000", "http://localhost:5000", "http://loc
 
 
 
-# Set up database URI to connect to the PostgreSQL container
-app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://postgres:password@db:5432/mydatabase'
+# Set up database URI to connect to the PostgreSQL container (DATABASE_URL overrides it,
+# e.g. for benchmarks against a scratch database)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://postgres:password@db:5432/mydatabase')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Audit log writing: 'async' buffers entries and bulk-inserts them from a
+# background thread, 'sync' commits each entry on the request thread
+app.config['LOG_WRITE_MODE'] = os.environ.get('LOG_WRITE_MODE', 'async')
+app.config['LOG_SYNC_ACTIONS'] = set(filter(None, os.environ.get('LOG_SYNC_ACTIONS', 'file_deleted').split(',')))
+app.config['LOG_QUEUE_SIZE'] = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+app.config['LOG_BATCH_SIZE'] = int(os.environ.get('LOG_BATCH_SIZE', 500))
+app.config['LOG_FLUSH_INTERVAL'] = float(os.environ.get('LOG_FLUSH_INTERVAL', 1.0))
+
+# 'flask archive-logs' moves whole months of log entries older than
+# LOG_RETENTION_DAYS out of the table into compressed monthly files in
+# LOG_ARCHIVE_FOLDER (default: log_archive/ in the upload folder), where
+# /get_logs still finds them
+app.config['LOG_RETENTION_DAYS'] = int(os.environ.get('LOG_RETENTION_DAYS', 90))
+app.config['LOG_ARCHIVE_FOLDER'] = os.environ.get('LOG_ARCHIVE_FOLDER', '')
+
+# Structured logging level for the 'app' loggers (DEBUG, INFO, WARNING, ...)
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+configure_logging(app.config['LOG_LEVEL'])
+logger = logging.getLogger(__name__)
+
+# Compression at rest: uploads are stored encoded with STORAGE_CODEC ('gzip',
+# 'zstd' with the zstandard package installed, or 'none'). Types that are
+# already compressed (images, archives, media) are always stored as-is, and so
+# are uploads known to be over STORAGE_CODEC_MAX_BYTES: a range request that
+# has to be decoded reads from the start of the blob up to the range.
+app.config['STORAGE_CODEC'] = os.environ.get('STORAGE_CODEC', 'gzip').lower()
+app.config['STORAGE_CODEC_MAX_BYTES'] = int(os.environ.get('STORAGE_CODEC_MAX_BYTES', 16 * 1024 * 1024))
+if app.config['STORAGE_CODEC'] != 'none' and not codec_available(app.config['STORAGE_CODEC']):
+    logger.warning("Storage codec unavailable, using gzip", extra={"codec": app.config['STORAGE_CODEC']})
+    app.config['STORAGE_CODEC'] = 'gzip'
+
+# Retries for unlinking deleted blobs in the background
+app.config['UNLINK_RETRIES'] = int(os.environ.get('UNLINK_RETRIES', 5))
+
+# Cache-Control for downloads and file listings. Both carry strong ETags and
+# answer If-None-Match / If-Modified-Since with 304, so the default 'no-cache'
+# (revalidate before each use) never re-sends an unchanged file. A download
+# pinned to ?version=N can never change and may be cached outright.
+app.config['DOWNLOAD_CACHE_CONTROL'] = os.environ.get('DOWNLOAD_CACHE_CONTROL', 'private, no-cache')
+app.config['VERSION_CACHE_CONTROL'] = os.environ.get('VERSION_CACHE_CONTROL', 'private, max-age=31536000, immutable')
+app.config['LISTING_CACHE_CONTROL'] = os.environ.get('LISTING_CACHE_CONTROL', 'private, no-cache')
+
+# Thumbnails are rendered after upload by THUMBNAIL_WORKERS background threads
+# and kept on disk, least recently used evicted past THUMBNAIL_CACHE_BYTES.
+# Sources larger than THUMBNAIL_MAX_SOURCE_BYTES only get a placeholder.
+app.config['THUMBNAIL_WORKERS'] = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+app.config['THUMBNAIL_CACHE_BYTES'] = int(os.environ.get('THUMBNAIL_CACHE_BYTES', 256 * 1024 * 1024))
+app.config['THUMBNAIL_MAX_SOURCE_BYTES'] = int(os.environ.get('THUMBNAIL_MAX_SOURCE_BYTES', 50 * 1024 * 1024))
+
+# Filename search: 'trigram' uses the pg_trgm index on PostgreSQL, 'ngram' an
+# in-process index of the SEARCH_INDEX_USERS most recently searched users;
+# 'auto' picks trigram when the extension is installed
+app.config['SEARCH_BACKEND'] = os.environ.get('SEARCH_BACKEND', 'auto').lower()
+app.config['SEARCH_INDEX_USERS'] = int(os.environ.get('SEARCH_INDEX_USERS', 1000))
+
+# Default per-user quotas, used for users without their own ('flask set-quota');
+# unset means unlimited. Usage is counted across every version of every file.
+app.config['DEFAULT_QUOTA_BYTES'] = int(os.environ['DEFAULT_QUOTA_BYTES']) if os.environ.get('DEFAULT_QUOTA_BYTES') else None
+app.config['DEFAULT_QUOTA_FILES'] = int(os.environ['DEFAULT_QUOTA_FILES']) if os.environ.get('DEFAULT_QUOTA_FILES') else None
+
+# Tiering: with COLD_STORAGE_URL set ('s3://bucket/prefix/', or a directory on
+# a slower disk), 'flask tier-blobs' moves blobs nobody has downloaded or
+# changed for TIER_IDLE_DAYS there, if at least TIER_MIN_BYTES. Reading one
+# brings it back onto local disk. COLD_STORAGE_ENDPOINT points S3 at MinIO etc.
+app.config['COLD_STORAGE_URL'] = os.environ.get('COLD_STORAGE_URL', '')
+app.config['COLD_STORAGE_ENDPOINT'] = os.environ.get('COLD_STORAGE_ENDPOINT') or None
+app.config['TIER_IDLE_DAYS'] = int(os.environ.get('TIER_IDLE_DAYS', 30))
+app.config['TIER_MIN_BYTES'] = int(os.environ.get('TIER_MIN_BYTES', 1024 * 1024))
+
+# Threads per /upload_batch request that hash, compress and write file bodies
+app.config['UPLOAD_WORKERS'] = int(os.environ.get('UPLOAD_WORKERS', 4))
+
+# Chunked uploads with no init or chunk for UPLOAD_SESSION_TTL_HOURS are
+# deleted with their .part files: some at every new init, all of them by
+# 'flask expire-uploads'. A user has at most UPLOAD_SESSIONS_PER_USER open.
+app.config['UPLOAD_SESSION_TTL_HOURS'] = float(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24))
+app.config['UPLOAD_SESSIONS_PER_USER'] = int(os.environ.get('UPLOAD_SESSIONS_PER_USER', 20))
+
+# Sessions: login issues a token signed with SECRET_KEY, which must be set
+# outside debug mode (a debug server without one signs with a random key, so
+# its sessions end when it restarts). ALLOW_USER_ID_HEADER=true accepts the
+# bare user_id header as identity, for clients that predate tokens: anyone can
+# claim any user that way, so it is only for the length of a migration.
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+if not app.config['SECRET_KEY']:
+    if not app.debug:
+        raise RuntimeError("SECRET_KEY is not set; it signs session tokens")
+    logger.warning("SECRET_KEY is not set, signing session tokens with a random key")
+    app.config['SECRET_KEY'] = secrets.token_hex(32)
+app.config['SESSION_TOKEN_TTL'] = int(os.environ.get('SESSION_TOKEN_TTL', 12 * 60 * 60))
+app.config['ALLOW_USER_ID_HEADER'] = os.environ.get('ALLOW_USER_ID_HEADER', 'false').lower() == 'true'
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 10000))
+# Hashing processes per app process; each server worker starts its own pool
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+
 db.init_app(app)
 migrate = Migrate(app, db)
 
@@ -36,7 +168,7 @@ class User(db.Model):
     __tablename__ = 'users'
 
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=False, nullable=False)
+    username = db.Column(db.String(80), unique=False, nullable=False, index=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     hashed_password = db.Column(db.String(200), nullable=False)
 
@@ -61,11 +193,48 @@ class Log(db.Model):
     user = db.relationship('User', backref=db.backref('logs', lazy=True))
     file = db.relationship('File', backref=db.backref('logs', lazy=True), uselist=False)
 
+    __table_args__ = (
+        db.Index('ix_logs_timestamp_id', 'timestamp', 'id'),  # get_logs keyset pages
+        db.Index('ix_logs_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),  # per-user history
+        db.Index('ix_logs_file_id', 'file_id'),  # a file's history, and FK checks on file delete
+    )
+
     def __repr__(self):
         return f'<Log {self.id} - Action: {self.action}, User: {self.user_id}, Timestamp: {self.timestamp}>'
 
 
 
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)  # Content address of the stored bytes
+    size = db.Column(db.BigInteger, nullable=False)  # Unencoded size
+    encoding = db.Column(db.String(16), nullable=True)  # Codec the bytes on disk are stored with; NULL for raw, 'chunks' for BlobChunk rows
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Files, file versions and chunk lists pointing here
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # 'cold' once a copy is in cold storage; the local copy is then only a cache
+    tier = db.Column(db.String(16), nullable=False, default='hot', server_default='hot')
+
+    def __repr__(self):
+        return f'<Blob {self.sha256} - {self.size} bytes, {self.ref_count} refs>'
+
+
+class BlobChunk(db.Model):
+    __tablename__ = 'blob_chunks'
+
+    # The pieces, in order, of a blob stored as content-defined chunks; each
+    # piece is a blob of its own, shared by every blob that contains it
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('blobs.sha256'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    chunk_sha256 = db.Column(db.String(64), db.ForeignKey('blobs.sha256'), nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_blob_chunks_chunk_sha256', 'chunk_sha256'),  # FK checks when a chunk's blob row is deleted
+    )
+
+
 class File(db.Model):
     __tablename__ = 'files'  # Ensure the correct table name is referenced
 
@@ -73,42 +242,704 @@ class File(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     filepath = db.Column(db.String(255), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    content_hash = db.Column(db.String(64), db.ForeignKey('blobs.sha256'), nullable=True)  # NULL for files not yet migrated to the blob store
+    size = db.Column(db.BigInteger, nullable=True)  # Bytes; recorded during the upload write pass
+    mime_type = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)  # Current version; earlier ones are FileVersion rows
 
     user = db.relationship('User', back_populates='files')
+    blob = db.relationship('Blob')
+    versions = db.relationship('FileVersion', backref='file', cascade='all, delete-orphan',
+                               order_by='FileVersion.version')
+
+    # On PostgreSQL, /search also uses ix_files_user_id_filename_trgm, a GIN
+    # trigram index on (user_id, lower(filename)) created by migration only
+    __table_args__ = (
+        db.Index('uq_files_user_id_filename', 'user_id', 'filename', unique=True),  # get_files and name allocation
+        db.Index('ix_files_content_hash', 'content_hash'),  # FK checks when a blob row is deleted
+    )
 
 # Define the relationship in User model as well
 User.files = db.relationship('File', back_populates='user', cascade='all, delete-orphan')
 
 
-# Helper function to generate unique filename
-def get_unique_filename(user_id, filename):
-    user_folder = os.path.join(BASE_UPLOAD_FOLDER, str(user_id))  # Directory for each user
-    os.makedirs(user_folder, exist_ok=True)
-    
-    file_extension = os.path.splitext(filename)[1]
-    base_name = os.path.splitext(filename)[0]
-    
-    new_filename = filename
-    file_path = os.path.join(user_folder, new_filename)
-    
-    # Check if the file already exists and increment the filename if necessary
-    counter = 1
-    while os.path.exists(file_path):
-        new_filename = f"{base_name} ({counter}){file_extension}"
-        file_path = os.path.join(user_folder, new_filename)
-        counter += 1
+class FileVersion(db.Model):
+    __tablename__ = 'file_versions'
 
-    return new_filename, file_path
+    # Earlier versions of a File, each holding its own blob reference; the
+    # current version lives on the File row
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.Integer, db.ForeignKey('files.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    filepath = db.Column(db.String(255), nullable=False)
+    content_hash = db.Column(db.String(64), db.ForeignKey('blobs.sha256'), nullable=True)
+    size = db.Column(db.BigInteger, nullable=True)
+    mime_type = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)  # When this version was uploaded
+
+    __table_args__ = (
+        db.UniqueConstraint('file_id', 'version', name='uq_file_versions_file_id_version'),
+        db.Index('ix_file_versions_content_hash', 'content_hash'),  # FK checks when a blob row is deleted
+    )
 
-def log_file_action(action, user_id, file_id=None, file_version=None, file_size=None):
-    log = Log(
+    def __repr__(self):
+        return f'<FileVersion {self.file_id} v{self.version} - {self.size} bytes>'
+
+
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, handed to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    temp_path = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_active_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Init or latest chunk
+
+    chunks = db.relationship('UploadChunk', backref='upload', cascade='all, delete-orphan', lazy='dynamic')
+
+    __table_args__ = (
+        db.Index('ix_upload_sessions_user_id', 'user_id'),  # a user's open uploads, checked at init
+        db.Index('ix_upload_sessions_last_active_at', 'last_active_at'),  # the expiry sweep
+    )
+
+    def chunk_count(self):
+        return (self.total_size + self.chunk_size - 1) // self.chunk_size
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} - {self.filename}, {self.total_size} bytes>'
+
+
+class UploadChunk(db.Model):
+    __tablename__ = 'upload_chunks'
+
+    upload_id = db.Column(db.String(32), db.ForeignKey('upload_sessions.id'), primary_key=True)
+    offset = db.Column(db.BigInteger, primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+
+
+def acquire_blob(digest, size, encoding=None):
+    """Take a reference on blob `digest`, creating its row if needed. Not committed.
+
+    Returns (created, encoding the blob is stored with). If the row was
+    created here, the caller's copy of the bytes (stored with `encoding`) is
+    the one that must end up on disk.
+    """
+    take = update(Blob).where(Blob.sha256 == digest).values(ref_count=Blob.ref_count + 1).returning(Blob.encoding)
+    stored = db.session.execute(take).first()
+    if stored:
+        return False, stored.encoding
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(Blob(sha256=digest, size=size, encoding=encoding, ref_count=1))
+        return True, encoding
+    except IntegrityError:
+        # Another upload of the same bytes created the row first
+        return False, db.session.execute(take).scalar_one()
+
+
+def release_blob(digest):
+    """Drop a reference on blob `digest`. Not committed.
+
+    When the last reference goes, the row is deleted and the bytes are moved
+    aside while the row lock from the UPDATE is still held, so a concurrent
+    upload of the same content waits and then re-creates both. They are
+    unlinked once the deletion commits, and put back if it does not.
+    """
+    row = db.session.execute(
+        update(Blob).where(Blob.sha256 == digest).values(ref_count=Blob.ref_count - 1)
+        .returning(Blob.ref_count, Blob.encoding)
+    ).first()
+    if row is not None and row.ref_count <= 0:
+        drop_blob(digest, row.encoding)
+
+
+def release_blobs(references):
+    """Drop `references` ({digest: count}) with one UPDATE per distinct count,
+    usually just one. Not committed. Returns (digest, encoding) of the blobs
+    left unreferenced, which the caller must drop or queue for reaping."""
+    digests_by_count = defaultdict(list)
+    for digest, count in references.items():
+        digests_by_count[count].append(digest)
+    for count, digests in digests_by_count.items():
+        db.session.execute(update(Blob).where(Blob.sha256.in_(digests)).values(ref_count=Blob.ref_count - count),
+                           execution_options={"synchronize_session": False})
+    if not references:
+        return []
+    return db.session.execute(
+        select(Blob.sha256, Blob.encoding).where(Blob.sha256.in_(list(references)), Blob.ref_count <= 0)
+    ).all()
+
+
+def drop_blob(digest, encoding):
+    """Delete unreferenced blob `digest` (row locked by the caller) and its
+    bytes; a chunked blob also lets go of its chunks. Not committed: the
+    bytes are only moved aside until the transaction commits."""
+    if encoding == CHUNKED_ENCODING:
+        counts = db.session.execute(
+            select(BlobChunk.chunk_sha256, func.count()).where(BlobChunk.blob_sha256 == digest)
+            .group_by(BlobChunk.chunk_sha256)
+        ).all()
+        BlobChunk.query.filter_by(blob_sha256=digest).delete()
+        for chunk_digest, chunk_encoding in release_blobs(dict(counts)):
+            drop_blob(chunk_digest, chunk_encoding)
+    tier = db.session.execute(delete(Blob).where(Blob.sha256 == digest).returning(Blob.tier),
+                              execution_options={"synchronize_session": False}).scalar()
+    db.session.info.setdefault('retired_blobs', []).extend(retire_blob(BASE_UPLOAD_FOLDER, digest))
+    db.session.info.setdefault('dropped_blobs', set()).add(digest)
+    if tier == 'cold':
+        db.session.info.setdefault('cold_blobs', set()).add(digest)
+
+
+def reap_blob(digest):
+    """Delete blob `digest` if nothing references it any more, moving its
+    bytes aside while the row lock is held (as release_blob does). An upload that
+    took a new reference in the meantime keeps the blob alive."""
+    with app.app_context():
+        try:
+            blob = Blob.query.filter(Blob.sha256 == digest, Blob.ref_count <= 0).with_for_update().first()
+            if blob is not None:
+                drop_blob(digest, blob.encoding)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def chunk_list(digest):
+    """(offset, size, chunk digest, chunk encoding) of each chunk of blob `digest`, in order."""
+    rows = db.session.execute(
+        select(BlobChunk.offset, BlobChunk.size, BlobChunk.chunk_sha256, Blob.encoding)
+        .join(Blob, Blob.sha256 == BlobChunk.chunk_sha256)
+        .where(BlobChunk.blob_sha256 == digest)
+        .order_by(BlobChunk.position)
+    ).all()
+    return [tuple(row) for row in rows]
+
+
+def open_local_blob(digest):
+    """Open blob `digest` from local disk, first bringing it back from cold
+    storage if it was moved there."""
+    try:
+        return open_blob(BASE_UPLOAD_FOLDER, digest)
+    except FileNotFoundError:
+        if cold_storage is None:
+            raise
+    fetch_blob(BASE_UPLOAD_FOLDER, digest, cold_storage)
+    logger.info("Blob recalled from cold storage", extra={"digest": digest})
+    return open_blob(BASE_UPLOAD_FOLDER, digest)
+
+
+def open_path(filepath, digest):
+    """Open the stored bytes of a file or file version: blob `digest` through
+    the blob store, or `filepath` for files outside the store."""
+    return open_local_blob(digest) if digest else open(filepath, 'rb')
+
+
+def open_content(filepath, digest, encoding, chunks=None):
+    """Open stored content for reading its original bytes. A chunked blob is
+    read from `chunks` (its chunk_list()) instead."""
+    if encoding == CHUNKED_ENCODING:
+        return ChunkedFile(open_local_blob, chunks)
+    stored = open_path(filepath, digest)
+    return DecodedFile(stored, encoding) if encoding else stored
+
+
+def open_stored(filepath, blob):
+    """Open the bytes of a file or file version, `blob` being its Blob (None
+    for files outside the blob store, which are read from `filepath`).
+
+    Returns (file, encoding). Bytes in one of CODECS come back still encoded;
+    chunked blobs come back decoded. A blob re-stored as chunks after it was
+    loaded is re-read and opened through its chunks.
+    """
+    for attempt in range(2):
+        encoding = blob.encoding if blob is not None else None
+        try:
+            if encoding == CHUNKED_ENCODING:
+                return open_content(filepath, blob.sha256, encoding, chunk_list(blob.sha256)), encoding
+            return open_path(filepath, blob.sha256 if blob is not None else None), encoding
+        except FileNotFoundError:
+            if blob is None or attempt:
+                raise
+            db.session.refresh(blob)
+
+
+def remove_path(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard_temp_files(paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+# Bulk deletes leave unreferenced blob rows in place (ref_count 0) and unlink
+# them from here, so the client does not wait on the filesystem.
+# 'flask reap-blobs' picks up whatever this queue gave up on.
+unlink_queue = TaskQueue('blob-unlinker', retries=app.config['UNLINK_RETRIES'])
+
+
+def guess_mime_type(filename, fallback=None):
+    mime_type, _ = mimetypes.guess_type(filename)
+    return mime_type or fallback or 'application/octet-stream'
+
+
+def storage_codec(mime_type, size=None):
+    """Codec to store a body of `mime_type` (and `size` bytes, if known in
+    advance) with, or None to store it raw."""
+    codec = app.config['STORAGE_CODEC']
+    if size is not None and size > app.config['STORAGE_CODEC_MAX_BYTES']:
+        return None
+    return codec if codec != 'none' and is_compressible(mime_type) else None
+
+
+def store_blob(temp_path, digest, size, encoding=None):
+    """Take a reference on blob `digest` and move the hashed temp file into
+    place. Not committed. Returns (blob path, whether the blob is new)."""
+    created, stored_encoding = acquire_blob(digest, size, encoding)
+    if not created and stored_encoding != encoding:
+        # The blob keeps its stored form, which this copy is not in: its bytes
+        # live in its chunks, or are encoded otherwise (maybe only in cold storage)
+        os.remove(temp_path)
+        return blob_path(BASE_UPLOAD_FOLDER, digest), False
+    return place_blob(BASE_UPLOAD_FOLDER, digest, temp_path, replace=created), created
+
+
+def store_upload(user_id, filename, temp_path, digest, size, mime_type=None, encoding=None):
+    """Store a hashed temp file as the user's file `filename`. Not committed.
+
+    `size` is the unencoded size and `encoding` the codec the temp file was
+    written with. A blob that already exists keeps its stored form.
+    Returns what record_upload() does, and raises QuotaExceeded as it does.
+    """
+    absolute_filepath, created = store_blob(temp_path, digest, size, encoding)
+    try:
+        return record_upload(user_id, filename, absolute_filepath, digest, size, mime_type)
+    except Exception:
+        # Unlinked before the caller's rollback releases the blob row, so a
+        # concurrent upload of the same bytes cannot lose them
+        if created:
+            remove_blob(BASE_UPLOAD_FOLDER, digest)
+        raise
+
+
+def record_upload(user_id, filename, filepath, digest, size, mime_type=None):
+    """Make stored blob `digest` the user's file `filename`: a new File, or a
+    new version of the File already under that name. Not committed.
+
+    Returns (file, action), action being 'file_uploaded', 'file_version_added',
+    or None when the bytes match the current version and nothing changed.
+    New files and versions are charged to the user's usage, raising
+    QuotaExceeded if they do not fit.
+    """
+    columns = dict(filepath=filepath, content_hash=digest, size=size,
+                   mime_type=guess_mime_type(filename, mime_type))
+
+    if can_preview(columns['mime_type']):
+        db.session.info.setdefault('thumbnail_blobs', {})[digest] = columns['mime_type']
+
+    file = File.query.filter_by(user_id=user_id, filename=filename).with_for_update().first()
+    if file is None:
+        try:
+            with db.session.begin_nested():
+                file = File(filename=filename, user_id=user_id, version=1, **columns)
+                db.session.add(file)
+            charge_usage(user_id, size or 0, 1)
+            db.session.info.setdefault('search_added', []).append((user_id, file.id, filename))
+            return file, 'file_uploaded'
+        except IntegrityError:
+            # A concurrent upload of the same name created it first
+            file = File.query.filter_by(user_id=user_id, filename=filename).with_for_update().one()
+
+    if file.content_hash == digest:
+        release_blob(digest)  # The current version already holds a reference
+        return file, None
+
+    # Every version counts against the quota, so only the new bytes are charged
+    charge_usage(user_id, size or 0, 0)
+
+    # The current version moves into the history, taking its blob reference along
+    db.session.add(FileVersion(file_id=file.id, version=file.version, filepath=file.filepath,
+                               content_hash=file.content_hash, size=file.size, mime_type=file.mime_type,
+                               created_at=file.modified_at))
+    previous_hash = file.content_hash
+    for column, value in columns.items():
+        setattr(file, column, value)
+    file.version += 1
+
+    # Both sides of the change are re-stored as chunks once this commits
+    db.session.info.setdefault('chunk_blobs', set()).update(filter(None, (previous_hash, digest)))
+    return file, 'file_version_added'
+
+
+# Versions of a file are kept as content-defined chunks (see app.chunking),
+# so versions that differ in a few places share the rest of their bytes. The
+# re-storing happens in the background after the upload has committed; blobs
+# smaller than this are left whole.
+VERSION_CHUNKING_MIN_SIZE = 2 * CHUNK_MAX_SIZE
+
+
+def chunk_blob(digest):
+    """Re-store blob `digest` as content-defined chunks. Runs on chunk_queue."""
+    with app.app_context():
+        blob = db.session.get(Blob, digest)
+        if blob is None or blob.encoding == CHUNKED_ENCODING or blob.size < VERSION_CHUNKING_MIN_SIZE:
+            return
+        encoding = blob.encoding
+        db.session.rollback()  # No transaction open while the bytes are cut up
+        codec = app.config['STORAGE_CODEC'] if app.config['STORAGE_CODEC'] != 'none' else None
+
+        staged = []
+        try:
+            with open_content(blob_path(BASE_UPLOAD_FOLDER, digest), digest, encoding) as source:
+                for data in iter_chunks(source):
+                    staged.append(write_temp_blob(BASE_UPLOAD_FOLDER, io.BytesIO(data), codec))
+        except FileNotFoundError:
+            # Deleted, or re-stored by someone else, in the meantime
+            discard_temp_files(item[2] for item in staged)
+            return
+        except Exception:
+            discard_temp_files(item[2] for item in staged)
+            raise
+
+        new_chunks = []
+        placed = 0
+        try:
+            locked = Blob.query.filter_by(sha256=digest).with_for_update().first()
+            if locked is None or locked.encoding != encoding:
+                db.session.rollback()
+                discard_temp_files(item[2] for item in staged)
+                return
+
+            rows = []
+            offset = 0
+            for position, (chunk_digest, chunk_size, temp_path, chunk_encoding) in enumerate(staged):
+                _, created = store_blob(temp_path, chunk_digest, chunk_size, chunk_encoding)
+                placed += 1
+                if created:
+                    new_chunks.append(chunk_digest)
+                rows.append(dict(blob_sha256=digest, position=position, chunk_sha256=chunk_digest,
+                                 offset=offset, size=chunk_size))
+                offset += chunk_size
+            db.session.execute(insert(BlobChunk), rows)
+            locked.encoding = CHUNKED_ENCODING
+            if locked.tier == 'cold':
+                # Its bytes now live in the chunks, so the cold copy can go
+                locked.tier = 'hot'
+                db.session.info.setdefault('cold_blobs', set()).add(digest)
+            db.session.commit()
+        except Exception:
+            for chunk_digest in new_chunks:
+                remove_blob(BASE_UPLOAD_FOLDER, chunk_digest)
+            db.session.rollback()
+            discard_temp_files(item[2] for item in staged[placed:])
+            raise
+
+        # Readers that still saw the old encoding retry through the chunks
+        remove_blob(BASE_UPLOAD_FOLDER, digest)
+
+
+chunk_queue = TaskQueue('blob-chunker', retries=3)
+
+
+def make_thumbnails(digest, mime_type):
+    """Render and cache every thumbnail size of blob `digest`. Runs on
+    thumbnail_queue; a blob that cannot be rendered is not tried again."""
+    failed = False
+    try:
+        with app.app_context():
+            blob = db.session.get(Blob, digest)
+            if blob is None:
+                return  # Deleted before its turn came
+            if blob.size > app.config['THUMBNAIL_MAX_SOURCE_BYTES']:
+                failed = True
+                return
+            stored, encoding = open_stored(blob_path(BASE_UPLOAD_FOLDER, digest), blob)
+
+        # Decoders seek around in the source, so compressed bytes are decoded up front
+        if encoding in CODECS:
+            with DecodedFile(stored, encoding) as decoded:
+                stored = io.BytesIO(decoded.read())
+        with stored:
+            rendered = render_thumbnails(stored, mime_type, THUMBNAIL_SIZES.values())
+        for size, (data, extension) in rendered.items():
+            thumbnail_cache.put(digest, size, data, extension)
+    except Exception:
+        failed = True
+        logger.exception("Could not render thumbnails", extra={"digest": digest, "mime_type": mime_type})
+    finally:
+        thumbnail_cache.finish(digest, failed)
+
+
+thumbnail_queue = TaskQueue('thumbnailer', max_queue=1000, retries=1, workers=app.config['THUMBNAIL_WORKERS'])
+
+
+def queue_thumbnails(digest, mime_type):
+    if thumbnail_cache.get(digest, max(THUMBNAIL_SIZES.values())):
+        return  # Already made, e.g. for another file with the same bytes
+    if thumbnail_cache.claim(digest) and not thumbnail_queue.submit(partial(make_thumbnails, digest, mime_type)):
+        thumbnail_cache.finish(digest)  # Queue full; the next request for it tries again
+
+
+search_index = NgramIndex(app.config['SEARCH_INDEX_USERS'])
+
+# Work that may only happen once the transaction that called for it commits
+AFTER_COMMIT_KEYS = ('chunk_blobs', 'thumbnail_blobs', 'search_added', 'search_removed', 'cold_blobs',
+                     'dropped_blobs')
+
+
+@event.listens_for(db.session, 'after_commit')
+def run_committed_work(session):
+    if session.in_nested_transaction():
+        return  # A savepoint was released; the real commit is still to come
+    for digest in session.info.pop('chunk_blobs', ()):
+        chunk_queue.submit(partial(chunk_blob, digest))
+    for digest, mime_type in session.info.pop('thumbnail_blobs', {}).items():
+        queue_thumbnails(digest, mime_type)
+    for user_id, file_id, filename in session.info.pop('search_added', ()):
+        search_index.add(user_id, file_id, filename)
+    for user_id, file_id in session.info.pop('search_removed', ()):
+        search_index.remove(user_id, file_id)
+    for digest in session.info.pop('cold_blobs', ()):
+        unlink_queue.submit(partial(cold_storage.delete, digest))
+    for temp_path, _ in session.info.pop('retired_blobs', ()):
+        remove_path(temp_path)
+    for digest in session.info.pop('dropped_blobs', ()):
+        thumbnail_cache.discard(digest)
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def restore_uncommitted_blobs(session, transaction):
+    # Still listed when the outermost transaction ends, so it did not commit:
+    # rolled back, or closed with the session
+    if transaction.parent is None:
+        restore_blob(session.info.pop('retired_blobs', ()))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def forget_uncommitted_work(session, previous_transaction):
+    if previous_transaction.parent is None:
+        for key in AFTER_COMMIT_KEYS:
+            session.info.pop(key, None)
+
+
+class UserUsage(db.Model):
+    __tablename__ = 'user_usage'
+
+    # Kept in the same transaction as the files they count: charge_usage() on
+    # upload, release_usage() on delete. 'flask reconcile-usage' repairs drift.
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    bytes_stored = db.Column(db.BigInteger, nullable=False, default=0)
+    file_count = db.Column(db.Integer, nullable=False, default=0)
+    # NULL falls back to DEFAULT_QUOTA_BYTES / DEFAULT_QUOTA_FILES
+    quota_bytes = db.Column(db.BigInteger, nullable=True)
+    quota_files = db.Column(db.Integer, nullable=True)
+
+
+class DailyActionCount(db.Model):
+    __tablename__ = 'daily_action_counts'
+
+    # Number of log entries per action per (UTC) day
+    day = db.Column(db.Date, primary_key=True)
+    action = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+def increment_row(model, key, deltas):
+    """Add `deltas` to the row of `model` identified by `key`, creating it if
+    needed (the same UPDATE-then-INSERT pattern as acquire_blob). Not committed."""
+    values = {column: getattr(model, column) + delta for column, delta in deltas.items()}
+    if model.query.filter_by(**key).update(values):
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**key, **deltas))
+    except IntegrityError:
+        model.query.filter_by(**key).update(values)
+
+
+class QuotaExceeded(Exception):
+    """Storing a file would take its user past their quota."""
+
+
+def usage_limit(quota, default):
+    """SQL expression for a quota column's limit, NULL meaning unlimited."""
+    return quota if default is None else func.coalesce(quota, default)
+
+
+def charge_usage(user_id, size, files):
+    """Add `size` bytes and `files` files to the user's usage, or raise
+    QuotaExceeded if that would take them past a quota. Not committed.
+
+    The check and the increment are one conditional UPDATE, so concurrent
+    uploads cannot each see room for themselves and overshoot together.
+    """
+    conditions = []
+    for column, delta, quota, default in (
+            (UserUsage.bytes_stored, size, UserUsage.quota_bytes, app.config['DEFAULT_QUOTA_BYTES']),
+            (UserUsage.file_count, files, UserUsage.quota_files, app.config['DEFAULT_QUOTA_FILES'])):
+        if delta > 0:
+            limit = usage_limit(quota, default)
+            conditions.append(or_(limit.is_(None), column + delta <= limit))
+
+    charge = update(UserUsage).where(UserUsage.user_id == user_id, *conditions) \
+        .values(bytes_stored=UserUsage.bytes_stored + size, file_count=UserUsage.file_count + files)
+    if db.session.execute(charge, execution_options={"synchronize_session": False}).rowcount:
+        return
+
+    if db.session.execute(select(UserUsage.user_id).where(UserUsage.user_id == user_id)).first() is None:
+        # First upload: start the user at zero and charge again
+        try:
+            with db.session.begin_nested():
+                db.session.add(UserUsage(user_id=user_id, bytes_stored=0, file_count=0))
+        except IntegrityError:
+            pass  # A concurrent upload created it first
+        if db.session.execute(charge, execution_options={"synchronize_session": False}).rowcount:
+            return
+
+    raise QuotaExceeded(f"Storage quota exceeded for user {user_id}")
+
+
+def release_usage(user_id, size, files):
+    """Take deleted files off the user's usage. Not committed."""
+    increment_row(UserUsage, {"user_id": user_id}, {"bytes_stored": -size, "file_count": -files})
+
+
+def usage_status(user_id):
+    """The user's usage and effective quotas (None when unlimited)."""
+    usage = db.session.get(UserUsage, user_id)
+    quota_bytes = usage.quota_bytes if usage and usage.quota_bytes is not None else app.config['DEFAULT_QUOTA_BYTES']
+    quota_files = usage.quota_files if usage and usage.quota_files is not None else app.config['DEFAULT_QUOTA_FILES']
+    return {
+        "user_id": user_id,
+        "bytes_stored": usage.bytes_stored if usage else 0,
+        "file_count": usage.file_count if usage else 0,
+        "quota_bytes": quota_bytes,
+        "quota_files": quota_files
+    }
+
+
+def exceeds_quota(user_id, size, files=0):
+    """Whether `size` more bytes and `files` more files would not fit. Only a
+    precheck, to turn uploads away before their bodies are read; the limit
+    itself is enforced by charge_usage()."""
+    status = usage_status(user_id)
+    return ((status["quota_bytes"] is not None and status["bytes_stored"] + size > status["quota_bytes"]) or
+            (status["quota_files"] is not None and status["file_count"] + files > status["quota_files"]))
+
+
+def quota_exceeded_response(user_id):
+    return jsonify({"error": "Storage quota exceeded", "usage": usage_status(user_id)}), 413
+
+
+def daily_deltas(rows):
+    """Fold log rows into {(day, action): count}."""
+    daily = {}
+    for row in rows:
+        day_key = (row['timestamp'].date(), row['action'])
+        daily[day_key] = daily.get(day_key, 0) + 1
+    return daily
+
+
+def apply_rollups(rows):
+    """Update the daily action counts for freshly written log rows. Not
+    committed, so the counts move in the same transaction as the log entries."""
+    for (day, action), count in sorted(daily_deltas(rows).items()):
+        increment_row(DailyActionCount, {"day": day, "action": action}, {"count": count})
+
+
+def insert_log_rows(rows):
+    try:
+        db.session.execute(insert(Log), rows)
+        apply_rollups(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def write_log_row(row):
+    try:
+        insert_log_rows([row])
+    except IntegrityError:
+        if row['file_id'] is None:
+            raise
+        # The file was deleted while the entry waited in the queue; keep the
+        # entry without the reference, as deleting a file does for logged ones
+        insert_log_rows([dict(row, file_id=None)])
+
+
+def write_log_rows(rows):
+    """Bulk-insert log rows (dicts of Log columns) in a single transaction.
+    If the batch fails, the rows are written one at a time so one bad row
+    does not take the rest with it; raises only if none could be written."""
+    with app.app_context():
+        try:
+            insert_log_rows(rows)
+            return
+        except Exception:
+            if len(rows) == 1:
+                raise
+            logger.exception("Error writing log batch, writing entries one at a time", extra={"entries": len(rows)})
+
+        written = 0
+        for row in rows:
+            try:
+                write_log_row(row)
+                written += 1
+            except Exception:
+                logger.exception("Dropped log entry", extra={"action": row['action'], "user_id": row['user_id']})
+        if not written:
+            raise RuntimeError(f"None of {len(rows)} log entries could be written")
+
+
+log_writer = BufferedLogWriter(
+    write_log_rows,
+    max_queue=app.config['LOG_QUEUE_SIZE'],
+    batch_size=app.config['LOG_BATCH_SIZE'],
+    flush_interval=app.config['LOG_FLUSH_INTERVAL']
+)
+atexit.register(log_writer.close)
+
+
+def file_action_row(action, user_id, file_id=None, file_version=None, file_size=None):
+    return dict(
         action=action,
+        timestamp=datetime.utcnow(),
         user_id=user_id,
         file_id=file_id,
         file_version=file_version,
-        file_size=file_size  # This is now valid since file_size is in the model
+        file_size=file_size
     )
-    db.session.add(log)
+
+
+def log_file_action(action, user_id, file_id=None, file_version=None, file_size=None):
+    log_file_actions([file_action_row(action, user_id, file_id, file_version, file_size)])
+
+
+def log_file_actions(rows):
+    """Log several file_action_row() rows together, with one bulk insert."""
+    # Buffered by default; actions in LOG_SYNC_ACTIONS (and everything in
+    # 'sync' mode) are committed before the request returns
+    if app.config['LOG_WRITE_MODE'] == 'async':
+        rows = [row for row in rows
+                if row['action'] in app.config['LOG_SYNC_ACTIONS'] or not log_writer.submit(row)]
+        if not rows:
+            return
+
+    db.session.execute(insert(Log), rows)
+    apply_rollups(rows)
     db.session.commit()
 
 def log_user_action(action, user_id):
@@ -125,12 +956,135 @@ def log_user_action(action, user_id):
         )
         db.session.add(log_entry)
         db.session.commit()
-        print(f"User action logged: {action} by user {user_id}")
-    except Exception as e:
-        print(f"Error logging user action: {str(e)}")
+        logger.info("User action logged", extra={"action": action, "user_id": user_id})
+    except Exception:
+        logger.exception("Error logging user action", extra={"action": action, "user_id": user_id})
+
+
+
+
+session_tokens = SessionTokens(app.config['SECRET_KEY'], app.config['SESSION_TOKEN_TTL'])
+user_cache = UserCache(app.config['USER_CACHE_SIZE'])
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_WORKERS'])
+atexit.register(password_hasher.shutdown)
+
+CachedUser = namedtuple('CachedUser', ['id', 'username', 'email'])
+
+
+def load_user(user_id):
+    """Return the CachedUser for `user_id`, querying the database only on a cache miss."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    cached = user_cache.get(user_id)
+    if cached is None:
+        user = db.session.get(User, user_id)
+        if not user:
+            return None
+        cached = CachedUser(user.id, user.username, user.email)
+        user_cache.put(user_id, cached)
+    return cached
+
+
+def get_request_user_id():
+    """Return the id of the user making the request, or None.
+
+    Taken from the 'Authorization: Bearer <token>' session token, which is
+    verified without touching the database, or else from the legacy user_id
+    header when ALLOW_USER_ID_HEADER is on.
+    """
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        return session_tokens.verify(auth[len('Bearer '):])
+
+    if app.config['ALLOW_USER_ID_HEADER']:
+        try:
+            return int(request.headers.get('user_id'))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+# Instrumentation: per-endpoint latency, DB work per request, bytes moved and
+# requests in flight, exposed in Prometheus text format at /metrics
+metrics = Registry()
+request_latency = metrics.histogram('http_request_duration_seconds', 'Time spent handling a request.',
+                                    ['endpoint', 'method', 'status'])
+requests_in_flight = metrics.gauge('http_requests_in_flight', 'Requests currently being handled.', ['endpoint'])
+db_queries_per_request = metrics.histogram('db_queries_per_request', 'SQL statements executed per request.',
+                                           ['endpoint'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100))
+db_seconds_per_request = metrics.histogram('db_query_seconds_per_request', 'Time spent in SQL per request.',
+                                           ['endpoint'])
+bytes_received = metrics.counter('http_request_bytes_total', 'Request body bytes received.', ['endpoint'])
+bytes_sent = metrics.counter('http_response_bytes_total', 'Response body bytes sent.', ['endpoint'])
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context: a statement that fails never
+    # reaches after_cursor_execute, and must not leave its start time behind
+    # for the connection's next statement to pick up
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    # Statements from the background log writer have no request to charge
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_seconds += elapsed
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
+    g.metrics_endpoint = request.endpoint or 'unmatched'
+    requests_in_flight.inc(endpoint=g.metrics_endpoint)
+
+
+def observe_request(endpoint, status, content_length=None):
+    request_latency.observe(time.perf_counter() - g.request_started,
+                            endpoint=endpoint, method=request.method, status=status)
+    db_queries_per_request.observe(g.db_queries, endpoint=endpoint)
+    db_seconds_per_request.observe(g.db_seconds, endpoint=endpoint)
+    if request.content_length:
+        bytes_received.inc(request.content_length, endpoint=endpoint)
+    if content_length:
+        bytes_sent.inc(content_length, endpoint=endpoint)
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed bodies are counted by their Content-Length; latency covers the
+    # handler, not the time the server spends sending the body
+    if 'metrics_endpoint' in g:
+        observe_request(g.metrics_endpoint, response.status_code, response.content_length)
+        g.metrics_observed = True
+    return response
+
 
+@app.teardown_request
+def finish_request_metrics(exc):
+    if 'metrics_endpoint' not in g:
+        return
+    if not g.get('metrics_observed'):
+        observe_request(g.metrics_endpoint, 500)  # The handler raised
+    requests_in_flight.dec(endpoint=g.metrics_endpoint)
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 
 # Route to log in a user (Authentication)
 @app.route('/login', methods=['POST'])
@@ -150,31 +1104,33 @@ def login():
     user = User.query.filter_by(email=email).first()
 
     if user:
-        print(f"User found: {user.username}, password hash: {user.hashed_password}")
-        # Check password hash
-        if check_password_hash(user.hashed_password, password):
+        logger.debug("Login attempt", extra={"user_id": user.id})
+        # Check password hash (in the hashing process pool)
+        if password_hasher.check(user.hashed_password, password):
+            user_cache.put(user.id, CachedUser(user.id, user.username, user.email))
             log_file_action(action='user_logged_in', user_id=user.id)
             return jsonify({
                 "message": f"Welcome, {user.username}!",
-                "user_id": user.id
+                "user_id": user.id,
+                "token": session_tokens.issue(user.id)
             }), 200
         else:
-            print("Password does not match")
+            logger.info("Login failed: password does not match", extra={"user_id": user.id})
             return jsonify({"error": "Invalid email or password"}), 401
     else:
-        print("User not found")
+        logger.info("Login failed: user not found")
         return jsonify({"error": "Invalid email or password"}), 401
 
 
 @app.route('/logout', methods=['POST'])
 @cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
 def logout():
-    user_id = request.headers.get('user_id')
+    user_id = get_request_user_id()
     if not user_id:
         return jsonify({"error": "User ID not provided"}), 400
 
     # Fetch the user object using the user_id
-    user = User.query.get(user_id)  # Assuming SQLAlchemy, adapt for your ORM
+    user = load_user(user_id)
 
     if not user:
         return jsonify({"error": "User not found"}), 404
@@ -221,7 +1177,7 @@ def add_user():
         return jsonify({"error": "Email already in use"}), 400
 
     # Hash the password before storing it
-    hashed_password = generate_password_hash(password)
+    hashed_password = password_hasher.hash(password)
 
     # Create a new user and add it to the database
     new_user = User(username=username, email=email, hashed_password=hashed_password)
@@ -234,19 +1190,52 @@ def add_user():
     # Return a success message
     return jsonify({
         "message": f"Welcome, {new_user.username}!",
-        "user_id": new_user.id
+        "user_id": new_user.id,
+        "token": session_tokens.issue(new_user.id)
     }), 201
 
 
-BASE_UPLOAD_FOLDER = '/app/files'  # Directory inside the Docker container
+BASE_UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', '/app/files')  # Directory inside the Docker container
 
 # Ensure the uploads directory exists (this path exists in the container, not the host machine)
 os.makedirs(BASE_UPLOAD_FOLDER, exist_ok=True)
 
+thumbnail_cache = ThumbnailCache(BASE_UPLOAD_FOLDER, app.config['THUMBNAIL_CACHE_BYTES'])
+log_archive = LogArchive(app.config['LOG_ARCHIVE_FOLDER'] or os.path.join(BASE_UPLOAD_FOLDER, 'log_archive'))
+cold_storage = (storage_from_url(app.config['COLD_STORAGE_URL'], app.config['COLD_STORAGE_ENDPOINT'])
+                if app.config['COLD_STORAGE_URL'] else None)
+
+# Allowance for the multipart framing around file bodies (boundaries, part
+# headers) when judging an upload's size from its Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def upload_too_large(user_id):
+    """Whether the request body cannot fit in the user's remaining quota.
+    Only looks at Content-Length, so nothing of the body has been read yet."""
+    length = request.content_length
+    return length is not None and exceeds_quota(user_id, max(length - MULTIPART_OVERHEAD, 0))
+
+
 # Route to upload file
 @app.route('/upload', methods=['POST'])
 @cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
 def upload_file():
+    # Get the user ID from the request headers
+    user_id = get_request_user_id()
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    # Fetch the user from the database
+    user = load_user(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    # Turn away an upload that cannot fit before its body is parsed and written
+    if upload_too_large(user.id):
+        return quota_exceeded_response(user.id)
+
     if 'file' not in request.files:
         return jsonify({"error": "No file provided"}), 400
 
@@ -258,45 +1247,385 @@ def upload_file():
     # Secure the filename
     filename = secure_filename(file.filename)
 
-    # Get the user ID from the request headers
-    user_id = request.headers.get('user_id')
+    mime_type = guess_mime_type(filename, file.mimetype)
+
+    try:
+        # Stream the body into the blob store, hashing (and compressing) it on the way
+        # The request's length stands in for the file's, which is not known yet
+        digest, file_size, temp_path, encoding = write_temp_blob(BASE_UPLOAD_FOLDER, file.stream,
+                                                                 storage_codec(mime_type, request.content_length))
+    except Exception as e:
+        return jsonify({"error": f"Error saving file: {str(e)}"}), 500
+
+    # Create a new file record in the database
+    try:
+        new_file, action = store_upload(user.id, filename, temp_path, digest, file_size, mime_type, encoding)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if isinstance(e, QuotaExceeded):
+            return quota_exceeded_response(user.id)
+        return jsonify({"error": f"Error saving file: {str(e)}"}), 500
+
+    # Log the upload action with the file size (nothing to log if the bytes were unchanged)
+    if action:
+        log_file_action(action=action, user_id=user.id, file_id=new_file.id, file_size=file_size,
+                        file_version=new_file.version)
+
+    return jsonify({
+        "message": f"File {new_file.filename} uploaded successfully for user {user.username}!",
+        "file_id": new_file.id,
+        "filename": new_file.filename,
+        "version": new_file.version
+    }), 201
+
+
+UPLOAD_BATCH_MAX_FILES = 5000
 
+
+# Route to upload many files in one request, stored in a single transaction
+@app.route('/upload_batch', methods=['POST'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def upload_batch():
+    user_id = get_request_user_id()
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
 
-    try:
-        # Generate unique filename and file path
-        unique_filename, absolute_filepath = get_unique_filename(user_id, filename)
+    user = load_user(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
 
-        # Save the file to the user's directory
-        file.save(absolute_filepath)
+    if upload_too_large(user.id):
+        return quota_exceeded_response(user.id)
+
+    uploads = request.files.getlist('files')
+    if not uploads:
+        return jsonify({"error": "No files provided"}), 400
+    if len(uploads) > UPLOAD_BATCH_MAX_FILES:
+        return jsonify({"error": f"At most {UPLOAD_BATCH_MAX_FILES} files can be uploaded at once"}), 400
+
+    results = [{"filename": upload.filename} for upload in uploads]
+    filenames = [secure_filename(upload.filename or '') for upload in uploads]
+    for result, filename in zip(results, filenames):
+        if not filename:
+            result["error"] = "No selected file"
+    if any("error" in result for result in results):
+        return jsonify({"error": "Invalid files in batch", "results": results}), 400
+
+    mime_types = [guess_mime_type(filename, upload.mimetype) for filename, upload in zip(filenames, uploads)]
+
+    # Hash, compress and write the bodies in parallel (hashlib and zlib
+    # release the GIL on large blocks); the database is not touched yet
+    with ThreadPoolExecutor(max_workers=min(app.config['UPLOAD_WORKERS'], len(uploads))) as pool:
+        futures = [pool.submit(write_temp_blob, BASE_UPLOAD_FOLDER, upload.stream, storage_codec(mime_type))
+                   for upload, mime_type in zip(uploads, mime_types)]
+
+    staged = []
+    for result, future in zip(results, futures):
+        try:
+            staged.append(future.result())
+        except Exception as e:
+            staged.append(None)
+            result["error"] = f"Error saving file: {str(e)}"
+    if any(item is None for item in staged):
+        discard_temp_files(item[2] for item in staged if item)
+        return jsonify({"error": "Batch upload failed", "results": results}), 500
+
+    # All File and Log rows, the usage charges and the rollups go into one
+    # transaction: a batch that does not fit the quota stores nothing
+    new_blobs = []
+    placed = 0
+    try:
+        rows = []
+        for result, filename, mime_type, (digest, file_size, temp_path, encoding) in \
+                zip(results, filenames, mime_types, staged):
+            filepath, created = store_blob(temp_path, digest, file_size, encoding)
+            placed += 1
+            if created:
+                new_blobs.append(digest)
+            new_file, action = record_upload(user.id, filename, filepath, digest, file_size, mime_type)
+            if action:
+                rows.append(file_action_row(action, user.id, file_id=new_file.id,
+                                            file_size=file_size, file_version=new_file.version))
+            result.update(file_id=new_file.id, version=new_file.version, size=file_size)
+
+        if rows:
+            db.session.execute(insert(Log), rows)
+            apply_rollups(rows)
+        db.session.commit()
     except Exception as e:
-        return jsonify({"error": f"Error saving file: {str(e)}"}), 500
+        # Blobs this batch created are unlinked before the rollback releases
+        # their rows, so a concurrent upload of the same bytes cannot lose them
+        for digest in new_blobs:
+            remove_blob(BASE_UPLOAD_FOLDER, digest)
+        db.session.rollback()
+        discard_temp_files(item[2] for item in staged[placed:])
+        for result in results:
+            for key in ("file_id", "version", "size"):
+                result.pop(key, None)
+        if isinstance(e, QuotaExceeded):
+            return quota_exceeded_response(user.id)
+        return jsonify({"error": f"Error saving files: {str(e)}", "results": results}), 500
 
-    # Fetch the user from the database
-    user = User.query.get(user_id)
+    return jsonify({
+        "message": f"{len(results)} files uploaded successfully for user {user.username}!",
+        "results": results
+    }), 201
+
+
+# Chunked (resumable) uploads: init -> PUT chunk at offset -> finalize.
+# Chunks are streamed from the request body straight into a sparse .part file
+# in the user's folder, so memory per upload is bounded by STREAM_BUFFER_SIZE.
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+STREAM_BUFFER_SIZE = 64 * 1024
+UPLOAD_SWEEP_BATCH = 100  # Expired sessions cleaned up by each init
+
+
+def upload_session_cutoff():
+    """Sessions last active before this have expired."""
+    return datetime.utcnow() - timedelta(hours=app.config['UPLOAD_SESSION_TTL_HOURS'])
+
+
+def expire_upload_sessions(limit=UPLOAD_SWEEP_BATCH):
+    """Delete up to `limit` expired upload sessions, oldest first, and once
+    that commits their .part files. Returns how many were deleted."""
+    # Locked, so a chunk arriving meanwhile waits and then finds no session
+    stale = db.session.execute(
+        select(UploadSession.id, UploadSession.temp_path)
+        .where(UploadSession.last_active_at < upload_session_cutoff())
+        .order_by(UploadSession.last_active_at).limit(limit)
+        .with_for_update()
+    ).all()
+    if not stale:
+        db.session.rollback()
+        return 0
+    upload_ids = [row.id for row in stale]
+    db.session.execute(delete(UploadChunk).where(UploadChunk.upload_id.in_(upload_ids)),
+                       execution_options={"synchronize_session": False})
+    db.session.execute(delete(UploadSession).where(UploadSession.id.in_(upload_ids)),
+                       execution_options={"synchronize_session": False})
+    db.session.commit()
+    for row in stale:
+        remove_path(row.temp_path)
+    return len(stale)
+
+
+def get_upload_session(upload_id):
+    """Return (upload, None) or (None, error response) for the requesting user."""
+    user_id = get_request_user_id()
+    if not user_id:
+        return None, (jsonify({"error": "User ID is required"}), 400)
+
+    upload = UploadSession.query.get(upload_id)
+    if not upload:
+        return None, (jsonify({"error": "Upload not found"}), 404)
+
+    if upload.user_id != int(user_id):
+        return None, (jsonify({"error": "Unauthorized"}), 403)
+
+    return upload, None
+
+
+@app.route('/upload/init', methods=['POST'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def init_upload():
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    data = request.get_json() or {}
+    filename = secure_filename(data.get("filename") or '')
+    total_size = data.get("total_size")
+    chunk_size = data.get("chunk_size") or DEFAULT_CHUNK_SIZE
+
+    if not filename or not isinstance(total_size, int) or total_size < 0:
+        return jsonify({"error": "Missing required fields"}), 400
+
+    if not isinstance(chunk_size, int) or not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        return jsonify({"error": f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}"}), 400
+
+    user = load_user(user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    # Create a new file record in the database
-    new_file = File(filename=unique_filename, filepath=absolute_filepath, user_id=user_id)
-    db.session.add(new_file)
+    expire_upload_sessions()
+
+    # Open sessions count against the quota as if they were already
+    # finalized, so several inits cannot each claim the same room
+    pending = db.session.execute(
+        select(UploadSession.filename, UploadSession.total_size)
+        .where(UploadSession.user_id == user.id, UploadSession.last_active_at >= upload_session_cutoff())
+    ).all()
+    if len(pending) >= app.config['UPLOAD_SESSIONS_PER_USER']:
+        return jsonify({"error": "Too many uploads in progress"}), 429
+
+    # A name the user already has becomes a new version, not a new file
+    names = {row.filename for row in pending} | {filename}
+    existing = set(db.session.execute(
+        select(File.filename).where(File.user_id == user.id, File.filename.in_(names))).scalars())
+    if exceeds_quota(user.id, total_size + sum(row.total_size for row in pending), len(names - existing)):
+        return quota_exceeded_response(user.id)
+
+    upload_id = uuid.uuid4().hex
+    user_folder = os.path.join(BASE_UPLOAD_FOLDER, str(user.id))
+    os.makedirs(user_folder, exist_ok=True)
+    temp_path = os.path.join(user_folder, f".upload-{upload_id}.part")
+
+    try:
+        # Pre-size the file so chunks can be written at any offset, in any order
+        with open(temp_path, 'wb') as part:
+            part.truncate(total_size)
+    except Exception as e:
+        return jsonify({"error": f"Error creating upload: {str(e)}"}), 500
+
+    upload = UploadSession(id=upload_id, user_id=user.id, filename=filename,
+                           total_size=total_size, chunk_size=chunk_size, temp_path=temp_path)
+    db.session.add(upload)
     db.session.commit()
 
-    # Log the upload action with the file size
-    file_size = os.path.getsize(absolute_filepath)  # Get file size in bytes
-    log_file_action(action='file_uploaded', user_id=user.id, file_id=new_file.id, file_size=file_size, file_version=1)
+    return jsonify({
+        "upload_id": upload_id,
+        "chunk_size": chunk_size,
+        "chunk_count": upload.chunk_count()
+    }), 201
+
+
+@app.route('/upload/<upload_id>', methods=['GET'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def upload_status(upload_id):
+    upload, error = get_upload_session(upload_id)
+    if error:
+        return error
+
+    received = {offset for (offset,) in upload.chunks.with_entities(UploadChunk.offset)}
+    missing = [offset for offset in range(0, upload.total_size, upload.chunk_size) if offset not in received]
+
+    return jsonify({
+        "upload_id": upload.id,
+        "filename": upload.filename,
+        "total_size": upload.total_size,
+        "chunk_size": upload.chunk_size,
+        "received_chunks": len(received),
+        "missing_offsets": missing
+    }), 200
+
+
+@app.route('/upload/<upload_id>/chunk', methods=['PUT'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def upload_chunk(upload_id):
+    upload, error = get_upload_session(upload_id)
+    if error:
+        return error
+
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({"error": "offset query parameter is required"}), 400
 
-    return jsonify({"message": f"File {unique_filename} uploaded successfully for user {user.username}!"}), 201
+    if offset < 0 or offset >= upload.total_size or offset % upload.chunk_size:
+        return jsonify({"error": "offset must be a chunk boundary inside the file"}), 400
+
+    expected = min(upload.chunk_size, upload.total_size - offset)
+    if request.content_length != expected:
+        return jsonify({"error": f"Chunk at offset {offset} must be {expected} bytes"}), 400
+
+    received = 0
+    try:
+        fd = os.open(upload.temp_path, os.O_WRONLY)
+        try:
+            while received < expected:
+                block = request.stream.read(min(STREAM_BUFFER_SIZE, expected - received))
+                if not block:
+                    break
+                os.pwrite(fd, block, offset + received)
+                received += len(block)
+        finally:
+            os.close(fd)
+    except Exception as e:
+        return jsonify({"error": f"Error saving chunk: {str(e)}"}), 500
+
+    if received != expected:
+        # Connection dropped mid-chunk; the client resends this offset
+        return jsonify({"error": f"Incomplete chunk: got {received} of {expected} bytes"}), 400
+
+    try:
+        touched = db.session.execute(
+            update(UploadSession).where(UploadSession.id == upload.id).values(last_active_at=datetime.utcnow()),
+            execution_options={"synchronize_session": False})
+        if not touched.rowcount:
+            db.session.rollback()
+            return jsonify({"error": "Upload not found"}), 404  # Expired while the chunk was coming in
+        db.session.merge(UploadChunk(upload_id=upload.id, offset=offset, size=received))
+        db.session.commit()
+    except IntegrityError:
+        # The same chunk was recorded concurrently; the bytes on disk are identical
+        db.session.rollback()
+
+    return jsonify({"upload_id": upload.id, "offset": offset, "size": received}), 200
+
+
+@app.route('/upload/<upload_id>/finalize', methods=['POST'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def finalize_upload(upload_id):
+    upload, error = get_upload_session(upload_id)
+    if error:
+        return error
+
+    received = upload.chunks.count()
+    if received != upload.chunk_count():
+        return jsonify({"error": f"Upload incomplete: {received} of {upload.chunk_count()} chunks received"}), 409
+
+    codec = storage_codec(guess_mime_type(upload.filename), upload.total_size)
+    temp_path = None
+    try:
+        if codec:
+            # One pass over the assembled file both hashes and encodes it
+            with open(upload.temp_path, 'rb') as part:
+                digest, file_size, temp_path, encoding = write_temp_blob(BASE_UPLOAD_FOLDER, part, codec)
+        else:
+            # Stored as is, but through a link: storing consumes its temp
+            # file, and the .part must survive a failure for the next attempt
+            digest, file_size = hash_file(upload.temp_path)
+            temp_path, encoding = link_temp_blob(BASE_UPLOAD_FOLDER, upload.temp_path), None
+        part_path = upload.temp_path
+        new_file, action = store_upload(upload.user_id, upload.filename, temp_path, digest, file_size,
+                                        encoding=encoding)
+        db.session.delete(upload)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        if isinstance(e, QuotaExceeded):
+            # The session stays, so the upload can be finalized once there is room
+            return quota_exceeded_response(upload.user_id)
+        return jsonify({"error": f"Error saving file: {str(e)}"}), 500
+
+    if os.path.exists(part_path):
+        os.remove(part_path)
+
+    if action:
+        log_file_action(action=action, user_id=new_file.user_id, file_id=new_file.id,
+                        file_size=file_size, file_version=new_file.version)
+
+    return jsonify({
+        "message": f"File {new_file.filename} uploaded successfully!",
+        "file_id": new_file.id,
+        "filename": new_file.filename,
+        "version": new_file.version
+    }), 201
 
 
 # Route to delete file
 @app.route('/delete_file/<int:file_id>', methods=['DELETE'])
 def delete_file(file_id):
-    user_id = request.headers.get('user_id')  # Get the user ID from the headers
+    user_id = get_request_user_id()  # Get the authenticated user ID
 
     if not user_id:
-        print("Error: User ID is missing in request headers")
+        logger.warning("delete_file: user ID is missing in request headers")
         return jsonify({"error": "User ID is missing"}), 400
 
     try:
@@ -304,58 +1633,239 @@ def delete_file(file_id):
         file = File.query.get(file_id)
 
         if not file:
-            print(f"Error: File with ID {file_id} not found.")
+            logger.info("delete_file: file not found", extra={"file_id": file_id})
             return jsonify({"error": "File not found"}), 404
 
         # Check if the file belongs to the authenticated user
         if file.user_id != int(user_id):
-            print(f"Error: Unauthorized access attempt by user {user_id} for file {file_id}")
+            logger.warning("delete_file: unauthorized access attempt", extra={"user_id": user_id, "file_id": file_id})
             return jsonify({"error": "Unauthorized"}), 403
 
-        # Log the delete action with the file size before deleting
-        file_size = os.path.getsize(file.filepath) if os.path.exists(file.filepath) else 0
-        log_file_action(action='file_deleted', user_id=int(user_id), file_id=file.id, file_size=file_size, file_version=1)
-
-        # Attempt to delete the file from the filesystem
-        if os.path.exists(file.filepath):
-            os.remove(file.filepath)  # Delete the file from the filesystem
-            print(f"Success: File {file.filename} deleted from filesystem.")
-        else:
-            print(f"Error: File {file.filename} not found on server.")
+        if not file.content_hash and not os.path.exists(file.filepath):
+            logger.error("File not found on server", extra={"file_id": file.id, "filepath": file.filepath})
             return jsonify({"error": "File not found on server"}), 404
 
-        # Delete the file record from the database
+        # Log the delete action with the size of every version before deleting
+        contents = [file] + list(file.versions)
+        file_size = sum(content.size or 0 for content in contents)
+        log_file_action(action='file_deleted', user_id=int(user_id), file_id=file.id, file_size=file_size,
+                        file_version=file.version)
+
+        # Delete the file record (and its history) first, so no row still
+        # points at a blob by the time the blob row may go
         db.session.delete(file)
+        db.session.flush()
+        db.session.info.setdefault('search_removed', []).append((file.user_id, file.id))
+        release_usage(file.user_id, file_size, 1)
+
+        for content in contents:
+            if content.content_hash:
+                # Drop this version's reference; the blob goes only with its last reference
+                release_blob(content.content_hash)
+            # Attempt to delete the file from the filesystem
+            elif os.path.exists(content.filepath):
+                os.remove(content.filepath)  # Delete the file from the filesystem
+                logger.info("File deleted from filesystem", extra={"file_id": file.id, "filepath": content.filepath})
         db.session.commit()
-        print(f"Success: File record for {file.filename} deleted from database.")
+        logger.info("File record deleted", extra={"file_id": file_id, "user_id": user_id})
 
         return jsonify({"message": f"File {file.filename} deleted successfully!"}), 200
 
     except Exception as e:
+        db.session.rollback()
         # Log the exception details for debugging
-        print(f"Error in delete_file: {str(e)}")
+        logger.exception("Error in delete_file", extra={"file_id": file_id})
         return jsonify({"error": f"Error deleting file: {str(e)}"}), 500
 
 
 
 
+FILE_BATCH_MAX_FILES = 1000
+
+
+def parse_file_ids(data):
+    """Return (file IDs in request order without repeats, None) or (None, error response)."""
+    file_ids = data.get("file_ids")
+    if not isinstance(file_ids, list) or not file_ids or not all(isinstance(i, int) for i in file_ids):
+        return None, (jsonify({"error": "file_ids must be a non-empty list of file IDs"}), 400)
+    if len(file_ids) > FILE_BATCH_MAX_FILES:
+        return None, (jsonify({"error": f"At most {FILE_BATCH_MAX_FILES} files can be handled at once"}), 400)
+    return list(dict.fromkeys(file_ids)), None
+
+
+# Route to delete many files at once
+@app.route('/delete_files', methods=['POST'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def delete_files():
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    user_id = int(user_id)
+
+    file_ids, error = parse_file_ids(request.get_json() or {})
+    if error:
+        return error
+
+    # A fixed number of statements whatever the batch size: lock the rows,
+    # detach their log entries, delete them and their history, drop blob
+    # references, log, update usage
+    try:
+        owned = db.session.execute(
+            select(File.id, File.content_hash, File.size, File.filepath, File.version)
+            .where(File.id.in_(file_ids), File.user_id == user_id)
+            .with_for_update()
+        ).all()
+        missing = sorted(set(file_ids) - {row.id for row in owned})
+        if missing:
+            db.session.rollback()
+            return jsonify({"error": "Files not found", "file_ids": missing}), 404
+        history = db.session.execute(
+            select(FileVersion.file_id, FileVersion.content_hash, FileVersion.size, FileVersion.filepath)
+            .where(FileVersion.file_id.in_(file_ids))
+        ).all()
+
+        # Log entries keep their history without the reference, as when a
+        # single File is deleted through the ORM
+        db.session.execute(update(Log).where(Log.file_id.in_(file_ids)).values(file_id=None),
+                           execution_options={"synchronize_session": False})
+        db.session.execute(delete(FileVersion).where(FileVersion.file_id.in_(file_ids)),
+                           execution_options={"synchronize_session": False})
+        db.session.execute(delete(File).where(File.id.in_(file_ids)),
+                           execution_options={"synchronize_session": False})
+
+        db.session.info.setdefault('search_removed', []).extend((user_id, row.id) for row in owned)
+
+        references = Counter(row.content_hash for row in owned + history if row.content_hash)
+        unreferenced = [row.sha256 for row in release_blobs(references)]
+
+        history_bytes = Counter()
+        for row in history:
+            history_bytes[row.file_id] += row.size or 0
+        rows = [file_action_row('file_deleted', user_id, file_size=(row.size or 0) + history_bytes[row.id],
+                                file_version=row.version)
+                for row in owned]
+        db.session.execute(insert(Log), rows)
+        apply_rollups(rows)
+        release_usage(user_id, sum(row['file_size'] for row in rows), len(owned))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error in delete_files", extra={"user_id": user_id})
+        return jsonify({"error": f"Error deleting files: {str(e)}"}), 500
+
+    for digest in unreferenced:
+        unlink_queue.submit(partial(reap_blob, digest))
+    for row in owned + history:
+        if not row.content_hash:  # Not yet migrated to the blob store
+            unlink_queue.submit(partial(remove_path, row.filepath))
+
+    return jsonify({"message": f"{len(owned)} files deleted successfully!", "file_ids": file_ids}), 200
+
+
+LOGS_PAGE_SIZE = 100
+LOGS_MAX_PAGE_SIZE = 1000
+
+
+def encode_log_cursor(timestamp, log_id):
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{log_id}".encode()).decode()
+
+
+def decode_log_cursor(cursor):
+    timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(log_id)
+
+
+ArchivedLog = namedtuple('ArchivedLog', LOG_FIELDS + ('username', 'email'))
+
+
+def iter_archived_logs(batch_size=LOGS_PAGE_SIZE, **filters):
+    """Archived entries (LogArchive.read() `filters`) with their users'
+    details, newest first. Entries are read `batch_size` at a time, with one
+    query for the users of each batch not seen before. Entries of users that
+    no longer exist are left out, like the inner join on the live table does."""
+    users = {}
+    for entries in batched(log_archive.read(**filters), batch_size):
+        new_ids = {entry['user_id'] for entry in entries} - users.keys()
+        if new_ids:
+            users.update(dict.fromkeys(new_ids))
+            users.update((row.id, (row.username, row.email)) for row in db.session.execute(
+                select(User.id, User.username, User.email).where(User.id.in_(new_ids))))
+        for entry in entries:
+            if users[entry['user_id']] is not None:
+                username, email = users[entry['user_id']]
+                yield ArchivedLog(**entry, username=username, email=email)
+
+
+def parse_log_filters(args):
+    """The user, action, since and until filters of the log endpoints, as
+    LogArchive.read() keywords. Raises ValueError on a malformed user ID or date."""
+    user = args.get('user')
+    since = args.get('since')
+    until = args.get('until')
+    return dict(
+        user_id=int(user) if user else None,
+        actions=args.getlist('action'),
+        since=datetime.fromisoformat(since) if since else None,
+        until=datetime.fromisoformat(until) if until else None
+    )
+
+
+def filter_logs(query, user_id=None, actions=None, since=None, until=None, before=None):
+    """Apply parse_log_filters() filters and a (timestamp, id) cursor to a query over Log."""
+    if user_id is not None:
+        query = query.filter(Log.user_id == user_id)
+    if actions:
+        query = query.filter(Log.action.in_(actions))
+    if since:
+        query = query.filter(Log.timestamp >= since)
+    if until:
+        query = query.filter(Log.timestamp < until)
+    if before:
+        query = query.filter(tuple_(Log.timestamp, Log.id) < before)
+    return query
+
+
 @app.route('/get_logs', methods=['GET'])
 @cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
 def get_logs():
     # Admin check (this could be improved by having proper roles/permissions)
-    user_id = request.headers.get('user_id')
+    user_id = get_request_user_id()
 
     # If you want to keep the admin check commented out:
     # if not user_id or int(user_id) != 1:  # Assuming user ID 1 is an admin
     #     return jsonify({"error": "Unauthorized access to logs"}), 403
 
-    # Fetching logs along with user information (assuming User is related to Log by user_id)
-    logs = Log.query.join(User, Log.user_id == User.id).all()
+    # Newest first, keyset-paginated on (timestamp, id) so every page costs the
+    # same no matter how deep the client has scrolled
+    try:
+        limit = min(int(request.args.get('limit', LOGS_PAGE_SIZE)), LOGS_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        cursor = decode_log_cursor(cursor) if cursor else None
+        filters = parse_log_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid query parameters"}), 400
+
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    # Fetching logs along with user information in one joined query
+    query = db.session.query(Log.id, Log.action, Log.timestamp, Log.user_id, Log.file_id,
+                             Log.file_version, Log.file_size, User.username, User.email) \
+        .join(User, Log.user_id == User.id)
+    query = filter_logs(query, before=cursor, **filters)
+
+    rows = query.order_by(Log.timestamp.desc(), Log.id.desc()).limit(limit + 1).all()
+
+    # Archived entries are all older than those left in the table, so a page
+    # the table cannot fill carries on into the archive
+    if len(rows) <= limit:
+        wanted = limit + 1 - len(rows)
+        rows += islice(iter_archived_logs(batch_size=wanted, before=cursor, **filters), wanted)
 
     # Format the logs data with user information
     logs_data = []
 
-    for log in logs:
+    for log in rows[:limit]:
         # For login/logoff actions, there won't be file-related fields
         if log.action in ['user_logged_in', 'user_logged_out']:
             log_data = {
@@ -363,8 +1873,8 @@ def get_logs():
                 "action": log.action,
                 "timestamp": log.timestamp,
                 "user_id": log.user_id,
-                "username": log.user.username,  # Assuming 'User' model has a 'username' field
-                "email": log.user.email         # Assuming 'User' model has an 'email' field
+                "username": log.username,
+                "email": log.email
             }
         else:
             # For file-related actions, include file information if available
@@ -376,19 +1886,156 @@ def get_logs():
                 "file_id": log.file_id,
                 "file_version": log.file_version,
                 "file_size": log.file_size,
-                "username": log.user.username,  # Assuming 'User' model has a 'username' field
-                "email": log.user.email         # Assuming 'User' model has an 'email' field
+                "username": log.username,
+                "email": log.email
             }
 
         logs_data.append(log_data)
 
-    return jsonify(logs_data), 200
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_log_cursor(last.timestamp, last.id)
+
+    return jsonify({"logs": logs_data, "next_cursor": next_cursor}), 200
+
 
 
+# Exports stream from a server-side cursor, EXPORT_BATCH_SIZE rows at a time,
+# so memory stays flat however many rows there are
+EXPORT_BATCH_SIZE = 5000
+LOG_EXPORT_FIELDS = LOG_FIELDS + ('username', 'email')
+FILE_EXPORT_FIELDS = ('id', 'filename', 'version', 'size', 'mime_type', 'content_hash', 'created_at', 'modified_at')
+
+
+def export_format():
+    """Return (format, None) for the ?format= of an export, or (None, error response)."""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return None, (jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400)
+    return fmt, None
+
+
+def export_response(batches, fields, fmt, name):
+    # No Content-Length, so the body goes out with chunked transfer encoding
+    response = app.response_class(stream_with_context(encode_rows(batches, fields, fmt)),
+                                  mimetype=EXPORT_FORMATS[fmt])
+    response.headers.set('Content-Disposition', 'attachment', filename=f"{name}.{fmt}")
+    response.cache_control.no_store = True
+    return response
+
+
+def batched(rows, size=EXPORT_BATCH_SIZE):
+    rows = iter(rows)
+    return iter(lambda: list(islice(rows, size)), [])
+
+
+@app.route('/export/logs', methods=['GET'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def export_logs():
+    """The requesting user's log entries matching /get_logs' filters, newest
+    first, as NDJSON or CSV: the logs table, then the archive."""
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        return jsonify({"error": "Invalid user ID format"}), 400
+    fmt, error = export_format()
+    if error:
+        return error
+    try:
+        filters = parse_log_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid query parameters"}), 400
+    if filters['user_id'] not in (None, user_id):
+        return jsonify({"error": "Unauthorized"}), 403
+    filters['user_id'] = user_id
+
+    def batches():
+        rows = db.session.execute(
+            filter_logs(select(*(getattr(Log, field) for field in LOG_FIELDS), User.username, User.email)
+                        .join(User, Log.user_id == User.id), **filters)
+            .order_by(Log.timestamp.desc(), Log.id.desc())
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for partition in rows.partitions():
+            yield [row._mapping for row in partition]
+        for partition in batched(iter_archived_logs(batch_size=EXPORT_BATCH_SIZE, **filters)):
+            yield [row._asdict() for row in partition]
+
+    return export_response(batches(), LOG_EXPORT_FIELDS, fmt, 'logs')
+
+
+@app.route('/export/files', methods=['GET'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def export_files():
+    """The requesting user's files, as NDJSON or CSV."""
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        return jsonify({"error": "Invalid user ID format"}), 400
+    fmt, error = export_format()
+    if error:
+        return error
+
+    def batches():
+        rows = db.session.execute(
+            select(*(getattr(File, field) for field in FILE_EXPORT_FIELDS))
+            .where(File.user_id == user_id).order_by(File.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for partition in rows.partitions():
+            yield [row._mapping for row in partition]
+
+    return export_response(batches(), FILE_EXPORT_FIELDS, fmt, 'files')
+
+
+def not_modified(etag, last_modified=None, cache_control=None):
+    """Return a 304 response if the client's cached copy (If-None-Match or
+    If-Modified-Since) is still current, otherwise None."""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = make_response('', 304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def sends_stored_encoding(encoding):
+    """Whether a blob stored with `encoding` can go out exactly as stored, as
+    Content-Encoding: the client accepts the codec. A range then counts bytes
+    of the encoded body, which is sliced like a raw blob without decoding
+    anything; several ranges are answered from the decoded bytes, since a
+    multipart body cannot carry one Content-Encoding for all its parts."""
+    return (encoding in CODECS and ',' not in request.headers.get('Range', '')
+            and request.accept_encodings.quality(encoding) > 0)
+
+
+def file_data(file):
+    return {
+        "id": file.id,
+        "filename": file.filename,
+        "filepath": file.filepath,
+        "size": file.size,
+        "mime_type": file.mime_type,
+        "content_hash": file.content_hash,
+        "created_at": file.created_at,
+        "modified_at": file.modified_at,
+        "version": file.version
+    }
+
 
 @app.route('/get_files', methods=['GET'])
 def get_files():
-    user_id = request.headers.get('user_id')
+    user_id = get_request_user_id()
     
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
@@ -398,60 +2045,827 @@ def get_files():
     except ValueError:
         return jsonify({"error": "Invalid user ID format"}), 400
 
+    # The listing's tag comes from one aggregate over the user's rows: any
+    # upload, new version or deletion changes it, so an unchanged listing is
+    # answered without loading or serialising the files
+    count, last_id, last_modified, versions = db.session.query(
+        func.count(File.id), func.max(File.id), func.max(File.modified_at), func.sum(File.version)
+    ).filter(File.user_id == user_id).one()
+    etag = hashlib.sha256(f"{user_id}:{count}:{last_id}:{last_modified}:{versions}".encode()).hexdigest()[:32]
+    cache_control = app.config['LISTING_CACHE_CONTROL']
+    cached = not_modified(etag, cache_control=cache_control)
+    if cached:
+        return cached
+
     # Fetch the user's files from the database
-    files = File.query.filter_by(user_id=user_id).all()
+    files = File.query.filter_by(user_id=user_id).order_by(File.id).all()
+
+    files_data = [file_data(file) for file in files]
+
+    response = jsonify(files_data)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response, 200
+
+
+# Route to list the versions of a file, newest first
+@app.route('/file_versions/<int:file_id>', methods=['GET'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def get_file_versions(file_id):
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    file = File.query.get(file_id)
+    if not file:
+        return jsonify({"error": "File not found"}), 404
+    if file.user_id != int(user_id):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    versions = [{
+        "version": file.version,
+        "size": file.size,
+        "mime_type": file.mime_type,
+        "content_hash": file.content_hash,
+        "created_at": file.modified_at,
+        "current": True
+    }] + [{
+        "version": version.version,
+        "size": version.size,
+        "mime_type": version.mime_type,
+        "content_hash": version.content_hash,
+        "created_at": version.created_at,
+        "current": False
+    } for version in reversed(file.versions)]
+
+    return jsonify({"file_id": file.id, "filename": file.filename, "versions": versions}), 200
+
+
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 200
+SEARCH_MAX_OFFSET = 1000
+MATCH_TIERS = ('exact', 'prefix', 'substring', 'fuzzy')
+
+
+def search_backend():
+    """'trigram' or 'ngram'; 'auto' is settled on first use."""
+    if app.config['SEARCH_BACKEND'] == 'auto':
+        has_trgm = db.engine.dialect.name == 'postgresql' and db.session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+        app.config['SEARCH_BACKEND'] = 'trigram' if has_trgm else 'ngram'
+    return app.config['SEARCH_BACKEND']
+
+
+def search_trigram(user_id, query, mode, limit, offset):
+    """Rank matches in PostgreSQL through the trigram index. Returns (file, tier, score) rows."""
+    name = func.lower(File.filename)
+    query = normalize_query(query)
+    contains = name.contains(query, autoescape=True)
+    starts = name.startswith(query, autoescape=True)
+    tier = case((name == query, 0), (starts, 1), (contains, 2), else_=3)
+    score = case((contains, literal(1.0)), else_=func.word_similarity(query, name))
+
+    if mode == 'prefix':
+        condition = starts
+    elif mode == 'substring':
+        condition = contains
+    else:
+        # `<%` is word_similarity above the threshold, and can use the index
+        db.session.execute(select(func.set_config('pg_trgm.word_similarity_threshold', str(FUZZY_THRESHOLD), True)))
+        condition = or_(contains, literal(query).op('<%')(name))
+
+    return db.session.query(File, tier, score) \
+        .filter(File.user_id == user_id, condition) \
+        .order_by(tier, score.desc(), name, File.id) \
+        .offset(offset).limit(limit).all()
+
+
+def search_ngram(user_id, query, mode, limit, offset):
+    """Rank matches with the in-process index. Returns (file, tier, score) rows."""
+    count, last_id = db.session.query(func.count(File.id), func.max(File.id)).filter(File.user_id == user_id).one()
+
+    def load_rows():
+        return db.session.query(File.id, File.filename).filter(File.user_id == user_id).all()
+
+    ranked = search_index.search(user_id, (count, last_id), load_rows, query, mode, offset + limit)[offset:]
+    files = {file.id: file for file in File.query.filter(File.id.in_([file_id for _, _, file_id in ranked]))}
+    return [(files[file_id], tier, score) for tier, score, file_id in ranked if file_id in files]
+
+
+# Route to search the user's files by name, best matches first
+@app.route('/search', methods=['GET'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def search_files():
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    query = (request.args.get('q') or '').strip()
+    mode = request.args.get('match', 'fuzzy')
+    try:
+        limit = min(int(request.args.get('limit', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({"error": "Invalid query parameters"}), 400
+
+    if not query or len(query) > 255:
+        return jsonify({"error": "q must be between 1 and 255 characters"}), 400
+    if mode not in MATCH_MODES:
+        return jsonify({"error": f"match must be one of {', '.join(MATCH_MODES)}"}), 400
+    if limit < 1 or not 0 <= offset <= SEARCH_MAX_OFFSET:
+        return jsonify({"error": "Invalid query parameters"}), 400
+
+    # One row more than the page tells whether there is a next one
+    search = search_trigram if search_backend() == 'trigram' else search_ngram
+    rows = search(int(user_id), query, mode, limit + 1, offset)
+
+    results = [dict(file_data(file), match=MATCH_TIERS[tier], score=round(float(score), 3))
+               for file, tier, score in rows[:limit]]
+    return jsonify({
+        "query": query,
+        "match": mode,
+        "results": results,
+        "next_offset": offset + limit if len(rows) > limit else None
+    }), 200
+
+
+def placeholder_response(file, size, cache_control):
+    label = os.path.splitext(file.filename)[1].lstrip('.') or 'file'
+    response = app.response_class(placeholder_svg(label, size), mimetype='image/svg+xml')
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+# Route to get a preview image of a file: the cached thumbnail, or a
+# placeholder while it is being made or when the type has no preview
+@app.route('/thumbnail/<int:file_id>', methods=['GET'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def get_thumbnail(file_id):
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    file = File.query.get(file_id)
+    if not file:
+        return jsonify({"error": "File not found"}), 404
+    if file.user_id != int(user_id):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    size = THUMBNAIL_SIZES.get(request.args.get('size', 'small'))
+    if size is None:
+        return jsonify({"error": f"size must be one of {', '.join(THUMBNAIL_SIZES)}"}), 400
+
+    cache_control = app.config['DOWNLOAD_CACHE_CONTROL']
+    digest = file.content_hash
+    if not digest or not can_preview(file.mime_type) or thumbnail_cache.failed(digest):
+        return placeholder_response(file, size, cache_control)
+
+    # A thumbnail depends only on the bytes it was made from
+    etag = f"{digest}-{size}"
+    cached = not_modified(etag, cache_control=cache_control)
+    if cached:
+        return cached
+
+    found = thumbnail_cache.get(digest, size)
+    if found:
+        path, mime_type = found
+        try:
+            response = send_file(path, mimetype=mime_type, etag=False, conditional=False)
+        except FileNotFoundError:
+            thumbnail_cache.forget(path)  # Evicted by another process
+        else:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+
+    # Not made yet, or evicted since: (re)queue it and show the placeholder meanwhile
+    queue_thumbnails(digest, file.mime_type)
+    response = placeholder_response(file, size, 'no-store')
+    response.status_code = 202
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+
+
+@app.route('/stats', methods=['GET'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def get_stats():
+    # Served from the rollup tables only: one primary-key lookup for usage and
+    # a bounded range scan for the daily counts, however large `logs` grows
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    try:
+        user_id = int(user_id)
+        requested = request.args.get('user')
+        days = min(int(request.args.get('days', STATS_DEFAULT_DAYS)), STATS_MAX_DAYS)
+        if requested and int(requested) != user_id:
+            return jsonify({"error": "Unauthorized"}), 403
+    except ValueError:
+        return jsonify({"error": "Invalid query parameters"}), 400
+
+    # Usage is the caller's own; the daily counts are site-wide totals
+    stats = {"usage": usage_status(user_id)}
 
-    files_data = [{"id": file.id, "filename": file.filename, "filepath": file.filepath} for file in files]
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    counts = DailyActionCount.query.filter(DailyActionCount.day >= since) \
+        .order_by(DailyActionCount.day, DailyActionCount.action).all()
+    stats["daily"] = [{"day": row.day.isoformat(), "action": row.action, "count": row.count} for row in counts]
 
-    return jsonify(files_data), 200
+    return jsonify(stats), 200
 
 
 # Route to download file
 @app.route('/download_file/<int:file_id>', methods=['GET'])
 def download_file(file_id):
     # Retrieve the user_id from the request headers
-    user_id = request.headers.get('user_id')
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
 
     # Fetch the file record from the database
     file = File.query.get(file_id)
 
     if not file:
         return jsonify({"error": "File not found"}), 404
+    if file.user_id != int(user_id):
+        logger.warning("download_file: unauthorized access attempt", extra={"user_id": user_id, "file_id": file_id})
+        return jsonify({"error": "Unauthorized"}), 403
 
-    # Ensure the file exists in the filesystem
-    if not os.path.exists(file.filepath):
+    # The current version lives on the File row, earlier ones in file_versions
+    try:
+        version = int(request.args.get('version', file.version))
+    except ValueError:
+        return jsonify({"error": "Invalid version"}), 400
+    content = file
+    if version != file.version:
+        content = FileVersion.query.filter_by(file_id=file.id, version=version).first()
+        if content is None:
+            return jsonify({"error": "Version not found"}), 404
+
+    blob = db.session.get(Blob, content.content_hash) if content.content_hash else None
+    modified = file.modified_at if content is file else content.created_at
+    last_modified = modified.replace(microsecond=0, tzinfo=timezone.utc)
+    content_etag = content.content_hash or f"{file.id}-{content.version}-{int(modified.timestamp())}"
+    cache_control = app.config['VERSION_CACHE_CONTROL' if 'version' in request.args else 'DOWNLOAD_CACHE_CONTROL']
+
+    # A client that already has these bytes gets a 304 before anything is opened
+    encoding = blob.encoding if blob is not None else None
+    cached = not_modified(f"{content_etag}-{encoding}" if sends_stored_encoding(encoding) else content_etag,
+                          last_modified, cache_control)
+    if cached:
+        if encoding in CODECS:
+            cached.vary.add('Accept-Encoding')
+        return cached
+
+    # Ensure the file exists in the filesystem; everything else comes from the rows
+    try:
+        stored, encoding = open_stored(content.filepath, blob)
+    except FileNotFoundError:
         return jsonify({"error": "File does not exist on the server"}), 404
 
-    # Log the download action with the file size
-    file_size = os.path.getsize(file.filepath)  # Get the file size
-    log_file_action(action='file_downloaded', user_id=int(user_id), file_id=file.id, file_size=file_size, file_version=1)
-
-    # Use mimetypes to set the MIME type based on the file extension
-    mime_type, _ = mimetypes.guess_type(file.filename)
-    mime_type = mime_type or 'application/octet-stream'  # Default to binary if MIME type can't be guessed
+    file_size = content.size
+    mime_type = content.mime_type or guess_mime_type(file.filename)
+    if file_size is None:
+        # Rows from before sizes were stored ('flask migrate-blobs' backfills them)
+        file_size = blob.size if blob is not None else os.fstat(stored.fileno()).st_size
+
+    # A compressed blob goes out exactly as stored, as Content-Encoding, when
+    # the client can take it that way; otherwise it is decoded on the fly.
+    # A different representation needs its own strong tag, and its ranges
+    # are over its own (encoded) length.
+    compressed = encoding in CODECS
+    send_encoded = sends_stored_encoding(encoding)
+    etag = f"{content_etag}-{encoding}" if send_encoded else content_etag
+    length = os.fstat(stored.fileno()).st_size if send_encoded else file_size
+    if compressed and not send_encoded:
+        stored = DecodedFile(stored, encoding)
 
     # Secure the filename to prevent any issues with special characters
     secure_name = secure_filename(file.filename)
 
-    # Prepare the response and set the correct download name from the database
-    response = send_file(
-        file.filepath,
-        as_attachment=True,
-        download_name=secure_name,  # Correctly set filename here
-        mimetype=mime_type
-    )
+    # Work out which byte ranges to send; an If-Range that no longer matches
+    # means the client's partial copy is stale, so it gets the whole file
+    ranges = None
+    if request.headers.get('Range') and if_range_matches(request.headers.get('If-Range'), etag, last_modified):
+        ranges = resolve_ranges(request.headers.get('Range'), length)
+
+    if ranges == []:
+        stored.close()
+        response = make_response('', 416)
+        response.headers['Content-Range'] = f"bytes */{length}"
+        return response
+
+    # Download managers and resumed downloads fetch one file with several
+    # range requests; only the request that covers byte 0 counts as a download
+    if ranges is None or ranges[0][0] == 0:
+        log_file_action(action='file_downloaded', user_id=int(user_id), file_id=file.id, file_size=file_size,
+                        file_version=version)
+
+    # The file (or a bounded slice of it) goes to wsgi.file_wrapper so the
+    # server can sendfile() it without copying through Python
+    if ranges is None:
+        body = wrap_file(request.environ, stored)
+        response = app.response_class(body, mimetype=mime_type, direct_passthrough=True)
+        response.headers['Content-Length'] = length
+    elif len(ranges) == 1:
+        start, stop = ranges[0]
+        body = wrap_file(request.environ, FileSlice(stored, start, stop))
+        response = app.response_class(body, status=206, mimetype=mime_type, direct_passthrough=True)
+        response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{length}"
+        response.headers['Content-Length'] = stop - start
+    else:
+        content_type, content_length, body = multipart_byteranges(stored, ranges, length, mime_type)
+        response = app.response_class(body, status=206, content_type=content_type, direct_passthrough=True)
+        response.headers['Content-Length'] = content_length
+    if send_encoded:
+        response.headers['Content-Encoding'] = encoding
+
+    # Set the correct download name from the database
+    response.headers.set('Content-Disposition', 'attachment', filename=secure_name)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Accept-Ranges'] = 'bytes'
+    if compressed:
+        response.vary.add('Accept-Encoding')
 
     # Add custom header with the filename for the frontend to use
     response.headers['X-File-Name'] = secure_name
+    response.headers['X-File-Version'] = str(version)
 
-    # Disable caching for file download
-    response.cache_control.no_store = True
-    response.cache_control.max_age = 0
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    # Cached copies are revalidated against the ETag (or kept, for a pinned version)
+    response.headers['Cache-Control'] = cache_control
 
     return response
 
 
+# Route to download several files as one ZIP archive
+@app.route('/download_files', methods=['POST'])
+@cross_origin(origins=["http://localhost:3000", "http://localhost:5000", "http://localhost:5001"])
+def download_files():
+    user_id = get_request_user_id()
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    data = request.get_json() or {}
+    file_ids, error = parse_file_ids(data)
+    if error:
+        return error
+
+    # One query for the whole batch, blobs included
+    files = File.query.options(joinedload(File.blob)) \
+        .filter(File.id.in_(file_ids), File.user_id == int(user_id)).all()
+    files_by_id = {file.id: file for file in files}
+    missing = [file_id for file_id in file_ids if file_id not in files_by_id]
+    if missing:
+        return jsonify({"error": "Files not found", "file_ids": missing}), 404
+
+    # Everything the archive needs is copied out of the rows now: the body is
+    # generated after this view has returned and its session is gone
+    chunked = [file.content_hash for file in files if file.blob and file.blob.encoding == CHUNKED_ENCODING]
+    chunks = {digest: chunk_list(digest) for digest in set(chunked)}
+    entries = []
+    for file_id in file_ids:
+        file = files_by_id[file_id]
+        encoding = file.blob.encoding if file.blob else None
+        size = file.size if file.size is not None else (file.blob.size if file.blob else 0)
+        mime_type = file.mime_type or guess_mime_type(file.filename)
+        entries.append(ZipEntry(
+            name=secure_filename(file.filename) or f"file-{file.id}",
+            modified=file.modified_at,
+            size=size,
+            compress=is_compressible(mime_type),
+            open=lambda path=file.filepath, encoding=encoding, digest=file.content_hash:
+                open_content(path, digest, encoding, chunks.get(digest))
+        ))
+
+    def skip_missing(entry, exc):
+        logger.error("Left a file out of a ZIP download", extra={"entry": entry.name, "error": str(exc)})
+
+    log_file_actions([
+        file_action_row('file_downloaded', int(user_id), file_id=entry_id, file_size=entry.size,
+                        file_version=files_by_id[entry_id].version)
+        for entry_id, entry in zip(file_ids, entries)
+    ])
+
+    archive_name = secure_filename(data.get("archive_name") or '') or 'files.zip'
+    if not archive_name.lower().endswith('.zip'):
+        archive_name += '.zip'
+
+    response = app.response_class(stream_zip(entries, on_error=skip_missing), mimetype='application/zip')
+    response.headers.set('Content-Disposition', 'attachment', filename=archive_name)
+    response.headers['X-File-Name'] = archive_name
+    response.cache_control.no_store = True
+    return response
+
+
+@app.cli.command('rebuild-stats')
+@click.option('--batch-size', default=10000, help='Log rows fetched per round trip.')
+def rebuild_stats(batch_size):
+    """Recompute daily_action_counts from logs, and the log archive, in one
+    streaming pass.
+
+    Run it while log writes are paused (or accept that entries written during
+    the rebuild may be counted twice or not at all). Usage counters are
+    checked against the files themselves by 'flask reconcile-usage'.
+    """
+    daily = {}
+    rows = db.session.execute(
+        select(Log.action, Log.timestamp).execution_options(yield_per=batch_size)
+    )
+
+    scanned = 0
+    for partition in rows.partitions():
+        for key, count in daily_deltas([row._asdict() for row in partition]).items():
+            daily[key] = daily.get(key, 0) + count
+        scanned += len(partition)
+    for key, count in daily_deltas(log_archive.read()).items():
+        daily[key] = daily.get(key, 0) + count
+        scanned += count
+
+    DailyActionCount.query.delete()
+    if daily:
+        db.session.execute(insert(DailyActionCount), [
+            {"day": day, "action": action, "count": count} for (day, action), count in daily.items()
+        ])
+    db.session.commit()
+
+    click.echo(f"Rebuilt stats from {scanned} log entries: {len(daily)} daily counters")
+
+
+@app.cli.command('reconcile-usage')
+@click.option('--batch-size', default=1000, help='Users checked per transaction.')
+def reconcile_usage(batch_size):
+    """Repair user_usage counters that drifted from the files and versions
+    they count.
+
+    Each batch locks its users' counters before summing their files, so an
+    upload or delete in flight either commits before the sums are taken or
+    waits for the batch to finish; it is safe to run while serving.
+    """
+    user_ids = db.session.execute(select(User.id).order_by(User.id)).scalars().all()
+    repaired = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        counters = {usage.user_id: usage for usage in db.session.execute(
+            select(UserUsage).where(UserUsage.user_id.in_(batch)).order_by(UserUsage.user_id)
+            .with_for_update().execution_options(populate_existing=True)
+        ).scalars()}
+
+        actual = {user_id: [0, 0] for user_id in batch}
+        for user_id, stored, count in db.session.execute(
+                select(File.user_id, func.coalesce(func.sum(File.size), 0), func.count(File.id))
+                .where(File.user_id.in_(batch)).group_by(File.user_id)):
+            actual[user_id] = [stored, count]
+        for user_id, stored in db.session.execute(
+                select(File.user_id, func.coalesce(func.sum(FileVersion.size), 0))
+                .join(FileVersion, FileVersion.file_id == File.id)
+                .where(File.user_id.in_(batch)).group_by(File.user_id)):
+            actual[user_id][0] += stored
+
+        for user_id, (stored, count) in actual.items():
+            usage = counters.get(user_id)
+            if usage is None:
+                if not (stored or count):
+                    continue
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(UserUsage(user_id=user_id, bytes_stored=stored, file_count=count))
+                except IntegrityError:
+                    continue  # Created by a concurrent upload; the next run checks it
+            elif (usage.bytes_stored, usage.file_count) != (stored, count):
+                logger.warning("Usage counters drifted", extra={
+                    "user_id": user_id, "bytes_stored": usage.bytes_stored, "file_count": usage.file_count,
+                    "actual_bytes": stored, "actual_files": count})
+                usage.bytes_stored, usage.file_count = stored, count
+            else:
+                continue
+            repaired += 1
+        db.session.commit()
+
+    click.echo(f"Checked usage of {len(user_ids)} users, repaired {repaired}")
+
+
+@app.cli.command('set-quota')
+@click.argument('user_id', type=int)
+@click.option('--bytes', 'quota_bytes', type=int, help='Bytes the user may store, across all versions.')
+@click.option('--files', 'quota_files', type=int, help='Number of files the user may have.')
+@click.option('--default', 'use_default', is_flag=True,
+              help='Go back to DEFAULT_QUOTA_BYTES / DEFAULT_QUOTA_FILES.')
+def set_quota(user_id, quota_bytes, quota_files, use_default):
+    """Set a user's own quotas. A quota below current usage blocks further
+    uploads but leaves existing files alone."""
+    if db.session.get(User, user_id) is None:
+        raise click.ClickException(f"User {user_id} not found")
+
+    values = {}
+    if use_default:
+        values = {"quota_bytes": None, "quota_files": None}
+    if quota_bytes is not None:
+        values["quota_bytes"] = quota_bytes
+    if quota_files is not None:
+        values["quota_files"] = quota_files
+    if not values:
+        raise click.UsageError("Give --bytes, --files or --default")
+
+    increment_row(UserUsage, {"user_id": user_id}, {"bytes_stored": 0, "file_count": 0})
+    UserUsage.query.filter_by(user_id=user_id).update(values)
+    db.session.commit()
+
+    status = usage_status(user_id)
+    limits = ['unlimited' if status[key] is None else status[key] for key in ('quota_bytes', 'quota_files')]
+    click.echo(f"User {user_id}: {status['bytes_stored']} of {limits[0]} bytes, "
+               f"{status['file_count']} of {limits[1]} files")
+
+
+@app.cli.command('archive-logs')
+@click.option('--retention-days', type=int, default=None,
+              help='Keep this many days of entries in the table (default LOG_RETENTION_DAYS).')
+@click.option('--batch-size', default=10000, help='Log rows fetched, and deleted, per round trip.')
+def archive_logs(retention_days, batch_size):
+    """Move whole months of log entries older than the retention window from
+    the logs table into the log archive, oldest month first.
+
+    A month's rows are deleted only once its archive file is in place, so an
+    interrupted run loses nothing and can simply be started again. Entries
+    are timestamped as they are written, so none arrive for a month this old.
+    """
+    retention_days = app.config['LOG_RETENTION_DAYS'] if retention_days is None else retention_days
+    boundary = month_start(datetime.utcnow() - timedelta(days=retention_days))
+    oldest = db.session.execute(select(func.min(Log.timestamp))).scalar()
+
+    months = moved = 0
+    start = month_start(oldest) if oldest is not None else boundary
+    while start < boundary:
+        end = next_month(start)
+        in_month = and_(Log.timestamp >= start, Log.timestamp < end)
+        if db.session.execute(select(Log.id).where(in_month).limit(1)).first() is None:
+            start = end
+            continue
+
+        rows = db.session.execute(
+            select(*(getattr(Log, field) for field in LOG_FIELDS)).where(in_month)
+            .order_by(Log.timestamp.desc(), Log.id.desc()).execution_options(yield_per=batch_size)
+        )
+        log_archive.write_month(start, (row._asdict() for row in rows))
+
+        while True:
+            deleted = db.session.execute(
+                delete(Log).where(Log.id.in_(select(Log.id).where(in_month).limit(batch_size))),
+                execution_options={"synchronize_session": False}
+            ).rowcount
+            db.session.commit()
+            if not deleted:
+                break
+            moved += deleted
+        months += 1
+        start = end
+
+    click.echo(f"Archived {moved} log entries from {months} months before {boundary:%Y-%m}")
+
+
+@app.cli.command('expire-uploads')
+def expire_uploads():
+    """Delete chunked uploads idle for longer than UPLOAD_SESSION_TTL_HOURS,
+    with their .part files."""
+    expired = 0
+    while True:
+        batch = expire_upload_sessions(limit=500)
+        if not batch:
+            break
+        expired += batch
+    click.echo(f"Expired {expired} upload sessions")
+
+
+@app.cli.command('reap-blobs')
+def reap_blobs():
+    """Delete blobs left unreferenced by bulk deletes whose background unlink
+    did not go through."""
+    digests = db.session.execute(select(Blob.sha256).where(Blob.ref_count <= 0)).scalars().all()
+    for digest in digests:
+        reap_blob(digest)
+    click.echo(f"Checked {len(digests)} unreferenced blobs")
+
+
+@app.cli.command('migrate-blobs')
+@click.option('--batch-size', default=500, help='Files converted per transaction.')
+def migrate_blobs(batch_size):
+    """Move files from the per-user folders into the blob store, in place,
+    and backfill size and MIME type on rows stored before they were recorded.
+
+    Each batch links the originals into the store, commits, and only then
+    unlinks the originals, so an interrupted run can simply be started again.
+    """
+    migrated = backfilled = missing = 0
+    last_id = 0
+
+    while True:
+        files = (File.query.filter(or_(File.content_hash.is_(None), File.size.is_(None)), File.id > last_id)
+                 .order_by(File.id).limit(batch_size).all())
+        if not files:
+            break
+
+        originals = []
+        for file in files:
+            last_id = file.id
+            if file.content_hash:
+                file.size = file.blob.size
+                file.mime_type = file.mime_type or guess_mime_type(file.filename)
+                backfilled += 1
+                continue
+
+            if not os.path.exists(file.filepath):
+                missing += 1
+                continue
+
+            digest, size = hash_file(file.filepath)
+            path = blob_path(BASE_UPLOAD_FOLDER, digest)
+            _, stored_encoding = acquire_blob(digest, size)
+            # Only a raw blob can take the original's bytes: a chunked one keeps
+            # its bytes in its chunks, an encoded one (maybe in cold storage) differs
+            if stored_encoding is None and not blob_exists(BASE_UPLOAD_FOLDER, digest):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.link(file.filepath, path)
+
+            originals.append(file.filepath)
+            modified = datetime.utcfromtimestamp(os.path.getmtime(file.filepath))
+            file.filepath = path
+            file.content_hash = digest
+            file.size = size
+            file.mime_type = file.mime_type or guess_mime_type(file.filename)
+            file.created_at = file.modified_at = modified
+
+        db.session.commit()
+
+        for original in originals:
+            os.remove(original)
+            try:
+                os.rmdir(os.path.dirname(original))  # Only succeeds once the user folder is empty
+            except OSError:
+                pass
+        migrated += len(originals)
+
+    click.echo(f"Migrated {migrated} files into the blob store, backfilled {backfilled}, {missing} missing on disk")
+
+
+@app.cli.command('shard-blobs')
+@click.option('--batch-size', default=1000, help='Blobs moved, and rows updated, per batch.')
+@click.option('--pause', default=0.0, help='Seconds to wait between batches, to leave disk time for requests.')
+def shard_blobs(batch_size, pause):
+    """Move blobs kept directly in blobs/ into the hash fan-out layout, then
+    point the filepath of the rows that reference them at their new place.
+
+    Safe to run while serving: reads look in both layouts, and each blob is
+    linked into place before its old name is removed. An interrupted run can
+    simply be started again.
+    """
+    moved = 0
+    digests = flat_blobs(BASE_UPLOAD_FOLDER)
+    while True:
+        batch = list(islice(digests, batch_size))
+        if not batch:
+            break
+        moved += sum(shard_blob(BASE_UPLOAD_FOLDER, digest) for digest in batch)
+        click.echo(f"Moved {moved} blobs")
+        time.sleep(pause)
+
+    # Reads go through the layout, so rows can lag behind the move; a flat
+    # path is the blob directory followed by exactly one 64-character name
+    flat_path = os.path.join(blob_dir(BASE_UPLOAD_FOLDER), '_' * 64)
+    updated = 0
+    for model in (File, FileVersion):
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(model.id, model.content_hash)
+                .where(model.filepath.like(flat_path), model.content_hash.is_not(None), model.id > last_id)
+                .order_by(model.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.session.execute(update(model), [
+                {"id": row.id, "filepath": blob_path(BASE_UPLOAD_FOLDER, row.content_hash)} for row in rows
+            ])
+            db.session.commit()
+            last_id = rows[-1].id
+            updated += len(rows)
+            time.sleep(pause)
+
+    click.echo(f"Moved {moved} blobs into the fan-out layout, updated {updated} file and version rows")
+
+
+def active_blobs(since):
+    """Digests of the blobs read or written since `since`: the content of
+    files changed since, of file versions downloaded since, and their chunks."""
+    downloads = select(Log.file_id, Log.file_version).distinct() \
+        .where(Log.action == 'file_downloaded', Log.timestamp >= since).subquery()
+    contents = union(
+        select(File.content_hash).where(File.modified_at >= since),
+        select(File.content_hash).join(downloads, and_(
+            downloads.c.file_id == File.id,
+            or_(downloads.c.file_version.is_(None), downloads.c.file_version == File.version))),
+        select(FileVersion.content_hash).join(downloads, and_(
+            downloads.c.file_id == FileVersion.file_id, downloads.c.file_version == FileVersion.version))
+    ).subquery()
+    digests = set(db.session.execute(select(contents.c.content_hash)).scalars())
+    digests.update(db.session.execute(
+        select(BlobChunk.chunk_sha256).where(BlobChunk.blob_sha256.in_(select(contents.c.content_hash)))
+    ).scalars())
+    digests.discard(None)
+    return digests
+
+
+def local_blob_path(digest):
+    """Path of blob `digest` on local disk, in either layout, or None."""
+    for path in (blob_path(BASE_UPLOAD_FOLDER, digest), flat_blob_path(BASE_UPLOAD_FOLDER, digest)):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@app.cli.command('tier-blobs')
+@click.option('--idle-days', type=int, default=None,
+              help='Days without a download or change before a blob moves out (default TIER_IDLE_DAYS).')
+@click.option('--batch-size', default=100, help='Blobs handled per transaction.')
+def tier_blobs(idle_days, batch_size):
+    """Move blobs nobody has downloaded or changed lately from local disk to
+    cold storage (COLD_STORAGE_URL), judged by file_downloaded log entries.
+
+    A blob is copied out before its row is marked cold, and its local copy
+    is unlinked under the row lock, as drop_blob does. Reads bring blobs back
+    as they need them; a brought-back blob that has gone idle again just
+    loses its local copy. Safe to run while serving.
+    """
+    if cold_storage is None:
+        raise click.ClickException("COLD_STORAGE_URL is not set")
+    idle_days = app.config['TIER_IDLE_DAYS'] if idle_days is None else idle_days
+    since = datetime.utcnow() - timedelta(days=idle_days)
+    active = active_blobs(since)
+
+    moved = evicted = 0
+    last = ''
+    while True:
+        blobs = db.session.execute(
+            select(Blob.sha256, Blob.encoding, Blob.tier)
+            .where(Blob.sha256 > last, Blob.ref_count > 0, Blob.created_at < since,
+                   Blob.size >= app.config['TIER_MIN_BYTES'],
+                   or_(Blob.encoding.is_(None), Blob.encoding != CHUNKED_ENCODING))
+            .order_by(Blob.sha256).limit(batch_size)
+        ).all()
+        if not blobs:
+            break
+        last = blobs[-1].sha256
+        db.session.rollback()  # No transaction open while bytes are copied out
+
+        uploaded = []
+        cached = []
+        for blob in blobs:
+            path = local_blob_path(blob.sha256)
+            if blob.sha256 in active or path is None:
+                continue
+            if blob.tier == 'cold':
+                cached.append(blob.sha256)
+            else:
+                cold_storage.upload(blob.sha256, path)
+                uploaded.append(blob)
+
+        stale = []
+        try:
+            marked = []
+            for blob in uploaded:
+                # Only if the bytes copied out are still the blob's
+                if db.session.execute(
+                        update(Blob).where(Blob.sha256 == blob.sha256, Blob.tier == 'hot',
+                                           Blob.encoding.is_not_distinct_from(blob.encoding))
+                        .values(tier='cold').returning(Blob.sha256)).first():
+                    marked.append(blob.sha256)
+                else:
+                    stale.append(blob.sha256)
+            cached = db.session.execute(
+                select(Blob.sha256).where(Blob.sha256.in_(cached), Blob.tier == 'cold').with_for_update()
+            ).scalars().all()
+            for digest in marked + cached:
+                remove_blob(BASE_UPLOAD_FOLDER, digest)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        for digest in stale:
+            # Deleted or re-stored meanwhile; unless another run moved it out
+            if db.session.execute(select(Blob.tier).where(Blob.sha256 == digest)).scalar() != 'cold':
+                cold_storage.delete(digest)
+        db.session.rollback()
+
+        moved += len(marked)
+        evicted += len(cached)
+
+    click.echo(f"Moved {moved} blobs to cold storage, dropped {evicted} local copies of blobs already there")
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001)  # Make sure the app is accessible outside of the container
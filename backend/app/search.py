@@ -0,0 +1,166 @@
+# app/search.py
+# Filename search. On PostgreSQL with pg_trgm the files table carries a
+# trigram index and the database does the matching; elsewhere NgramIndex
+# keeps an equivalent index in memory. Both rank the same way: exact name,
+# then prefix, then substring matches, then fuzzy ones by similarity, and
+# alphabetically within each.
+import heapq
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+MATCH_MODES = ('prefix', 'substring', 'fuzzy')
+
+# Share of the query's word trigrams a name must contain to be a fuzzy match,
+# like pg_trgm's word_similarity_threshold; its default of 0.6 misses most
+# transposed letters ('reprot' scores 0.43 against 'report')
+FUZZY_THRESHOLD = 0.4
+
+TIER_EXACT, TIER_PREFIX, TIER_SUBSTRING, TIER_FUZZY = range(4)
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    return text.lower()
+
+
+def trigrams(text):
+    """Every three-character run of `text`, for substring lookups."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def word_trigrams(text):
+    """Trigrams of each word padded the way pg_trgm pads them (two spaces
+    before, one after), so words that start alike score higher."""
+    grams = set()
+    for word in _WORD.findall(text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class _UserIndex:
+    """The names of one user's files, indexed by trigram."""
+
+    def __init__(self, rows):
+        self.names = {}
+        self.grams = defaultdict(set)
+        self.words = defaultdict(set)
+        self.last_id = None
+        for file_id, filename in rows:
+            self.add(file_id, filename)
+
+    def fingerprint(self):
+        # (count, highest id) changes with every insert or delete: ids are
+        # never reused, so an insert raises the highest id even when a delete
+        # keeps the count level
+        return len(self.names), self.last_id
+
+    def add(self, file_id, filename):
+        name = normalize(filename)
+        self.names[file_id] = name
+        self.last_id = max(self.last_id or file_id, file_id)
+        for gram in trigrams(name):
+            self.grams[gram].add(file_id)
+        for gram in word_trigrams(name):
+            self.words[gram].add(file_id)
+
+    def remove(self, file_id):
+        name = self.names.pop(file_id, None)
+        if name is None:
+            return
+        if file_id == self.last_id:
+            self.last_id = max(self.names) if self.names else None
+        for gram in trigrams(name):
+            self.grams[gram].discard(file_id)
+        for gram in word_trigrams(name):
+            self.words[gram].discard(file_id)
+
+    def search(self, query, mode, count):
+        """Return the best `count` matches as (tier, score, file id), best first."""
+        names = self.names
+        if len(query) >= 3:
+            postings = sorted((self.grams.get(gram, set()) for gram in trigrams(query)), key=len)
+            candidates = set.intersection(*postings)
+        else:
+            candidates = names.keys()
+
+        tiers = {TIER_EXACT: [], TIER_PREFIX: [], TIER_SUBSTRING: []}
+        for file_id in candidates:
+            name = names[file_id]
+            if query not in name:
+                continue
+            if name == query:
+                tiers[TIER_EXACT].append(file_id)
+            elif name.startswith(query):
+                tiers[TIER_PREFIX].append(file_id)
+            elif mode != 'prefix':
+                tiers[TIER_SUBSTRING].append(file_id)
+
+        # Each tier is only ranked as far as the page reaches into it
+        ranked = []
+        for tier, file_ids in tiers.items():
+            if len(ranked) >= count:
+                return ranked
+            best = heapq.nsmallest(count - len(ranked), file_ids, key=lambda file_id: (names[file_id], file_id))
+            ranked.extend((tier, 1.0, file_id) for file_id in best)
+
+        # Fuzzy matches rank last, so they are only scored when the exact and
+        # substring matches do not fill the page
+        query_grams = word_trigrams(query)
+        if mode == 'fuzzy' and query_grams and len(ranked) < count:
+            found = {file_id for file_ids in tiers.values() for file_id in file_ids}
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self.words.get(gram, ()))
+            fuzzy = [(hits / len(query_grams), file_id) for file_id, hits in shared.items()
+                     if hits >= FUZZY_THRESHOLD * len(query_grams) and file_id not in found]
+            best = heapq.nsmallest(count - len(ranked), fuzzy, key=lambda m: (-m[0], names[m[1]], m[1]))
+            ranked.extend((TIER_FUZZY, score, file_id) for score, file_id in best)
+        return ranked
+
+
+class NgramIndex:
+    """In-process trigram indexes of filenames, one per user, built on first
+    search and kept for the `max_users` most recently searched users.
+
+    Uploads and deletes in this process update an index in place. Writes from
+    other processes are caught by comparing fingerprints with the database
+    before each search, which rebuilds the index if they differ.
+    """
+
+    def __init__(self, max_users=1000):
+        self._max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(self, user_id, fingerprint, load_rows, query, mode, count):
+        """Search user `user_id`'s names, first rebuilding the index from
+        load_rows() unless it matches `fingerprint` ((count, highest id) of
+        their files in the database)."""
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                self._users.move_to_end(user_id)
+        if index is None or index.fingerprint() != tuple(fingerprint):
+            index = _UserIndex(load_rows())
+            with self._lock:
+                self._users[user_id] = index
+                self._users.move_to_end(user_id)
+                while len(self._users) > self._max_users:
+                    self._users.popitem(last=False)
+        with self._lock:
+            return index.search(normalize(query), mode, count)
+
+    def add(self, user_id, file_id, filename):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.add(file_id, filename)
+
+    def remove(self, user_id, file_id):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                index.remove(file_id)
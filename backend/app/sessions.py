@@ -0,0 +1,93 @@
+# app/sessions.py
+# Session tokens, the cache of recently validated users, and password hashing
+# off the request thread.
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class SessionTokens:
+    """Signed, expiring tokens carrying a user id. Verifying one needs only the
+    secret key, never the database."""
+
+    def __init__(self, secret_key, max_age):
+        self._serializer = URLSafeTimedSerializer(secret_key, salt='session-token')
+        self._max_age = max_age
+
+    def issue(self, user_id):
+        return self._serializer.dumps({"uid": user_id})
+
+    def verify(self, token):
+        """Return the user id in `token`, or None if it is forged or expired."""
+        try:
+            return int(self._serializer.loads(token, max_age=self._max_age)["uid"])
+        except (BadSignature, SignatureExpired, KeyError, TypeError, ValueError):
+            return None
+
+
+class UserCache:
+    """Thread-safe LRU of recently validated users, keyed by id."""
+
+    def __init__(self, maxsize=10000):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+            return entry
+
+    def put(self, user_id, entry):
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+class PasswordHasher:
+    """Runs password hashing in a process pool, so a burst of logins does not
+    hold the GIL that download and upload threads need.
+
+    The pool is created lazily in each process (a pool inherited through
+    fork would be unusable). With workers=0 hashing stays in-process.
+    """
+
+    def __init__(self, workers):
+        self._workers = workers
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def _run(self, func, *args):
+        if not self._workers:
+            return func(*args)
+        return self._executor().submit(func, *args).result()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self._workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def shutdown(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,133 @@
+# app/storage.py
+# Storage backends for the cold tier of the blob store. Blobs are written,
+# hashed and read on local disk (app.blobstore); a backend only takes whole
+# blobs in from a local file and hands them back out to one. S3 needs the
+# boto3 package.
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from urllib.parse import urlparse
+
+from app.blobstore import blob_path
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover - optional dependency
+    boto3 = None
+
+
+class Storage(ABC):
+    """Somewhere to keep blobs, by digest."""
+
+    @abstractmethod
+    def upload(self, digest, path):
+        """Store the local file at `path` as blob `digest`."""
+
+    @abstractmethod
+    def download(self, digest, path):
+        """Write blob `digest` to the local file `path`. Raises
+        FileNotFoundError if the backend does not have it."""
+
+    @abstractmethod
+    def exists(self, digest):
+        """Whether the backend has blob `digest`."""
+
+    @abstractmethod
+    def delete(self, digest):
+        """Remove blob `digest`; removing one that is not there is no error."""
+
+
+class LocalStorage(Storage):
+    """Blobs in a directory, laid out like the blob store itself: another
+    disk (say, spinning rather than solid state) mounted at `root`."""
+
+    def __init__(self, root):
+        self._root = root
+
+    def _copy(self, source, target):
+        # Copied under a temporary name first, so a reader never sees half a blob
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(source, temp_path)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def upload(self, digest, path):
+        self._copy(path, blob_path(self._root, digest))
+
+    def download(self, digest, path):
+        self._copy(blob_path(self._root, digest), path)
+
+    def exists(self, digest):
+        return os.path.exists(blob_path(self._root, digest))
+
+    def delete(self, digest):
+        try:
+            os.remove(blob_path(self._root, digest))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage(Storage):
+    """Blobs as objects `<prefix><digest>` in an S3 bucket, or in anything
+    that speaks the S3 API (MinIO, or moto in-process) at `endpoint_url`.
+    A ready-made boto3 `client` may be passed instead."""
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("S3 storage needs the boto3 package")
+            client = boto3.client('s3', endpoint_url=endpoint_url)
+        self._client = client
+        self._bucket = bucket
+        self._prefix = prefix
+
+    def _key(self, digest):
+        return f"{self._prefix}{digest}"
+
+    @staticmethod
+    def _missing(error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def upload(self, digest, path):
+        # upload_file splits large blobs into a multipart upload
+        self._client.upload_file(path, self._bucket, self._key(digest))
+
+    def download(self, digest, path):
+        try:
+            self._client.download_file(self._bucket, self._key(digest), path)
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(f"Blob {digest} not in s3://{self._bucket}/{self._prefix}") from e
+            raise
+
+    def exists(self, digest):
+        try:
+            self._client.head_object(Bucket=self._bucket, Key=self._key(digest))
+        except ClientError as e:
+            if self._missing(e):
+                return False
+            raise
+        return True
+
+    def delete(self, digest):
+        self._client.delete_object(Bucket=self._bucket, Key=self._key(digest))
+
+
+def storage_from_url(url, endpoint_url=None):
+    """The backend for `url`: 's3://bucket/prefix/' or a local directory."""
+    parsed = urlparse(url)
+    if parsed.scheme == 's3':
+        prefix = parsed.path.lstrip('/')
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        return S3Storage(parsed.netloc, prefix, endpoint_url=endpoint_url)
+    if parsed.scheme in ('', 'file'):
+        return LocalStorage(parsed.path if parsed.scheme else url)
+    raise ValueError(f"Unsupported storage URL: {url}")
@@ -0,0 +1,74 @@
+# app/tasks.py
+# Small in-process queue for work that must happen eventually but should not
+# hold up a response, such as unlinking deleted blobs.
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TaskQueue:
+    """Runs callables on `workers` background threads, retrying each one up
+    to `retries` times with a growing delay before giving up on it.
+
+    Like BufferedLogWriter, the threads are started lazily and per process.
+    """
+
+    def __init__(self, name, max_queue=10000, retries=5, retry_delay=0.5, workers=1):
+        self._name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retries = retries
+        self._retry_delay = retry_delay
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+    def submit(self, task):
+        """Queue `task` (a callable taking no arguments). Returns False if the
+        queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(task)
+            return True
+        except queue.Full:
+            return False
+
+    def join(self):
+        """Wait until every queued task has run (or been given up on)."""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._threads = []
+                self._pid = os.getpid()
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self._workers:
+                thread = threading.Thread(target=self._run, name=f"{self._name}-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                self._attempt(task)
+            finally:
+                self._queue.task_done()
+
+    def _attempt(self, task):
+        for attempt in range(1, self._retries + 1):
+            try:
+                task()
+                return
+            except Exception:
+                logger.exception("Background task failed", extra={"queue": self._name, "attempt": attempt})
+                time.sleep(self._retry_delay * attempt)
+        logger.error("Gave up on background task", extra={"queue": self._name, "attempts": self._retries})
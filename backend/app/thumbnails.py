@@ -0,0 +1,193 @@
+# app/thumbnails.py
+# Preview images of uploaded files, cached on disk under <root>/thumbnails
+# next to the blob store. Thumbnails are keyed by blob digest, so every file
+# and version with the same bytes shares them. Images need the Pillow package
+# and PDFs also pypdfium2; without them every file gets a placeholder.
+import io
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+try:
+    import pypdfium2
+except ImportError:  # pragma: no cover - optional dependency
+    pypdfium2 = None
+
+THUMBNAIL_SIZES = {'small': 128, 'medium': 256, 'large': 512}  # Longest side, in pixels
+JPEG_QUALITY = 80
+
+# Formats Pillow decodes; SVG and other vector formats get a placeholder
+IMAGE_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp', 'image/x-ms-bmp', 'image/tiff',
+               'image/x-icon', 'image/vnd.microsoft.icon'}
+PDF_TYPE = 'application/pdf'
+
+FORMATS = {'.jpg': 'image/jpeg', '.png': 'image/png'}
+
+
+def can_preview(mime_type):
+    mime_type = (mime_type or '').split(';')[0].strip().lower()
+    if Image is None:
+        return False
+    return mime_type in IMAGE_TYPES or (mime_type == PDF_TYPE and pypdfium2 is not None)
+
+
+def render_thumbnails(source, mime_type, sizes):
+    """Decode `source` (a readable binary file) once and return
+    {size: (data, extension)} for each longest-side `size` in `sizes`.
+    Opaque previews are JPEG, ones with transparency PNG."""
+    if mime_type.split(';')[0].strip().lower() == PDF_TYPE:
+        document = pypdfium2.PdfDocument(source.read())
+        try:
+            page = document[0]
+            scale = max(sizes) / max(page.get_size())
+            image = page.render(scale=scale).to_pil()
+        finally:
+            document.close()
+    else:
+        image = Image.open(source)
+        # Lets JPEG decode at a fraction of full size, much the largest saving
+        image.draft('RGB', (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image)
+
+    transparent = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if transparent else 'RGB')
+    rendered = {}
+    for size in sorted(sizes, reverse=True):
+        # Each size is scaled down from the next larger one
+        image.thumbnail((size, size))
+        out = io.BytesIO()
+        if transparent:
+            image.save(out, 'PNG', optimize=True)
+        else:
+            image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        rendered[size] = (out.getvalue(), '.png' if transparent else '.jpg')
+    return rendered
+
+
+def placeholder_svg(label, size):
+    """A plain page icon with `label` (such as the file extension) on it."""
+    label = escape(label.upper()[:5])
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 100 100">'
+        f'<path d="M22 6h40l16 16v72H22z" fill="#f3f4f6" stroke="#9ca3af" stroke-width="2"/>'
+        f'<path d="M62 6v16h16" fill="none" stroke="#9ca3af" stroke-width="2"/>'
+        f'<text x="50" y="66" font-family="sans-serif" font-size="16" font-weight="bold" fill="#6b7280" '
+        f'text-anchor="middle">{label}</text></svg>'
+    ).encode()
+
+
+class ThumbnailCache:
+    """Thumbnails on disk, evicted least recently used first once they add up
+    to more than `max_bytes`.
+
+    The recency order is kept in memory and seeded from file access times at
+    startup. Each process keeps its own, so with several workers the bound is
+    approximate; a thumbnail evicted by another process is simply made again.
+    It also tracks which digests are being rendered or failed to render.
+    """
+
+    def __init__(self, root, max_bytes):
+        self._dir = os.path.join(root, 'thumbnails')
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # file name -> size, least recently used first
+        self._total = 0
+        self._pending = set()
+        self._failed = set()
+        os.makedirs(self._dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        found = []
+        for entry in os.scandir(self._dir):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                found.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total += size
+
+    def get(self, digest, size):
+        """Return (path, mime type) of a cached thumbnail, or None."""
+        for extension, mime_type in FORMATS.items():
+            name = f"{digest}-{size}{extension}"
+            path = os.path.join(self._dir, name)
+            if not os.path.exists(path):
+                self.forget(path)  # Evicted by another process, if it was known
+                continue
+            with self._lock:
+                known = name in self._entries
+                if known:
+                    self._entries.move_to_end(name)
+            if not known:
+                self._add(name, os.path.getsize(path))  # Made by another process
+            return path, mime_type
+        return None
+
+    def put(self, digest, size, data, extension):
+        name = f"{digest}-{size}{extension}"
+        temp_path = os.path.join(self._dir, f"{uuid.uuid4().hex}.tmp")
+        with open(temp_path, 'wb') as out:
+            out.write(data)
+        os.replace(temp_path, os.path.join(self._dir, name))
+        self._add(name, len(data))
+
+    def _add(self, name, size):
+        evicted = []
+        with self._lock:
+            self._total += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            while self._total > self._max_bytes and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self._dir, old_name))
+            except FileNotFoundError:
+                pass
+
+    def forget(self, path):
+        """Drop the entry of a thumbnail whose file turned out to be gone."""
+        with self._lock:
+            self._total -= self._entries.pop(os.path.basename(path), 0)
+
+    def discard(self, digest):
+        """Delete every thumbnail of `digest`, whose blob is gone, and forget
+        that it failed to render."""
+        names = [f"{digest}-{size}{extension}" for size in THUMBNAIL_SIZES.values() for extension in FORMATS]
+        with self._lock:
+            for name in names:
+                self._total -= self._entries.pop(name, 0)
+            self._failed.discard(digest)
+        for name in names:
+            try:
+                os.remove(os.path.join(self._dir, name))
+            except FileNotFoundError:
+                pass
+
+    def claim(self, digest):
+        """Mark `digest` as being rendered. Returns False if it already is, or
+        failed before."""
+        with self._lock:
+            if digest in self._pending or digest in self._failed:
+                return False
+            self._pending.add(digest)
+            return True
+
+    def finish(self, digest, failed=False):
+        with self._lock:
+            self._pending.discard(digest)
+            if failed:
+                self._failed.add(digest)
+
+    def failed(self, digest):
+        with self._lock:
+            return digest in self._failed
@@ -0,0 +1,72 @@
+# app/zipstream.py
+# Builds a ZIP archive while it is being sent. zipfile writes into a sink that
+# is drained after every block, so no temporary file is used and memory stays
+# around one block per archive whatever the size of the entries.
+import io
+import zipfile
+from collections import namedtuple
+
+BLOCK_SIZE = 64 * 1024
+
+# `open` returns a readable binary file with the entry's (decoded) bytes;
+# `size` is used to decide on ZIP64 up front; `compress` picks DEFLATE over STORE
+ZipEntry = namedtuple('ZipEntry', ['name', 'modified', 'size', 'compress', 'open'])
+
+
+class _Sink(io.RawIOBase):
+    """Unseekable write target that keeps what zipfile writes until drained.
+    zipfile sees that it cannot seek and writes data descriptors instead of
+    going back to patch local headers."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, on_error=None):
+    """Yield a ZIP archive of `entries` (ZipEntry) piece by piece.
+
+    An entry whose file cannot be opened is passed to `on_error(entry, exc)`
+    and left out; by then the response has started, so it cannot fail as a
+    whole. Without `on_error` the exception propagates.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, mode='w', allowZip64=True) as archive:
+        for entry in entries:
+            try:
+                source = entry.open()
+            except OSError as exc:
+                if on_error is None:
+                    raise
+                on_error(entry, exc)
+                continue
+
+            info = zipfile.ZipInfo(entry.name, entry.modified.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED if entry.compress else zipfile.ZIP_STORED
+            info.file_size = entry.size
+            info.external_attr = 0o644 << 16
+            with source, archive.open(info, mode='w') as out:
+                while True:
+                    block = source.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    out.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()  # The data descriptor, and the header of an empty entry
+            if data:
+                yield data
+    # Closing the archive wrote the central directory
+    yield sink.drain()
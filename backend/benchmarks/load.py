@@ -0,0 +1,321 @@
+"""Load-generation benchmark for the CloudDrive backend.
+
+Simulates N concurrent users. Each one registers, logs in, and then issues a
+weighted mix of login, upload (of several sizes), list, download and delete
+requests. Reports throughput, p50/p95/p99 latency and error rate per route,
+and can save the results as JSON so runs can be compared.
+
+By default the app is driven in-process through the Flask test client, on a
+throwaway SQLite database and upload folder, so no outside services are
+needed. Set DATABASE_URL to run in-process against a local PostgreSQL, or
+pass --url to load a running server instead.
+
+    python benchmarks/load.py --users 20 --duration 30 --output run.json
+    python benchmarks/load.py --url http://127.0.0.1:5001 --compare run.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+ROUTES = ['login', 'upload', 'list', 'download', 'delete']
+DEFAULT_MIX = 'login=1,upload=3,list=4,download=4,delete=1'
+DEFAULT_SIZES = '1k,64k,1m'
+
+
+def parse_size(text):
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    text = text.strip().lower()
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        route, _, weight = item.partition('=')
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"unknown route {route!r}, expected one of {', '.join(ROUTES)}")
+        mix[route] = float(weight or 1)
+    return mix
+
+
+def encode_multipart(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+class InProcessClient:
+    """Drives the app through Flask's test client."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, headers=None, json_body=None, upload=None):
+        kwargs = {"headers": headers or {}}
+        if json_body is not None:
+            kwargs["json"] = json_body
+        if upload is not None:
+            content_type, body = encode_multipart('file', *upload)
+            kwargs["data"] = body
+            kwargs["content_type"] = content_type
+        response = self._client.open(path, method=method, **kwargs)
+        return response.status_code, response.get_data()
+
+
+class HTTPClient:
+    """Drives a running server over one keep-alive connection per user."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self._host, self._port = parts.hostname, parts.port or 80
+        self._connection = None
+
+    def request(self, method, path, headers=None, json_body=None, upload=None):
+        headers = dict(headers or {})
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        if upload is not None:
+            headers['Content-Type'], body = encode_multipart('file', *upload)
+
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self._host, self._port, timeout=60)
+            try:
+                self._connection.request(method, path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed the keep-alive connection; reconnect once
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+
+
+class Recorder:
+    """Collects latency samples and errors per route from all user threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+        self.bytes = {route: 0 for route in ROUTES}
+
+    def record(self, route, elapsed, ok, size=0):
+        with self._lock:
+            self.samples[route].append(elapsed)
+            self.bytes[route] += size
+            if not ok:
+                self.errors[route] += 1
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return None
+    # Nearest-rank percentile
+    index = max(0, math.ceil(fraction * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, index, client, recorder, args, deadline):
+        super().__init__(name=f'user-{index}', daemon=True)
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.deadline = deadline
+        self.rng = random.Random(args.seed + index)
+        self.email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+        self.password = 'benchmark'
+        self.token = None
+        self.files = []
+
+    def call(self, route, method, path, ok_status, **kwargs):
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        started = time.perf_counter()
+        try:
+            status, body = self.client.request(method, path, headers=headers, **kwargs)
+        except Exception:
+            self.recorder.record(route, time.perf_counter() - started, False)
+            return None
+        self.recorder.record(route, time.perf_counter() - started, status == ok_status, len(body))
+        if status != ok_status:
+            return None
+        try:
+            return json.loads(body) if body and route != 'download' else body
+        except ValueError:
+            return body
+
+    def login(self):
+        data = self.call('login', 'POST', '/login', 200, json_body={'email': self.email, 'password': self.password})
+        if data:
+            self.token = data['token']
+
+    def upload(self):
+        size = self.rng.choice(self.args.sizes)
+        name = f"bench-{size}.bin"
+        data = self.call('upload', 'POST', '/upload', 201, upload=(name, self.rng.randbytes(size)))
+        if data and 'file_id' in data:
+            self.files.append(data['file_id'])
+
+    def list(self):
+        data = self.call('list', 'GET', '/get_files', 200)
+        if isinstance(data, list):
+            self.files = [f['id'] for f in data]
+
+    def download(self):
+        if not self.files:
+            return self.upload()
+        self.call('download', 'GET', f'/download_file/{self.rng.choice(self.files)}', 200)
+
+    def delete(self):
+        if not self.files:
+            return self.upload()
+        file_id = self.files.pop(self.rng.randrange(len(self.files)))
+        self.call('delete', 'DELETE', f'/delete_file/{file_id}', 200)
+
+    def run(self):
+        status, body = self.client.request('POST', '/add_user', json_body={
+            'username': self.name, 'email': self.email, 'password': self.password})
+        if status != 201:
+            print(f"{self.name}: could not register ({status}): {body[:200]!r}", file=sys.stderr)
+            return
+        self.token = json.loads(body).get('token')
+
+        routes = list(self.args.mix)
+        weights = [self.args.mix[r] for r in routes]
+        done = 0
+        while time.monotonic() < self.deadline and (not self.args.requests or done < self.args.requests):
+            getattr(self, self.rng.choices(routes, weights)[0])()
+            done += 1
+
+
+def summarize(recorder, elapsed):
+    routes = {}
+    for route in ROUTES:
+        samples = sorted(recorder.samples[route])
+        if not samples:
+            continue
+        routes[route] = {
+            "count": len(samples),
+            "errors": recorder.errors[route],
+            "error_rate": recorder.errors[route] / len(samples),
+            "throughput_rps": len(samples) / elapsed,
+            "bytes": recorder.bytes[route],
+            "mean_ms": 1000 * sum(samples) / len(samples),
+            "p50_ms": 1000 * percentile(samples, 0.50),
+            "p95_ms": 1000 * percentile(samples, 0.95),
+            "p99_ms": 1000 * percentile(samples, 0.99),
+            "max_ms": 1000 * samples[-1],
+        }
+
+    count = sum(r["count"] for r in routes.values())
+    errors = sum(r["errors"] for r in routes.values())
+    total = {"count": count, "errors": errors, "error_rate": errors / count if count else 0,
+             "throughput_rps": count / elapsed}
+    return routes, total
+
+
+def print_report(routes, total, baseline=None):
+    print(f"{'route':<10}{'count':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for route, stats in routes.items():
+        line = (f"{route:<10}{stats['count']:>8}{stats['throughput_rps']:>10.1f}{stats['p50_ms']:>10.2f}"
+                f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['error_rate']:>8.1%}")
+        old = (baseline or {}).get('routes', {}).get(route)
+        if old:
+            line += (f"   (p95 {stats['p95_ms'] - old['p95_ms']:+.2f} ms, "
+                     f"req/s {stats['throughput_rps'] - old['throughput_rps']:+.1f})")
+        print(line)
+    print(f"{'total':<10}{total['count']:>8}{total['throughput_rps']:>10.1f}{'':>30}{total['error_rate']:>8.1%}")
+
+
+def make_in_process_app():
+    workdir = tempfile.mkdtemp(prefix='clouddrive-bench-')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault('UPLOAD_FOLDER', os.path.join(workdir, 'files'))
+    os.environ.setdefault('SECRET_KEY', uuid.uuid4().hex)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app.main import app, db
+    with app.app_context():
+        db.create_all()
+    return app, db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='load a running server instead of driving the app in-process')
+    parser.add_argument('--users', type=int, default=10, help='concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=20, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=0, help='stop each user after this many requests')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'route weights (default {DEFAULT_MIX})')
+    parser.add_argument('--sizes', type=lambda t: [parse_size(s) for s in t.split(',')],
+                        default=[parse_size(s) for s in DEFAULT_SIZES.split(',')],
+                        help=f'upload sizes to pick from (default {DEFAULT_SIZES})')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HTTPClient(args.url)  # noqa: E731
+        target = args.url
+    else:
+        app, db = make_in_process_app()
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+        with app.app_context():
+            target = f"in-process ({db.engine.dialect.name})"
+
+    recorder = Recorder()
+    started = time.monotonic()
+    users = [VirtualUser(i, make_client(), recorder, args, started + args.duration) for i in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - started
+
+    routes, total = summarize(recorder, elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print(f"{args.users} users against {target} for {elapsed:.1f}s")
+    print_report(routes, total, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                "started_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - elapsed)),
+                "target": target,
+                "python": platform.python_version(),
+                "config": {"users": args.users, "duration": args.duration, "requests": args.requests,
+                           "mix": args.mix, "sizes": args.sizes, "seed": args.seed},
+                "elapsed_s": elapsed,
+                "total": total,
+                "routes": routes,
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    sys.exit(1 if total['count'] == 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
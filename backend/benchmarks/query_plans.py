@@ -0,0 +1,151 @@
+"""Seed a large dataset and check that the hot queries use index plans.
+
+Runs against DATABASE_URL (PostgreSQL or SQLite; defaults to a throwaway
+SQLite file), creates the schema from the models, fills it with synthetic
+users, files and logs, then EXPLAINs the queries behind get_files, name
+allocation, login and get_logs. Exits non-zero if any of them falls back to a
+full table scan, so it can run in CI to catch index regressions.
+
+    python benchmarks/query_plans.py --users 1000 --files 50000 --logs 500000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'query_plans.db')}")
+os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp())
+os.environ.setdefault('SECRET_KEY', 'query-plans')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, tuple_  # noqa: E402
+
+from app.main import app, db, User, File, Log  # noqa: E402
+
+ACTIONS = ['user_logged_in', 'user_logged_out', 'file_uploaded', 'file_downloaded', 'file_deleted']
+BATCH = 10000
+
+
+def seed(users, files, logs):
+    """Bulk-insert synthetic rows and refresh planner statistics."""
+    rng = random.Random(42)
+    started = datetime.utcnow() - timedelta(days=365)
+
+    db.session.execute(insert(User), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"}
+        for i in range(1, users + 1)
+    ])
+
+    for first in range(1, files + 1, BATCH):
+        db.session.execute(insert(File), [
+            {"id": i, "filename": f"file{i}.pdf", "filepath": f"/files/{i}", "user_id": rng.randint(1, users)}
+            for i in range(first, min(first + BATCH, files + 1))
+        ])
+
+    for first in range(1, logs + 1, BATCH):
+        db.session.execute(insert(Log), [
+            {"id": i, "action": rng.choice(ACTIONS), "user_id": rng.randint(1, users),
+             "file_id": rng.randint(1, files) if files else None,
+             "timestamp": started + timedelta(seconds=i * 31536000 // max(logs, 1))}
+            for i in range(first, min(first + BATCH, logs + 1))
+        ])
+
+    db.session.commit()
+
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def pick_sample():
+    """Return (user id, filename, file id, email) of an existing file's owner."""
+    file = File.query.order_by(File.id.desc()).first()
+    user = db.session.get(User, file.user_id) if file else User.query.first()
+    return user.id, file.filename if file else '', file.id if file else 0, user.email
+
+
+def hot_queries(user_id, filename, file_id, email):
+    """(name, table that must not be scanned, select statement) for each hot path."""
+    cursor = (datetime.utcnow() - timedelta(days=180), 10 ** 9)
+    return [
+        ('get_files', 'files', File.query.filter_by(user_id=user_id).statement),
+        ('file by name', 'files', File.query.filter_by(user_id=user_id, filename=filename).statement),
+        ('login by email', 'users', User.query.filter_by(email=email).statement),
+        ('users by username', 'users', User.query.filter_by(username='user1').statement),
+        ('get_logs first page', 'logs',
+         Log.query.order_by(Log.timestamp.desc(), Log.id.desc()).limit(101).statement),
+        ('get_logs keyset page', 'logs',
+         Log.query.filter(tuple_(Log.timestamp, Log.id) < cursor)
+         .order_by(Log.timestamp.desc(), Log.id.desc()).limit(101).statement),
+        ('get_logs per user', 'logs',
+         Log.query.filter(Log.user_id == user_id)
+         .order_by(Log.timestamp.desc(), Log.id.desc()).limit(101).statement),
+        ('logs by file', 'logs', Log.query.filter_by(file_id=file_id).statement),
+    ]
+
+
+def explain(statement):
+    """Return (plan text, list of tables read with a full scan)."""
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+    sql = str(compiled)
+
+    if db.engine.dialect.name == 'postgresql':
+        plan = db.session.execute(db.text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        plan = plan if isinstance(plan, list) else json.loads(plan)
+        scans = []
+
+        def walk(node):
+            if node.get('Node Type') == 'Seq Scan':
+                scans.append(node.get('Relation Name'))
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan[0]['Plan'])
+        return json.dumps(plan[0]['Plan'], indent=1), scans
+
+    rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+    details = [row[-1] for row in rows]
+    # "SCAN logs" is a full scan; "SCAN logs USING INDEX ..." is an ordered index walk
+    scans = [d.split()[1] for d in details if d.startswith('SCAN ') and ' USING ' not in d]
+    return '\n'.join(details), scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--files', type=int, default=50000)
+    parser.add_argument('--logs', type=int, default=500000)
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        if User.query.first() is None:
+            started = time.perf_counter()
+            seed(args.users, args.files, args.logs)
+            print(f"Seeded {args.users} users, {args.files} files, {args.logs} logs "
+                  f"in {time.perf_counter() - started:.1f}s ({db.engine.dialect.name})")
+
+        for name, table, statement in hot_queries(*pick_sample()):
+            plan, scans = explain(statement)
+            started = time.perf_counter()
+            db.session.execute(statement).fetchall()
+            elapsed = (time.perf_counter() - started) * 1000
+
+            ok = table not in scans
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name:<22} {elapsed:8.2f} ms")
+            if args.verbose or not ok:
+                print('     ' + plan.replace('\n', '\n     '))
+
+    if failures:
+        print(f"{failures} hot queries use sequential scans")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Track upload session activity for expiry
+
+Revision ID: 2b8e6f1a4c73
+Revises: 7e1b5d3a8f40
+Create Date: 2026-10-19 09:12:44.305127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b8e6f1a4c73'
+down_revision = '7e1b5d3a8f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_active_at', sa.DateTime(), nullable=True))
+
+    # Open sessions get the full TTL from when they were started
+    op.execute('UPDATE upload_sessions SET last_active_at = created_at')
+
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.alter_column('last_active_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_upload_sessions_user_id', ['user_id'], unique=False)
+        batch_op.create_index('ix_upload_sessions_last_active_at', ['last_active_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.drop_index('ix_upload_sessions_last_active_at')
+        batch_op.drop_index('ix_upload_sessions_user_id')
+        batch_op.drop_column('last_active_at')
@@ -0,0 +1,42 @@
+"""Add resumable upload tables
+
+Revision ID: 3f9c1d7a2b44
+Revises: e2fda9705851
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d7a2b44'
+down_revision = 'e2fda9705851'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upload_sessions',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('total_size', sa.BigInteger(), nullable=False),
+    sa.Column('chunk_size', sa.Integer(), nullable=False),
+    sa.Column('temp_path', sa.String(length=255), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('upload_chunks',
+    sa.Column('upload_id', sa.String(length=32), nullable=False),
+    sa.Column('offset', sa.BigInteger(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['upload_id'], ['upload_sessions.id'], ),
+    sa.PrimaryKeyConstraint('upload_id', 'offset')
+    )
+
+
+def downgrade():
+    op.drop_table('upload_chunks')
+    op.drop_table('upload_sessions')
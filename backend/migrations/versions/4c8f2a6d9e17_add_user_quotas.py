@@ -0,0 +1,28 @@
+"""Add per-user quotas
+
+Revision ID: 4c8f2a6d9e17
+Revises: 9d4a7e2c6b31
+Create Date: 2026-10-18 21:06:37.402915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8f2a6d9e17'
+down_revision = '9d4a7e2c6b31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_usage', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('quota_bytes', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('quota_files', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user_usage', schema=None) as batch_op:
+        batch_op.drop_column('quota_files')
+        batch_op.drop_column('quota_bytes')
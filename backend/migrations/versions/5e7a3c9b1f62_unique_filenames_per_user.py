@@ -0,0 +1,37 @@
+"""Unique filenames per user with suffix counters
+
+Revision ID: 5e7a3c9b1f62
+Revises: c41d8e6f2a90
+Create Date: 2026-10-18 13:05:52.647193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7a3c9b1f62'
+down_revision = 'c41d8e6f2a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('filename_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('next_suffix', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'filename')
+    )
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_index('ix_files_user_id_filename')
+        batch_op.create_index('uq_files_user_id_filename', ['user_id', 'filename'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_index('uq_files_user_id_filename')
+        batch_op.create_index('ix_files_user_id_filename', ['user_id', 'filename'], unique=False)
+
+    op.drop_table('filename_counters')
@@ -0,0 +1,26 @@
+"""Add blob storage tier
+
+Revision ID: 7e1b5d3a8f40
+Revises: 4c8f2a6d9e17
+Create Date: 2026-10-18 22:14:05.618204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e1b5d3a8f40'
+down_revision = '4c8f2a6d9e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tier', sa.String(length=16), server_default='hot', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.drop_column('tier')
@@ -0,0 +1,39 @@
+"""Add content-addressed blobs
+
+Revision ID: 8b2e5f0c9d13
+Revises: 3f9c1d7a2b44
+Create Date: 2026-10-18 11:02:17.884310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e5f0c9d13'
+down_revision = '3f9c1d7a2b44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_foreign_key('files_content_hash_fkey', 'blobs', ['content_hash'], ['sha256'])
+        batch_op.create_index('ix_files_content_hash', ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_index('ix_files_content_hash')
+        batch_op.drop_constraint('files_content_hash_fkey', type_='foreignkey')
+        batch_op.drop_column('content_hash')
+
+    op.drop_table('blobs')
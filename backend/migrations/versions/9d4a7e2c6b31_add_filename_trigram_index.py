@@ -0,0 +1,43 @@
+"""Add trigram index for filename search
+
+Revision ID: 9d4a7e2c6b31
+Revises: b6e19c4d0a57
+Create Date: 2026-10-18 19:48:12.530871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4a7e2c6b31'
+down_revision = 'b6e19c4d0a57'
+branch_labels = None
+depends_on = None
+
+
+EXTENSIONS = ('pg_trgm', 'btree_gin')
+
+
+def upgrade():
+    # Only PostgreSQL servers that ship both extensions get the index; without
+    # it, search falls back to the n-gram index (see SEARCH_BACKEND)
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    available = bind.execute(sa.text('SELECT name FROM pg_available_extensions WHERE name IN :names')
+                             .bindparams(sa.bindparam('names', expanding=True)), {'names': list(EXTENSIONS)})
+    if len(available.all()) < len(EXTENSIONS):
+        return
+
+    # pg_trgm supplies the trigram operator class, btree_gin lets user_id
+    # share the GIN index so a search only visits that user's entries
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    op.create_index('ix_files_user_id_filename_trgm', 'files',
+                    ['user_id', sa.text('lower(filename) gin_trgm_ops')], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_files_user_id_filename_trgm')
@@ -0,0 +1,37 @@
+"""Add size, MIME type and timestamps to File model
+
+Revision ID: a7d2f4e8c015
+Revises: 5e7a3c9b1f62
+Create Date: 2026-10-18 13:48:09.221954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d2f4e8c015'
+down_revision = '5e7a3c9b1f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('mime_type', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+        batch_op.add_column(sa.Column('modified_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+
+    # Sizes of files already in the blob store are known without touching the disk;
+    # 'flask migrate-blobs' fills in the rest
+    op.execute('UPDATE files SET size = (SELECT blobs.size FROM blobs WHERE blobs.sha256 = files.content_hash) '
+               'WHERE content_hash IS NOT NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_column('modified_at')
+        batch_op.drop_column('created_at')
+        batch_op.drop_column('mime_type')
+        batch_op.drop_column('size')
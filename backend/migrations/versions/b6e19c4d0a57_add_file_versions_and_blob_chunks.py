@@ -0,0 +1,77 @@
+"""Add file versions and blob chunks
+
+Revision ID: b6e19c4d0a57
+Revises: f1c83a5d7b96
+Create Date: 2026-10-18 17:21:40.118352
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e19c4d0a57'
+down_revision = 'f1c83a5d7b96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Every existing file is its own first version
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    op.create_table('file_versions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('filepath', sa.String(length=255), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=True),
+    sa.Column('size', sa.BigInteger(), nullable=True),
+    sa.Column('mime_type', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['content_hash'], ['blobs.sha256'], ),
+    sa.ForeignKeyConstraint(['file_id'], ['files.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('file_id', 'version', name='uq_file_versions_file_id_version')
+    )
+    op.create_table('blob_chunks',
+    sa.Column('blob_sha256', sa.String(length=64), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('chunk_sha256', sa.String(length=64), nullable=False),
+    sa.Column('offset', sa.BigInteger(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['blob_sha256'], ['blobs.sha256'], ),
+    sa.ForeignKeyConstraint(['chunk_sha256'], ['blobs.sha256'], ),
+    sa.PrimaryKeyConstraint('blob_sha256', 'position')
+    )
+    with op.batch_alter_table('file_versions', schema=None) as batch_op:
+        batch_op.create_index('ix_file_versions_content_hash', ['content_hash'], unique=False)
+
+    with op.batch_alter_table('blob_chunks', schema=None) as batch_op:
+        batch_op.create_index('ix_blob_chunks_chunk_sha256', ['chunk_sha256'], unique=False)
+
+    # Uploading an existing name now adds a version instead of a suffixed copy
+    op.drop_table('filename_counters')
+
+
+def downgrade():
+    op.create_table('filename_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('next_suffix', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'filename')
+    )
+
+    with op.batch_alter_table('blob_chunks', schema=None) as batch_op:
+        batch_op.drop_index('ix_blob_chunks_chunk_sha256')
+
+    with op.batch_alter_table('file_versions', schema=None) as batch_op:
+        batch_op.drop_index('ix_file_versions_content_hash')
+
+    op.drop_table('blob_chunks')
+    op.drop_table('file_versions')
+
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,42 @@
+"""Add indexes for files and logs access paths
+
+Revision ID: c41d8e6f2a90
+Revises: 8b2e5f0c9d13
+Create Date: 2026-10-18 12:20:05.310472
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d8e6f2a90'
+down_revision = '8b2e5f0c9d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('ix_users_username', ['username'], unique=False)
+
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.create_index('ix_files_user_id_filename', ['user_id', 'filename'], unique=False)
+
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        batch_op.create_index('ix_logs_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_logs_user_id_timestamp_id', ['user_id', 'timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_logs_file_id', ['file_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_logs_file_id')
+        batch_op.drop_index('ix_logs_user_id_timestamp_id')
+        batch_op.drop_index('ix_logs_timestamp_id')
+
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_index('ix_files_user_id_filename')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_username')
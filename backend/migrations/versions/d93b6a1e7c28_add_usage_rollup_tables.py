@@ -0,0 +1,38 @@
+"""Add usage rollup tables
+
+Revision ID: d93b6a1e7c28
+Revises: a7d2f4e8c015
+Create Date: 2026-10-18 14:31:40.778261
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93b6a1e7c28'
+down_revision = 'a7d2f4e8c015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_usage',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('bytes_stored', sa.BigInteger(), nullable=False),
+    sa.Column('file_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('daily_action_counts',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('action', sa.String(length=255), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'action')
+    )
+    # Populate with 'flask rebuild-stats' after upgrading
+
+
+def downgrade():
+    op.drop_table('daily_action_counts')
+    op.drop_table('user_usage')
@@ -0,0 +1,27 @@
+"""Add encoding to Blob model
+
+Revision ID: f1c83a5d7b96
+Revises: d93b6a1e7c28
+Create Date: 2026-10-18 15:52:17.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c83a5d7b96'
+down_revision = 'd93b6a1e7c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing blobs were all stored raw, which is what NULL means
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('encoding', sa.String(length=16), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('blobs', schema=None) as batch_op:
+        batch_op.drop_column('encoding')
@@ -0,0 +1,63 @@
+"""Shared fixtures. The app reads its configuration from the environment when
+app.main is first imported, so the session fixture points it at a throwaway
+SQLite database and upload folder before importing it.
+
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+import os
+import shutil
+import sys
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def main(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('app')
+    os.environ['DATABASE_URL'] = f"sqlite:///{workdir / 'test.db'}"
+    os.environ['UPLOAD_FOLDER'] = str(workdir / 'files')
+    os.environ['LOG_WRITE_MODE'] = 'sync'
+    os.environ['SECRET_KEY'] = 'test-secret-key'
+    from app import main
+
+    # Foreign keys are enforced on PostgreSQL; SQLite needs asking
+    with main.app.app_context():
+        event.listen(main.db.engine, 'connect', lambda connection, record: connection.execute('PRAGMA foreign_keys=ON'))
+        main.db.engine.dispose()
+    return main
+
+
+@pytest.fixture
+def client(main):
+    """A test client over empty tables and an empty upload folder."""
+    with main.app.app_context():
+        main.db.drop_all()
+        main.db.create_all()
+    shutil.rmtree(main.BASE_UPLOAD_FOLDER, ignore_errors=True)
+    os.makedirs(main.BASE_UPLOAD_FOLDER)
+    return main.app.test_client()
+
+
+@pytest.fixture
+def auth(client):
+    """Headers authenticating a freshly added user."""
+    response = client.post('/add_user', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'secret'})
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    """A boto3 S3 client on moto's in-process S3, with an empty bucket 'cold'."""
+    boto3 = pytest.importorskip('boto3')
+    moto = pytest.importorskip('moto')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket='cold')
+        yield client
@@ -0,0 +1,128 @@
+import io
+import os
+
+import pytest
+
+from app.blobstore import blob_exists, temp_dir
+
+
+def upload(client, auth, data, filename):
+    response = client.post('/upload', data={'file': (io.BytesIO(data), filename)}, headers=auth,
+                           content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['file_id']
+
+
+def digest_of(main, file_id):
+    with main.app.app_context():
+        return main.db.session.get(main.File, file_id).content_hash
+
+
+def leftovers(main):
+    folder = temp_dir(main.BASE_UPLOAD_FOLDER)
+    return [name for name in os.listdir(folder) if name.startswith('retired-')] if os.path.isdir(folder) else []
+
+
+def release_last_copy(main, file_id):
+    """Delete file `file_id` and its blob the way delete_file does, without committing."""
+    file = main.db.session.get(main.File, file_id)
+    main.db.session.delete(file)
+    main.db.session.flush()
+    main.release_blob(file.content_hash)
+
+
+def test_rolled_back_release_keeps_the_bytes(main, client, auth):
+    file_id = upload(client, auth, os.urandom(5000), 'kept.bin')
+    digest = digest_of(main, file_id)
+
+    with main.app.app_context():
+        release_last_copy(main, file_id)
+        assert not blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+        main.db.session.rollback()
+
+    assert blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+    assert not leftovers(main)
+
+
+def test_uncommitted_release_keeps_the_bytes(main, client, auth):
+    file_id = upload(client, auth, os.urandom(5000), 'kept.bin')
+    digest = digest_of(main, file_id)
+
+    with main.app.app_context():
+        release_last_copy(main, file_id)
+        assert not blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+    # Session closed at teardown without a commit
+
+    assert blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+    assert not leftovers(main)
+
+
+def test_deleting_the_last_copy_removes_the_bytes(main, client, auth):
+    file_id = upload(client, auth, os.urandom(5000), 'gone.bin')
+    digest = digest_of(main, file_id)
+
+    assert client.delete(f'/delete_file/{file_id}', headers=auth).status_code == 200
+    main.unlink_queue.join()
+    assert not blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+    assert not leftovers(main)
+
+
+def test_deleting_the_last_copy_purges_its_thumbnails(main, client, auth):
+    pytest.importorskip('PIL')
+    from PIL import Image
+
+    image = io.BytesIO()
+    Image.new('RGB', (600, 400), 'teal').save(image, 'PNG')
+    os.makedirs(os.path.join(main.BASE_UPLOAD_FOLDER, 'thumbnails'), exist_ok=True)
+    file_id = upload(client, auth, image.getvalue(), 'teal.png')
+    digest = digest_of(main, file_id)
+    main.thumbnail_queue.join()
+    assert client.get(f'/thumbnail/{file_id}', headers=auth).status_code == 200
+
+    assert client.delete(f'/delete_file/{file_id}', headers=auth).status_code == 200
+    main.unlink_queue.join()
+    assert all(main.thumbnail_cache.get(digest, size) is None for size in main.THUMBNAIL_SIZES.values())
+
+
+def ref_count(main, digest):
+    with main.app.app_context():
+        blob = main.db.session.get(main.Blob, digest)
+        return blob.ref_count if blob is not None else None
+
+
+def test_duplicate_content_shares_one_blob(main, client, auth):
+    data = os.urandom(5000)
+    first = upload(client, auth, data, 'a.bin')
+    second = upload(client, auth, data, 'b.bin')
+    digest = digest_of(main, first)
+    assert digest_of(main, second) == digest
+    assert ref_count(main, digest) == 2
+
+    assert client.delete(f'/delete_file/{first}', headers=auth).status_code == 200
+    main.unlink_queue.join()
+    assert ref_count(main, digest) == 1
+    assert blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+    assert client.get(f'/download_file/{second}', headers=auth).data == data
+
+    assert client.delete(f'/delete_file/{second}', headers=auth).status_code == 200
+    main.unlink_queue.join()
+    assert ref_count(main, digest) is None
+    assert not blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+
+
+def test_batch_delete_releases_each_reference(main, client, auth):
+    data = os.urandom(5000)
+    file_ids = [upload(client, auth, data, f'{name}.bin') for name in 'abc']
+    digest = digest_of(main, file_ids[0])
+    assert ref_count(main, digest) == 3
+
+    response = client.post('/delete_files', json={'file_ids': file_ids[:2]}, headers=auth)
+    assert response.status_code == 200
+    main.unlink_queue.join()
+    assert ref_count(main, digest) == 1
+    assert blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+
+    assert client.post('/delete_files', json={'file_ids': file_ids[2:]}, headers=auth).status_code == 200
+    main.unlink_queue.join()
+    assert ref_count(main, digest) is None
+    assert not blob_exists(main.BASE_UPLOAD_FOLDER, digest)
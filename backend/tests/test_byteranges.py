@@ -0,0 +1,106 @@
+import io
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from app.byteranges import resolve_ranges, if_range_matches, multipart_byteranges
+
+MODIFIED = datetime(2024, 5, 1, 12, 30, 15, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('header, ranges', [
+    ('bytes=0-9', [(0, 10)]),
+    ('bytes=90-', [(90, 100)]),
+    ('bytes=-10', [(90, 100)]),
+    ('bytes=-500', [(0, 100)]),
+    ('bytes=95-200', [(95, 100)]),
+    ('bytes=50-59, 0-9', [(0, 10), (50, 60)]),
+    ('bytes=0-9,5-19,20-29', [(0, 30)]),  # Overlapping and adjacent ranges merge
+    ('BYTES=0-0', [(0, 1)]),
+    ('bytes=100-', []),
+    ('bytes=-0', []),
+    ('bytes=100-200,300-', []),
+])
+def test_resolve_ranges(header, ranges):
+    assert resolve_ranges(header, 100) == ranges
+
+
+@pytest.mark.parametrize('header', [None, '', 'bytes=', 'items=0-9', 'bytes=9-0', 'bytes=abc', 'bytes=0-9,x'])
+def test_unusable_range_headers_mean_the_whole_body(header):
+    assert resolve_ranges(header, 100) is None
+
+
+@pytest.mark.parametrize('header, honoured', [
+    (None, True),
+    ('"abc"', True),
+    ('"other"', False),
+    ('W/"abc"', False),  # Weak tags never match
+    ('Wed, 01 May 2024 12:30:15 GMT', True),
+    ('Wed, 01 May 2024 12:30:14 GMT', False),
+    ('not a date', False),
+])
+def test_if_range(header, honoured):
+    assert if_range_matches(header, 'abc', MODIFIED.replace(microsecond=999)) is honoured
+
+
+def test_multipart_body_matches_its_length(tmp_path):
+    path = tmp_path / 'body'
+    data = os.urandom(200000)
+    path.write_bytes(data)
+
+    for file in (open(path, 'rb'), io.BytesIO(data)):
+        content_type, length, body = multipart_byteranges(file, [(0, 10), (100000, 170000)], len(data), 'x/y')
+        body = b''.join(body)
+        assert len(body) == length
+        boundary = content_type.split('boundary=')[1]
+        assert body.endswith(f'--{boundary}--\r\n'.encode())
+        assert b'Content-Range: bytes 100000-169999/200000' in body
+        assert data[100000:170000] in body
+        assert file.closed
+
+
+def download(client, auth, file_id, **headers):
+    return client.get(f'/download_file/{file_id}', headers={**auth, **headers})
+
+
+@pytest.fixture
+def stored(client, auth):
+    data = os.urandom(5000)  # Does not compress, so ranges are over these bytes
+    response = client.post('/upload', data={'file': (io.BytesIO(data), 'random.bin')}, headers=auth,
+                           content_type='multipart/form-data')
+    return response.get_json()['file_id'], data
+
+
+def test_single_range(client, auth, stored):
+    file_id, data = stored
+    response = download(client, auth, file_id, Range='bytes=-100')
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == 'bytes 4900-4999/5000'
+    assert response.data == data[-100:]
+
+
+def test_several_ranges(client, auth, stored):
+    file_id, data = stored
+    response = download(client, auth, file_id, Range='bytes=0-9,4000-4009')
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    assert int(response.headers['Content-Length']) == len(response.data)
+    assert data[:10] in response.data and data[4000:4010] in response.data
+
+
+def test_unsatisfiable_range(client, auth, stored):
+    file_id, _ = stored
+    response = download(client, auth, file_id, Range='bytes=6000-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == 'bytes */5000'
+
+
+def test_stale_if_range_gets_the_whole_file(client, auth, stored):
+    file_id, data = stored
+    etag = download(client, auth, file_id).headers['ETag']
+
+    response = download(client, auth, file_id, Range='bytes=0-9', **{'If-Range': etag})
+    assert (response.status_code, response.data) == (206, data[:10])
+    response = download(client, auth, file_id, Range='bytes=0-9', **{'If-Range': '"stale"'})
+    assert (response.status_code, response.data) == (200, data)
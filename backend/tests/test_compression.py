@@ -0,0 +1,21 @@
+import io
+import os
+
+from app.blobstore import write_temp_blob
+from app.compression import MIN_COMPRESS_BYTES, worth_compressing
+
+
+def test_small_and_random_blocks_are_not_worth_compressing():
+    assert not worth_compressing(b'a' * (MIN_COMPRESS_BYTES - 1))
+    assert not worth_compressing(os.urandom(MIN_COMPRESS_BYTES * 4))
+    assert worth_compressing(b'a' * MIN_COMPRESS_BYTES)
+
+
+def test_small_bodies_are_stored_raw(tmp_path):
+    _, size, temp_path, encoding = write_temp_blob(str(tmp_path), io.BytesIO(b'hello, world\n' * 10), 'gzip')
+    assert (size, encoding) == (130, None)
+    with open(temp_path, 'rb') as stored:
+        assert stored.read() == b'hello, world\n' * 10
+
+    _, _, _, encoding = write_temp_blob(str(tmp_path), io.BytesIO(b'hello, world\n' * 1000), 'gzip')
+    assert encoding == 'gzip'
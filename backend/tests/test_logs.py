@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+
+@pytest.mark.parametrize('query', [{'user': 'abc'}, {'user': '1.5'}, {'since': 'yesterday'}])
+def test_malformed_filters_are_rejected(client, auth, query):
+    response = client.get('/get_logs', query_string=query)
+    assert response.status_code == 400
+
+
+def test_user_filter(client, auth):
+    client.post('/add_user', json={'username': 'bob', 'email': 'bob@example.com', 'password': 'secret'})
+
+    logs = client.get('/get_logs', query_string={'user': 2}).get_json()['logs']
+    assert [log['username'] for log in logs] == ['bob']
+
+    everyone = client.get('/get_logs', query_string={'user': ''}).get_json()['logs']
+    assert {log['username'] for log in everyone} == {'alice', 'bob'}
+
+
+def test_export_is_scoped_to_the_caller(client, auth):
+    client.post('/add_user', json={'username': 'bob', 'email': 'bob@example.com', 'password': 'secret'})
+
+    assert client.get('/export/logs').status_code == 400
+    assert client.get('/export/logs', query_string={'user': 2}, headers=auth).status_code == 403
+
+    response = client.get('/export/logs', query_string={'format': 'csv'}, headers=auth)
+    assert response.status_code == 200
+    rows = response.get_data(as_text=True).splitlines()
+    assert rows[0].startswith('id,action,')
+    assert len(rows) > 1 and all(',alice,' in row for row in rows[1:])
+
+
+def test_queued_rows_of_a_deleted_file_keep_their_batch(main, client, auth):
+    response = client.post('/upload', data={'file': (io.BytesIO(b'hello'), 'hello.txt')}, headers=auth,
+                           content_type='multipart/form-data')
+    file_id = response.get_json()['file_id']
+    # Entries still queued in the writer when the file goes
+    queued = [main.file_action_row('file_downloaded', 1, file_id=file_id),
+              main.file_action_row('file_downloaded', 1)]
+    assert client.delete(f'/delete_file/{file_id}', headers=auth).status_code == 200
+
+    main.write_log_rows(queued)
+    with main.app.app_context():
+        downloads = main.Log.query.filter_by(action='file_downloaded').all()
+        assert [log.file_id for log in downloads] == [None, None]
@@ -0,0 +1,35 @@
+import time
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+
+def test_failed_statement_leaves_no_timer_behind(main, client):
+    failed = []
+
+    def record_failure(exception_context):
+        failed.append(exception_context.execution_context)
+
+    with main.app.test_request_context(), main.db.engine.connect() as conn:
+        event.listen(main.db.engine, 'handle_error', record_failure)
+        main.g.db_queries, main.g.db_seconds = 0, 0.0
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM no_such_table'))
+        event.remove(main.db.engine, 'handle_error', record_failure)
+        time.sleep(0.2)
+        conn.execute(text('SELECT 1'))
+
+        # The failed statement's start time went away with its own context
+        assert failed and failed[0].query_started is not None
+        # Only the statement that ran is charged, and only for its own time
+        assert main.g.db_queries == 1
+        assert main.g.db_seconds < 0.2
+
+
+def test_requests_count_their_queries(main, client, auth):
+    assert client.get('/get_files', headers=auth).status_code == 200
+    metrics = client.get('/metrics').get_data(as_text=True)
+    counts = [line for line in metrics.splitlines()
+              if line.startswith('db_queries_per_request_count') and 'get_files' in line]
+    assert counts and float(counts[0].rsplit(' ', 1)[1]) >= 1
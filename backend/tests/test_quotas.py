@@ -0,0 +1,86 @@
+import io
+import os
+
+import pytest
+
+from app.blobstore import temp_dir
+
+
+def upload(client, auth, data, filename):
+    return client.post('/upload', data={'file': (io.BytesIO(data), filename)}, headers=auth,
+                       content_type='multipart/form-data')
+
+
+def set_quota(main, *args):
+    result = main.app.test_cli_runner().invoke(args=['set-quota', '1', *args])
+    assert result.exit_code == 0, result.output
+
+
+def usage(main):
+    with main.app.app_context():
+        status = main.usage_status(1)
+        return status['bytes_stored'], status['file_count']
+
+
+def test_charge_checks_and_adds_in_one_statement(main, client, auth):
+    set_quota(main, '--bytes', '100', '--files', '2')
+    with main.app.app_context():
+        main.charge_usage(1, 60, 1)
+        main.db.session.commit()
+        with pytest.raises(main.QuotaExceeded):
+            main.charge_usage(1, 60, 1)  # Would pass 100 bytes
+        with pytest.raises(main.QuotaExceeded):
+            main.charge_usage(1, 0, 2)  # Would pass 2 files
+        main.charge_usage(1, 40, 1)  # Exactly at both quotas
+        main.db.session.commit()
+    assert usage(main) == (100, 2)
+
+
+def test_first_charge_creates_the_counters(main, client, auth, monkeypatch):
+    monkeypatch.setitem(main.app.config, 'DEFAULT_QUOTA_FILES', 1)
+    with main.app.app_context():
+        assert main.db.session.get(main.UserUsage, 1) is None
+        main.charge_usage(1, 10, 1)
+        main.db.session.commit()
+        with pytest.raises(main.QuotaExceeded):
+            main.charge_usage(1, 10, 1)
+    assert usage(main) == (10, 1)
+
+
+def test_upload_that_slips_past_the_precheck_is_refused(main, client, auth, monkeypatch):
+    assert upload(client, auth, os.urandom(5000), 'a.bin').status_code == 201
+    set_quota(main, '--bytes', '8000')
+    # As if a concurrent upload took the room after this one was checked
+    monkeypatch.setattr(main, 'upload_too_large', lambda user_id: False)
+
+    response = upload(client, auth, os.urandom(5000), 'b.bin')
+    assert response.status_code == 413
+    assert response.get_json()['usage']['bytes_stored'] == 5000
+    assert usage(main) == (5000, 1)
+    with main.app.app_context():
+        assert [file.filename for file in main.File.query] == ['a.bin']
+    assert not os.listdir(temp_dir(main.BASE_UPLOAD_FOLDER))
+
+
+def test_versions_count_bytes_and_deletes_give_them_back(main, client, auth):
+    set_quota(main, '--bytes', '12000', '--files', '1')
+    file_id = upload(client, auth, os.urandom(5000), 'a.bin').get_json()['file_id']
+    assert upload(client, auth, os.urandom(5000), 'a.bin').status_code == 201  # A new version, not a new file
+    assert usage(main) == (10000, 1)
+    assert upload(client, auth, os.urandom(5000), 'a.bin').status_code == 413
+    assert upload(client, auth, b'x', 'b.bin').status_code == 413
+
+    assert client.delete(f'/delete_file/{file_id}', headers=auth).status_code == 200
+    assert usage(main) == (0, 0)
+    assert upload(client, auth, b'x', 'b.bin').status_code == 201
+
+
+def test_reconcile_repairs_drifted_counters(main, client, auth):
+    upload(client, auth, os.urandom(5000), 'a.bin')
+    with main.app.app_context():
+        main.db.session.get(main.UserUsage, 1).bytes_stored = 7
+        main.db.session.commit()
+
+    result = main.app.test_cli_runner().invoke(args=['reconcile-usage'])
+    assert 'repaired 1' in result.output
+    assert usage(main) == (5000, 1)
@@ -0,0 +1,89 @@
+import io
+
+import pytest
+
+from app.search import NgramIndex
+
+NAMES = ['report.pdf', 'report', 'annual_report.pdf', 'report-2023.xlsx', 'old_reports.zip', 'photo.jpg']
+
+
+def ranked(index, query, mode='fuzzy', count=50):
+    rows = dict(enumerate(NAMES, 1))
+    return [(rows[file_id], tier) for tier, _, file_id in
+            index.search(1, (len(rows), len(rows)), lambda: list(rows.items()), query, mode, count)]
+
+
+def test_tiers_then_names():
+    assert ranked(NgramIndex(), 'Report') == [
+        ('report', 0),
+        ('report-2023.xlsx', 1), ('report.pdf', 1),
+        ('annual_report.pdf', 2), ('old_reports.zip', 2),
+    ]
+
+
+def test_match_modes():
+    index = NgramIndex()
+    assert ranked(index, 'report', mode='prefix') == [('report', 0), ('report-2023.xlsx', 1), ('report.pdf', 1)]
+    assert ranked(index, 'reprot', mode='substring') == []
+    fuzzy = ranked(index, 'reprot')
+    assert fuzzy and {tier for _, tier in fuzzy} == {3} and 'photo.jpg' not in dict(fuzzy)
+
+
+def test_short_queries_and_pages():
+    index = NgramIndex()
+    assert ranked(index, 'ph') == [('photo.jpg', 1)]
+    assert ranked(index, 'report', count=2) == [('report', 0), ('report-2023.xlsx', 1)]
+
+
+def test_index_follows_the_fingerprint():
+    index = NgramIndex()
+    rows = [(1, 'a.txt')]
+    assert index.search(1, (1, 1), lambda: rows, 'b.txt', 'prefix', 10) == []
+    rows = [(1, 'a.txt'), (2, 'b.txt')]  # Written by another process
+    assert index.search(1, (2, 2), lambda: rows, 'b.txt', 'prefix', 10) == [(0, 1.0, 2)]
+
+
+@pytest.fixture
+def search_index(main, monkeypatch):
+    """A fresh in-process index; the tables are emptied between tests, the index is not."""
+    index = NgramIndex()
+    monkeypatch.setattr(main, 'search_index', index)
+    monkeypatch.setitem(main.app.config, 'SEARCH_BACKEND', 'ngram')
+    return index
+
+
+def search(client, auth, **query):
+    response = client.get('/search', query_string=query, headers=auth)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_search_endpoint(main, client, auth, search_index):
+    file_ids = {}
+    for name in NAMES:
+        response = client.post('/upload', data={'file': (io.BytesIO(name.encode()), name)}, headers=auth,
+                               content_type='multipart/form-data')
+        file_ids[name] = response.get_json()['file_id']
+
+    page = search(client, auth, q='report', limit=3)
+    assert [(row['filename'], row['match']) for row in page['results']] == [
+        ('report', 'exact'), ('report-2023.xlsx', 'prefix'), ('report.pdf', 'prefix')]
+    assert page['next_offset'] == 3
+    page = search(client, auth, q='report', limit=3, offset=3)
+    assert [row['filename'] for row in page['results']] == ['annual_report.pdf', 'old_reports.zip']
+    assert page['next_offset'] is None
+
+    # Deletes reach the index once they commit
+    assert client.delete(f"/delete_file/{file_ids['report']}", headers=auth).status_code == 200
+    assert search(client, auth, q='report', match='prefix')['results'][0]['filename'] == 'report-2023.xlsx'
+
+    # Only the caller's files are searched
+    token = client.post('/add_user', json={'username': 'bob', 'email': 'bob@example.com',
+                                           'password': 'secret'}).get_json()['token']
+    assert search(client, {'Authorization': f'Bearer {token}'}, q='report')['results'] == []
+
+
+@pytest.mark.parametrize('query', [{}, {'q': 'x' * 256}, {'q': 'a', 'match': 'regex'}, {'q': 'a', 'limit': 0},
+                                   {'q': 'a', 'offset': 5000}, {'q': 'a', 'limit': 'ten'}])
+def test_invalid_searches(client, auth, search_index, query):
+    assert client.get('/search', query_string=query, headers=auth).status_code == 400
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+
+def test_bare_user_id_header_is_not_identity(client, auth):
+    assert client.get('/get_files', headers={'user_id': '1'}).status_code == 400
+    assert client.get('/get_files', headers=auth).status_code == 200
+
+
+def test_user_id_header_opt_in(main, client, auth, monkeypatch):
+    monkeypatch.setitem(main.app.config, 'ALLOW_USER_ID_HEADER', True)
+    assert client.get('/get_files', headers={'user_id': '1'}).status_code == 200
+
+
+def test_forged_token_is_rejected(client, auth):
+    token = auth['Authorization'][:-2] + ('AA' if not auth['Authorization'].endswith('AA') else 'BB')
+    assert client.get('/get_files', headers={'Authorization': token}).status_code == 400
+
+
+def test_refuses_to_start_without_secret_key(main, tmp_path):
+    env = {key: value for key, value in os.environ.items() if key not in ('SECRET_KEY', 'FLASK_DEBUG')}
+    env.update(DATABASE_URL=f"sqlite:///{tmp_path / 'db'}", UPLOAD_FOLDER=str(tmp_path / 'files'))
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', 'import app.main'], cwd=backend, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode != 0
+    assert 'SECRET_KEY is not set' in result.stderr
@@ -0,0 +1,16 @@
+import io
+
+
+def test_stats_are_the_callers_own(client, auth):
+    client.post('/add_user', json={'username': 'bob', 'email': 'bob@example.com', 'password': 'secret'})
+    client.post('/upload', data={'file': (io.BytesIO(b'hello'), 'hello.txt')}, headers=auth,
+                content_type='multipart/form-data')
+
+    assert client.get('/stats').status_code == 400
+    assert client.get('/stats', query_string={'user': 2}).status_code == 400
+    assert client.get('/stats', query_string={'user': 2}, headers=auth).status_code == 403
+
+    stats = client.get('/stats', headers=auth).get_json()
+    assert stats['usage']['user_id'] == 1
+    assert stats['usage']['bytes_stored'] == 5 and stats['usage']['file_count'] == 1
+    assert any(row['action'] == 'file_uploaded' for row in stats['daily'])
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from app.storage import Storage, LocalStorage, S3Storage, storage_from_url
+
+DIGEST = 'ab' * 32
+
+
+def round_trip(storage, tmp_path):
+    source = tmp_path / 'source'
+    source.write_bytes(os.urandom(10000))
+    target = tmp_path / 'target'
+
+    assert not storage.exists(DIGEST)
+    storage.upload(DIGEST, str(source))
+    assert storage.exists(DIGEST)
+    storage.download(DIGEST, str(target))
+    assert target.read_bytes() == source.read_bytes()
+
+    storage.delete(DIGEST)
+    assert not storage.exists(DIGEST)
+    storage.delete(DIGEST)  # Already gone: no error
+    with pytest.raises(FileNotFoundError):
+        storage.download(DIGEST, str(target))
+
+
+def test_storage_is_abstract():
+    with pytest.raises(TypeError):
+        Storage()
+
+
+def test_local_round_trip(tmp_path):
+    round_trip(LocalStorage(str(tmp_path / 'cold')), tmp_path)
+
+
+def test_s3_round_trip(s3_client, tmp_path):
+    round_trip(S3Storage('cold', 'blobs/', client=s3_client), tmp_path)
+    assert s3_client.list_objects_v2(Bucket='cold').get('KeyCount') == 0
+
+
+def test_s3_keys_carry_prefix(s3_client, tmp_path):
+    source = tmp_path / 'source'
+    source.write_bytes(b'cold bytes')
+    S3Storage('cold', 'blobs/', client=s3_client).upload(DIGEST, str(source))
+    assert s3_client.get_object(Bucket='cold', Key=f'blobs/{DIGEST}')['Body'].read() == b'cold bytes'
+
+
+def test_storage_from_url(tmp_path):
+    assert isinstance(storage_from_url(str(tmp_path)), LocalStorage)
+    assert isinstance(storage_from_url(f'file://{tmp_path}'), LocalStorage)
+    with pytest.raises(ValueError):
+        storage_from_url('ftp://example.com/blobs')
@@ -0,0 +1,94 @@
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.blobstore import blob_exists
+from app.storage import LocalStorage, S3Storage
+
+
+@pytest.fixture(params=['local', 's3'])
+def cold_storage(request, main, monkeypatch, tmp_path):
+    """Point the app's cold tier at a directory, or at a moto S3 bucket."""
+    if request.param == 'local':
+        storage = LocalStorage(str(tmp_path / 'cold'))
+    else:
+        s3_client = request.getfixturevalue('s3_client')
+        storage = S3Storage('cold', 'blobs/', client=s3_client)
+    monkeypatch.setattr(main, 'cold_storage', storage)
+    monkeypatch.setitem(main.app.config, 'TIER_MIN_BYTES', 1)
+    return storage
+
+
+def upload(client, auth, data, filename):
+    response = client.post('/upload', data={'file': (io.BytesIO(data), filename)}, headers=auth,
+                           content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['file_id']
+
+
+def age_everything(main, days):
+    then = datetime.utcnow() - timedelta(days=days)
+    with main.app.app_context():
+        main.db.session.execute(update(main.Blob).values(created_at=then))
+        main.db.session.execute(update(main.File).values(created_at=then, modified_at=then))
+        main.db.session.commit()
+
+
+def blob_of(main, file_id):
+    with main.app.app_context():
+        file = main.db.session.get(main.File, file_id)
+        return file.content_hash, file.blob.tier
+
+
+def tier_blobs(main):
+    result = main.app.test_cli_runner().invoke(args=['tier-blobs', '--idle-days', '1'])
+    assert result.exit_code == 0, result.output
+
+
+def test_idle_blob_moves_out_and_is_recalled_on_read(main, client, auth, cold_storage):
+    data = os.urandom(5000)
+    file_id = upload(client, auth, data, 'idle.bin')
+    age_everything(main, days=5)
+
+    tier_blobs(main)
+    digest, tier = blob_of(main, file_id)
+    assert tier == 'cold'
+    assert cold_storage.exists(digest)
+    assert not blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+
+    response = client.get(f'/download_file/{file_id}', headers=auth)
+    assert response.status_code == 200
+    assert response.data == data
+    assert blob_exists(main.BASE_UPLOAD_FOLDER, digest)  # Brought back as a local cache
+    assert cold_storage.exists(digest)
+
+    # Ranges read from the recalled copy
+    response = client.get(f'/download_file/{file_id}', headers={**auth, 'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == data[100:200]
+
+
+def test_recently_downloaded_blob_stays_local(main, client, auth, cold_storage):
+    file_id = upload(client, auth, os.urandom(5000), 'busy.bin')
+    age_everything(main, days=5)
+    assert client.get(f'/download_file/{file_id}', headers=auth).status_code == 200
+
+    tier_blobs(main)
+    digest, tier = blob_of(main, file_id)
+    assert tier == 'hot'
+    assert not cold_storage.exists(digest)
+    assert blob_exists(main.BASE_UPLOAD_FOLDER, digest)
+
+
+def test_deleting_a_cold_blob_removes_the_cold_copy(main, client, auth, cold_storage):
+    file_id = upload(client, auth, os.urandom(5000), 'gone.bin')
+    age_everything(main, days=5)
+    tier_blobs(main)
+    digest, _ = blob_of(main, file_id)
+
+    assert client.delete(f'/delete_file/{file_id}', headers=auth).status_code == 200
+    main.unlink_queue.join()
+    assert not cold_storage.exists(digest)
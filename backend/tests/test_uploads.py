@@ -0,0 +1,127 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+
+def init(client, auth, filename, total_size, **extra):
+    return client.post('/upload/init', json={'filename': filename, 'total_size': total_size, **extra}, headers=auth)
+
+
+def idle(main, upload_id, hours):
+    with main.app.app_context():
+        main.db.session.execute(update(main.UploadSession).where(main.UploadSession.id == upload_id)
+                                .values(last_active_at=datetime.utcnow() - timedelta(hours=hours)))
+        main.db.session.commit()
+
+
+def part_path(main, upload_id):
+    with main.app.app_context():
+        return main.db.session.get(main.UploadSession, upload_id).temp_path
+
+
+def test_idle_sessions_are_swept_by_the_next_init(main, client, auth):
+    stale = init(client, auth, 'stale.bin', 1000).get_json()['upload_id']
+    fresh = init(client, auth, 'fresh.bin', 1000).get_json()['upload_id']
+    stale_part = part_path(main, stale)
+    idle(main, stale, hours=48)
+    idle(main, fresh, hours=1)
+
+    assert init(client, auth, 'next.bin', 1000).status_code == 201
+    assert client.get(f'/upload/{stale}', headers=auth).status_code == 404
+    assert not os.path.exists(stale_part)
+    assert client.get(f'/upload/{fresh}', headers=auth).status_code == 200
+
+
+def test_chunks_keep_a_session_alive(main, client, auth):
+    upload_id = init(client, auth, 'slow.bin', 20, chunk_size=10).get_json()['upload_id']
+    idle(main, upload_id, hours=23)
+    assert client.put(f'/upload/{upload_id}/chunk?offset=0', data=b'x' * 10, headers=auth).status_code == 200
+    with main.app.app_context():
+        session = main.db.session.get(main.UploadSession, upload_id)
+        assert session.last_active_at > datetime.utcnow() - timedelta(minutes=1)
+
+
+def test_expire_uploads_command(main, client, auth):
+    upload_ids = [init(client, auth, f'f{i}.bin', 10).get_json()['upload_id'] for i in range(3)]
+    for upload_id in upload_ids[:2]:
+        idle(main, upload_id, hours=25)
+
+    result = main.app.test_cli_runner().invoke(args=['expire-uploads'])
+    assert 'Expired 2 upload sessions' in result.output
+    with main.app.app_context():
+        assert [row.id for row in main.UploadSession.query] == upload_ids[2:]
+
+
+def test_open_sessions_count_against_the_quota(main, client, auth):
+    main.app.test_cli_runner().invoke(args=['set-quota', '1', '--bytes', '1000', '--files', '2'])
+
+    first = init(client, auth, 'a.bin', 600)
+    assert first.status_code == 201
+    assert init(client, auth, 'b.bin', 600).status_code == 413  # Fits alone, not next to a.bin
+    assert init(client, auth, 'b.bin', 300).status_code == 201
+    assert init(client, auth, 'c.bin', 10).status_code == 413  # A third new file
+
+    # An expired session no longer holds its share
+    idle(main, first.get_json()['upload_id'], hours=48)
+    assert init(client, auth, 'c.bin', 600).status_code == 201
+
+
+def test_open_sessions_per_user_are_capped(main, client, auth, monkeypatch):
+    monkeypatch.setitem(main.app.config, 'UPLOAD_SESSIONS_PER_USER', 2)
+    assert [init(client, auth, f'f{i}.bin', 10).status_code for i in range(3)] == [201, 201, 429]
+
+
+def test_chunks_in_any_order_assemble_the_file(main, client, auth):
+    data = os.urandom(25)
+    response = init(client, auth, 'parts.bin', len(data), chunk_size=10)
+    assert response.get_json()['chunk_count'] == 3
+    upload_id = response.get_json()['upload_id']
+    part = part_path(main, upload_id)
+
+    for offset in (20, 0):
+        response = client.put(f'/upload/{upload_id}/chunk?offset={offset}', data=data[offset:offset + 10],
+                              headers=auth)
+        assert response.status_code == 200
+    status = client.get(f'/upload/{upload_id}', headers=auth).get_json()
+    assert (status['received_chunks'], status['missing_offsets']) == (2, [10])
+    assert client.post(f'/upload/{upload_id}/finalize', headers=auth).status_code == 409
+
+    # Resending a chunk is harmless
+    for offset in (10, 10):
+        assert client.put(f'/upload/{upload_id}/chunk?offset={offset}', data=data[10:20],
+                          headers=auth).status_code == 200
+    response = client.post(f'/upload/{upload_id}/finalize', headers=auth)
+    assert response.status_code == 201
+    file_id = response.get_json()['file_id']
+
+    assert client.get(f'/download_file/{file_id}', headers=auth).data == data
+    assert client.get(f'/upload/{upload_id}', headers=auth).status_code == 404
+    assert not os.path.exists(part)
+
+
+def test_chunks_must_fit_the_session(main, client, auth):
+    upload_id = init(client, auth, 'parts.bin', 25, chunk_size=10).get_json()['upload_id']
+
+    def put(offset, data):
+        return client.put(f'/upload/{upload_id}/chunk', query_string={'offset': offset}, data=data,
+                          headers=auth).status_code
+
+    assert put('', b'x' * 10) == 400
+    assert put(5, b'x' * 10) == 400  # Not a chunk boundary
+    assert put(30, b'x' * 10) == 400  # Past the end
+    assert put(0, b'x' * 9) == 400
+    assert put(20, b'x' * 10) == 400  # The last chunk is short
+    assert put(20, b'x' * 5) == 200
+
+
+def test_sessions_belong_to_their_user(main, client, auth):
+    upload_id = init(client, auth, 'mine.bin', 10).get_json()['upload_id']
+    token = client.post('/add_user', json={'username': 'bob', 'email': 'bob@example.com',
+                                           'password': 'secret'}).get_json()['token']
+    bob = {'Authorization': f'Bearer {token}'}
+
+    assert client.get(f'/upload/{upload_id}', headers=bob).status_code == 403
+    assert client.put(f'/upload/{upload_id}/chunk?offset=0', data=b'x' * 10, headers=bob).status_code == 403
+    assert client.post(f'/upload/{upload_id}/finalize', headers=bob).status_code == 403
+    assert client.get(f'/upload/{upload_id}').status_code == 400
@@ -0,0 +1,86 @@
+import io
+import os
+
+from sqlalchemy import func, select
+
+from app.blobstore import blob_exists
+from app.chunking import iter_chunks, ChunkedFile, CHUNKED_ENCODING, CHUNK_MIN_SIZE, CHUNK_MAX_SIZE
+
+SIZE = 5 * 1024 * 1024
+
+
+def edited(data, at, patch):
+    return data[:at] + patch + data[at + len(patch):]
+
+
+def test_an_edit_only_moves_nearby_boundaries():
+    data = os.urandom(SIZE)
+    before = list(iter_chunks(io.BytesIO(data)))
+    after = list(iter_chunks(io.BytesIO(edited(data, SIZE // 2, b'edit'))))
+
+    assert b''.join(before) == data
+    assert all(CHUNK_MIN_SIZE <= len(chunk) <= CHUNK_MAX_SIZE for chunk in before[:-1])
+    assert len(set(before) & set(after)) >= len(before) - 2
+
+
+def test_chunked_file_reads_across_chunks():
+    chunks = [os.urandom(size) for size in (10, 20, 5)]
+    data = b''.join(chunks)
+    offsets = [0, 10, 30]
+    view = ChunkedFile(lambda digest: io.BytesIO(chunks[int(digest)]),
+                       [(offset, len(chunk), str(index), None)
+                        for index, (offset, chunk) in enumerate(zip(offsets, chunks))])
+
+    assert view.read(15) == data[:15]
+    view.seek(28)
+    assert view.read(4) == data[28:32]
+    view.seek(3)
+    assert view.read() == data[3:]
+
+
+def upload(client, auth, data, filename):
+    response = client.post('/upload', data={'file': (io.BytesIO(data), filename)}, headers=auth,
+                           content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['file_id']
+
+
+def test_versions_are_stored_as_shared_chunks(main, client, auth):
+    v1 = os.urandom(SIZE)
+    v2 = edited(v1, SIZE // 2, b'edit')
+    file_id = upload(client, auth, v1, 'big.bin')
+    assert upload(client, auth, v2, 'big.bin') == file_id
+    main.chunk_queue.join()
+
+    versions = client.get(f'/file_versions/{file_id}', headers=auth).get_json()['versions']
+    assert [version['version'] for version in versions] == [2, 1]
+    digests = [version['content_hash'] for version in versions]
+    with main.app.app_context():
+        assert {main.db.session.get(main.Blob, digest).encoding for digest in digests} == {CHUNKED_ENCODING}
+        chunk_rows = main.db.session.execute(select(func.count()).select_from(main.BlobChunk)).scalar()
+        distinct = main.db.session.execute(select(func.count(main.BlobChunk.chunk_sha256.distinct()))).scalar()
+        assert distinct < chunk_rows  # Unchanged chunks are stored once
+        chunk_digests = set(main.db.session.execute(select(main.BlobChunk.chunk_sha256)).scalars())
+    assert not any(blob_exists(main.BASE_UPLOAD_FOLDER, digest) for digest in digests)
+
+    assert client.get(f'/download_file/{file_id}', headers=auth).data == v2
+    assert client.get(f'/download_file/{file_id}?version=1', headers=auth).data == v1
+    response = client.get(f'/download_file/{file_id}?version=1',
+                          headers={**auth, 'Range': f'bytes={SIZE // 2 - 10}-{SIZE // 2 + 9}'})
+    assert response.status_code == 206
+    assert response.data == v1[SIZE // 2 - 10:SIZE // 2 + 10]
+
+    # Deleting the file lets go of every chunk
+    assert client.delete(f'/delete_file/{file_id}', headers=auth).status_code == 200
+    main.unlink_queue.join()
+    with main.app.app_context():
+        assert main.db.session.execute(select(func.count()).select_from(main.Blob)).scalar() == 0
+    assert not any(blob_exists(main.BASE_UPLOAD_FOLDER, digest) for digest in chunk_digests)
+
+
+def test_unchanged_upload_adds_no_version(main, client, auth):
+    data = os.urandom(5000)
+    file_id = upload(client, auth, data, 'same.bin')
+    upload(client, auth, data, 'same.bin')
+    versions = client.get(f'/file_versions/{file_id}', headers=auth).get_json()['versions']
+    assert [version['version'] for version in versions] == [1]
@@ -36,6 +36,7 @@ function App() {
       const response = await axios.post('http://localhost:5001/logout', {}, {
         headers: {
           'user_id': storedUserId,  // Pass user_id in headers
+          'Authorization': `Bearer ${localStorage.getItem('session_token')}`,
           'Content-Type': 'application/json',
         }
       });
@@ -43,6 +44,7 @@ function App() {
       if (response.status === 200) {
         console.log('Logout successful:', response.data.message);
         localStorage.removeItem('user_id'); // Clear user ID from localStorage
+        localStorage.removeItem('session_token');
         setIsLoggedIn(false); // Update state to reflect user is logged out
       }
     } catch (error) {
@@ -1,8 +1,11 @@
 import React, { useEffect, useState } from 'react';
+import Thumbnail from './Thumbnail';
 
 function MainContent({ selectedItem }) {
   const [files, setFiles] = useState([]);
   const [logs, setLogs] = useState([]);
+  const [logsCursor, setLogsCursor] = useState(null);
+  const [searchQuery, setSearchQuery] = useState('');
   const userId = localStorage.getItem('user_id');
 
   useEffect(() => {
@@ -13,6 +16,21 @@ function MainContent({ selectedItem }) {
     }
   }, [selectedItem]);
 
+  // Search as the user types, once they pause; an empty box shows all files again
+  useEffect(() => {
+    if (selectedItem !== 'All files') {
+      return undefined;
+    }
+    const timer = setTimeout(() => {
+      if (searchQuery.trim()) {
+        searchFiles(searchQuery.trim());
+      } else {
+        fetchFiles();
+      }
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
   // Fetch files from the backend
   const fetchFiles = async () => {
     try {
@@ -26,6 +44,7 @@ function MainContent({ selectedItem }) {
         headers: {
           'Content-Type': 'application/json',
           'user_id': userId, // Pass the correct user ID
+          'Authorization': `Bearer ${localStorage.getItem('session_token')}`,
         },
       });
 
@@ -41,26 +60,52 @@ function MainContent({ selectedItem }) {
     }
   };
 
-  // Fetch logs from the backend
-  const fetchLogs = async () => {
+  // Search the user's files by name; results come back best match first
+  const searchFiles = async (query) => {
+    try {
+      const response = await fetch(`http://localhost:5001/search?q=${encodeURIComponent(query)}&limit=100`, {
+        method: 'GET',
+        headers: {
+          'user_id': userId,
+          'Authorization': `Bearer ${localStorage.getItem('session_token')}`,
+        },
+      });
+
+      const data = await response.json();
+
+      if (response.ok) {
+        setFiles(data.results);
+      } else {
+        console.error('Failed to search files', data);
+      }
+    } catch (error) {
+      console.error('Error searching files:', error);
+    }
+  };
+
+  // Fetch logs from the backend, newest first; pass a cursor to load the next page
+  const fetchLogs = async (cursor = null) => {
     try {
       if (!userId) {
         console.error('User ID is not found');
         return;
       }
 
-      const response = await fetch('http://localhost:5001/get_logs', {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`http://localhost:5001/get_logs${query}`, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
           'user_id': userId, // Pass the correct user ID
+          'Authorization': `Bearer ${localStorage.getItem('session_token')}`,
         },
       });
 
       const logsData = await response.json();
 
       if (response.ok) {
-        setLogs(logsData);  // Set the logs data to state
+        setLogs((prevLogs) => (cursor ? [...prevLogs, ...logsData.logs] : logsData.logs));  // Set the logs data to state
+        setLogsCursor(logsData.next_cursor);
       } else {
         console.error('Failed to fetch logs', logsData);
       }
@@ -82,6 +127,7 @@ function MainContent({ selectedItem }) {
         headers: {
           'Content-Type': 'application/json',
           'user_id': userId, // Pass the correct user ID
+          'Authorization': `Bearer ${localStorage.getItem('session_token')}`,
         },
       });
 
@@ -107,6 +153,7 @@ function MainContent({ selectedItem }) {
       method: 'GET',
       headers: {
         'user_id': userId,  // Pass the correct user ID
+        'Authorization': `Bearer ${localStorage.getItem('session_token')}`,
       },
     })
       .then((response) => {
@@ -132,19 +179,67 @@ function MainContent({ selectedItem }) {
       });
   };
 
+  // Download every listed file as one ZIP archive
+  const handleDownloadAll = () => {
+    fetch('http://localhost:5001/download_files', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'user_id': userId,  // Pass the correct user ID
+        'Authorization': `Bearer ${localStorage.getItem('session_token')}`,
+      },
+      body: JSON.stringify({ file_ids: files.map((file) => file.id) }),
+    })
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error('Archive download failed');
+        }
+
+        const filename = response.headers.get('X-File-Name') || 'files.zip';
+        return response.blob().then((blob) => ({ filename, blob }));
+      })
+      .then(({ filename, blob }) => {
+        const link = document.createElement('a');
+        link.href = URL.createObjectURL(blob);
+        link.download = filename;
+        link.click();
+      })
+      .catch((error) => {
+        console.error('Error downloading files:', error);
+      });
+  };
+
   const renderContent = () => {
     switch (selectedItem) {
       case 'All files':
         return (
           <div className="flex-1 p-4 bg-white">
-            <h2 className="text-lg font-semibold mb-4">All Files</h2>
+            <div className="flex items-center justify-between mb-4">
+              <h2 className="text-lg font-semibold">All Files</h2>
+              <input
+                type="search"
+                value={searchQuery}
+                onChange={(e) => setSearchQuery(e.target.value)}
+                placeholder="Search files"
+                className="flex-1 mx-4 px-2 py-1 border rounded-md"
+              />
+              {files.length > 0 && (
+                <button
+                  onClick={handleDownloadAll}
+                  className="px-2 py-1 bg-blue-500 text-white text-sm rounded hover:bg-blue-600"
+                >
+                  Download all
+                </button>
+              )}
+            </div>
             <div className="grid grid-cols-4 gap-4">
               {files.length === 0 ? (
                 <div>No files available</div>
               ) : (
                 files.map((file) => (
-                  <div key={file.id} className="flex flex-col items-center justify-center h-24 border rounded-md cursor-pointer hover:bg-gray-100">
-                    <span>📄 {file.filename}</span>
+                  <div key={file.id} className="flex flex-col items-center justify-center h-40 border rounded-md cursor-pointer hover:bg-gray-100">
+                    <Thumbnail fileId={file.id} version={file.version} />
+                    <span>{file.filename}{file.version > 1 && <span className="ml-1 text-xs text-gray-500">v{file.version}</span>}</span>
                     <div className="mt-2 flex space-x-2">
                       {/* Delete button */}
                       <button
@@ -176,9 +271,7 @@ function MainContent({ selectedItem }) {
               {logs.length === 0 ? (
                 <div>No logs available</div>
               ) : (
-                logs.slice()  // Make a copy of the logs array to avoid mutating the original
-  .reverse() // Reverse the order of the logs array
-  .map((log) => (
+                logs.map((log) => (
     <div key={log.id} className="flex flex-col items-start p-4 border rounded-md">
       <div><strong>Action:</strong> {log.action}</div>
       <div><strong>Timestamp:</strong> {new Date(log.timestamp).toLocaleString()}</div>
@@ -194,6 +287,14 @@ function MainContent({ selectedItem }) {
              
               )}
             </div>
+            {logsCursor && (
+              <button
+                onClick={() => fetchLogs(logsCursor)}
+                className="mt-4 px-2 py-1 bg-blue-500 text-white text-sm rounded hover:bg-blue-600"
+              >
+                Load more
+              </button>
+            )}
           </div>
         );
       case 'Shared with me':
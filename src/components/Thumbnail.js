@@ -0,0 +1,64 @@
+import React, { useEffect, useState } from 'react';
+
+const MAX_ATTEMPTS = 10;
+
+// Preview of a file from /thumbnail. While the backend is still rendering it
+// answers 202 with a placeholder and a Retry-After, so we show that and ask again.
+function Thumbnail({ fileId, version, size = 'small' }) {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    let objectUrl = null;
+    let timer = null;
+    let cancelled = false;
+
+    const load = async (attempt) => {
+      try {
+        const response = await fetch(`http://localhost:5001/thumbnail/${fileId}?size=${size}`, {
+          method: 'GET',
+          headers: {
+            'user_id': localStorage.getItem('user_id'),
+            'Authorization': `Bearer ${localStorage.getItem('session_token')}`,
+          },
+        });
+        if (!response.ok || cancelled) {
+          return;
+        }
+
+        const blob = await response.blob();
+        if (cancelled) {
+          return;
+        }
+        if (objectUrl) {
+          URL.revokeObjectURL(objectUrl);
+        }
+        objectUrl = URL.createObjectURL(blob);
+        setSrc(objectUrl);
+
+        if (response.status === 202 && attempt < MAX_ATTEMPTS) {
+          const delay = Number(response.headers.get('Retry-After') || 1) * 1000;
+          timer = setTimeout(() => load(attempt + 1), delay);
+        }
+      } catch (error) {
+        console.error('Error loading thumbnail:', error);
+      }
+    };
+
+    load(1);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+      if (objectUrl) {
+        URL.revokeObjectURL(objectUrl);
+      }
+    };
+  }, [fileId, version, size]);
+
+  if (!src) {
+    return <div className="h-16 w-16" />;
+  }
+  return <img src={src} alt="" className="h-16 w-16 object-contain" />;
+}
+
+export default Thumbnail;
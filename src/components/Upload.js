@@ -59,14 +59,16 @@ function Upload() {
     }
 
     const formData = new FormData();
-    files.forEach((file) => formData.append('file', file)); // Append files to FormData
+    files.forEach((file) => formData.append('files', file)); // Append files to FormData
 
     try {
-      const response = await fetch('http://localhost:5001/upload', {
+      // One request and one transaction for the whole selection
+      const response = await fetch('http://localhost:5001/upload_batch', {
         method: 'POST',
         body: formData,
         headers: {
           'user_id': userId, // Use the user_id from localStorage
+          'Authorization': `Bearer ${localStorage.getItem('session_token')}`,
         },
       });
 